@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+One-off rebuild of the alarm response analytics buckets from `alarms`.
+
+The server only folds new acknowledge/resolve transitions into
+`alarm_response_stats`, so alarms handled before analytics existed are
+missing from /api/analytics/response-times. This script drops the buckets
+and rebuilds them from every acknowledged or resolved alarm. Run it once
+after deploying, ideally while operators are not acknowledging alarms:
+
+    cd backend && python backfill_response_stats.py
+"""
+
+import asyncio
+
+from server import db, response_time_updates
+
+BATCH_SIZE = 1000
+
+
+async def backfill():
+    users = {u["id"]: u.get("name") async for u in db.users.find({}, {"_id": 0, "id": 1, "name": 1})}
+    await db.alarm_response_stats.delete_many({})
+
+    updates = []
+    processed = 0
+    cursor = db.alarms.find(
+        {"$or": [{"acknowledged_at": {"$ne": None}}, {"resolved_at": {"$ne": None}}]},
+        {"_id": 0}
+    ).batch_size(BATCH_SIZE)
+    async for alarm in cursor:
+        for metric, at_field, by_field in (
+            ("ack", "acknowledged_at", "acknowledged_by"),
+            ("resolve", "resolved_at", "resolved_by"),
+        ):
+            if alarm.get(at_field) and alarm.get(by_field):
+                operator_id = alarm[by_field]
+                updates.extend(response_time_updates(
+                    alarm, metric, alarm[at_field], operator_id, users.get(operator_id)
+                ))
+        processed += 1
+        if len(updates) >= BATCH_SIZE:
+            await db.alarm_response_stats.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.alarm_response_stats.bulk_write(updates, ordered=False)
+    print(f"Rebuilt response analytics from {processed} alarms")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
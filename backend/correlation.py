@@ -0,0 +1,174 @@
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+# An incident keeps at most this many alarm ids; alarm_count keeps counting
+INCIDENT_MAX_ALARM_IDS = 500
+
+
+# ("created" | "updated", incident, items appended to its lists by this alarm)
+IncidentChange = Tuple[str, Dict[str, Any], Dict[str, Any]]
+
+
+def _value(value):
+    return getattr(value, "value", value)
+
+
+class AreaWindow:
+    """Sliding window of recent alarms of one area for one rule.
+
+    Keeps the alarms of the last `window` and a count per zone type, so
+    adding, evicting and checking a rule are O(1) amortised per alarm.
+    """
+
+    def __init__(self, window: timedelta):
+        self.window = window
+        self.alarms: Deque[Tuple[datetime, Dict[str, Any]]] = deque()
+        self.type_counts: Dict[str, int] = {}
+
+    def add(self, at: datetime, alarm: Dict[str, Any]):
+        self.alarms.append((at, alarm))
+        zone_type = _value(alarm["alarm_type"])
+        self.type_counts[zone_type] = self.type_counts.get(zone_type, 0) + 1
+
+    def evict(self, now: datetime):
+        cutoff = now - self.window
+        while self.alarms and self.alarms[0][0] < cutoff:
+            _, alarm = self.alarms.popleft()
+            zone_type = _value(alarm["alarm_type"])
+            self.type_counts[zone_type] -= 1
+            if not self.type_counts[zone_type]:
+                del self.type_counts[zone_type]
+
+    def clear(self):
+        self.alarms.clear()
+        self.type_counts.clear()
+
+
+class CorrelationEngine:
+    """Groups related alarms into incidents as they are raised.
+
+    A rule matches when, within `window_seconds` in one area, alarms of every
+    type in `zone_types` (and at least `min_alarms` of the relevant types)
+    have been seen. With `first` set, the sequence must open with an alarm of
+    that type. Once a rule has produced an incident, further relevant alarms
+    in the same area join it for as long as they keep arriving within the
+    window; after that a new match starts a new incident.
+
+    State lives in memory only and is never rebuilt from `alarms`, so each
+    worker correlates only the alarms it raises itself.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]] = (), id_factory: Callable[[], str] = lambda: str(uuid.uuid4()),
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        self.id_factory = id_factory
+        self.clock = clock
+        self.rules: List[Dict[str, Any]] = []
+        self.windows: Dict[Tuple[str, str], AreaWindow] = {}
+        self.open_incidents: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.set_rules(rules)
+
+    def set_rules(self, rules: List[Dict[str, Any]]):
+        """Replace the rules; state of rules that did not change is kept."""
+        previous = {rule["id"]: rule for rule in self.rules}
+        self.rules = [rule for rule in rules if rule.get("enabled", True)]
+        unchanged = {rule["id"] for rule in self.rules if previous.get(rule["id"]) == rule}
+        self.windows = {key: window for key, window in self.windows.items() if key[0] in unchanged}
+        self.open_incidents = {key: incident for key, incident in self.open_incidents.items() if key[0] in unchanged}
+
+    def close(self, incident_id: str) -> bool:
+        """Stop adding alarms to `incident_id`; the next match starts a new one."""
+        for key, incident in self.open_incidents.items():
+            if incident["id"] == incident_id:
+                del self.open_incidents[key]
+                return True
+        return False
+
+    def adopt(self, incident_id: str, successor: Dict[str, Any]) -> bool:
+        """Let alarms that would have joined `incident_id` join `successor` instead."""
+        for key, incident in self.open_incidents.items():
+            if incident["id"] == incident_id:
+                self.open_incidents[key] = {
+                    **successor,
+                    "alarm_ids": list(successor["alarm_ids"]),
+                    "zone_ids": list(successor["zone_ids"]),
+                }
+                return True
+        return False
+
+    @staticmethod
+    def _relevant(rule: Dict[str, Any], zone_type: str) -> bool:
+        zone_types = rule.get("zone_types") or []
+        return not zone_types or zone_type in [_value(t) for t in zone_types]
+
+    @staticmethod
+    def _matches(rule: Dict[str, Any], window: AreaWindow) -> bool:
+        if len(window.alarms) < rule.get("min_alarms", 1):
+            return False
+        return all(_value(t) in window.type_counts for t in rule.get("zone_types") or [])
+
+    def _new_incident(self, rule: Dict[str, Any], area: str, alarms: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "id": self.id_factory(),
+            "rule_id": rule["id"],
+            "name": rule["name"],
+            "area": area,
+            "severity": _value(rule.get("severity", "high")),
+            "alarm_ids": [alarm["id"] for alarm in alarms][:INCIDENT_MAX_ALARM_IDS],
+            "zone_ids": sorted({alarm["zone_id"] for alarm in alarms}),
+            "alarm_count": len(alarms),
+            "first_alarm_at": alarms[0]["triggered_at"],
+            "last_alarm_at": alarms[-1]["triggered_at"],
+            "created_at": self.clock(),
+        }
+
+    @staticmethod
+    def _join(incident: Dict[str, Any], alarm: Dict[str, Any]) -> Dict[str, Any]:
+        """Add `alarm` to `incident`; returns what was appended to its lists."""
+        pushed = {}
+        if len(incident["alarm_ids"]) < INCIDENT_MAX_ALARM_IDS:
+            incident["alarm_ids"].append(alarm["id"])
+            pushed["alarm_ids"] = alarm["id"]
+        if alarm["zone_id"] not in incident["zone_ids"]:
+            incident["zone_ids"].append(alarm["zone_id"])
+            pushed["zone_ids"] = alarm["zone_id"]
+        incident["alarm_count"] += 1
+        incident["last_alarm_at"] = alarm["triggered_at"]
+        return pushed
+
+    def observe(self, alarm: Dict[str, Any]) -> List[IncidentChange]:
+        """Feed one alarm; returns the incidents it created or joined."""
+        changes = []
+        at, area = alarm["triggered_at"], alarm["area"]
+        zone_type = _value(alarm["alarm_type"])
+        for rule in self.rules:
+            if rule.get("area") not in (None, area) or not self._relevant(rule, zone_type):
+                continue
+            key = (rule["id"], area)
+            window_size = timedelta(seconds=rule["window_seconds"])
+
+            incident = self.open_incidents.get(key)
+            if incident is not None:
+                if at - incident["last_alarm_at"] <= window_size:
+                    changes.append(("updated", incident, self._join(incident, alarm)))
+                    continue
+                del self.open_incidents[key]
+
+            window = self.windows.get(key)
+            if window is None:
+                window = self.windows[key] = AreaWindow(window_size)
+            window.evict(at)
+            first = _value(rule.get("first"))
+            if first and first not in window.type_counts:
+                # Whatever is left started before an opener that has expired
+                window.clear()
+                if zone_type != first:
+                    continue
+            window.add(at, alarm)
+            if self._matches(rule, window):
+                incident = self._new_incident(rule, area, [a for _, a in window.alarms])
+                self.open_incidents[key] = incident
+                window.clear()
+                changes.append(("created", incident, {}))
+        return changes
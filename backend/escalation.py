@@ -0,0 +1,249 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from retry import retry_until_done
+
+ESCALATION_MAX_SLEEP = 3600
+
+
+class DeadlineQueue:
+    """Binary min-heap of (deadline, key) with a key -> position index.
+
+    Unlike heapq with lazy deletion, `cancel` and `push` of an existing key
+    restructure the heap in place in O(log n), so cancelled work never
+    lingers in memory or surfaces at its old deadline.
+    """
+
+    def __init__(self):
+        self.heap: List[Tuple[datetime, int, Hashable, Any]] = []
+        self.index: Dict[Hashable, int] = {}
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.index
+
+    def _swap(self, i: int, j: int):
+        self.heap[i], self.heap[j] = self.heap[j], self.heap[i]
+        self.index[self.heap[i][2]] = i
+        self.index[self.heap[j][2]] = j
+
+    def _sift_up(self, i: int):
+        while i > 0:
+            parent = (i - 1) // 2
+            if self.heap[i][:2] >= self.heap[parent][:2]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        size = len(self.heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and self.heap[child][:2] < self.heap[smallest][:2]:
+                    smallest = child
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
+
+    def push(self, key: Hashable, deadline: datetime, payload: Any = None):
+        """Schedule `key` at `deadline`, replacing any earlier entry for it."""
+        self.counter += 1
+        entry = (deadline, self.counter, key, payload)
+        if key in self.index:
+            i = self.index[key]
+            self.heap[i] = entry
+            self._sift_up(i)
+            self._sift_down(self.index[key])
+            return
+        self.heap.append(entry)
+        self.index[key] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def cancel(self, key: Hashable) -> bool:
+        i = self.index.pop(key, None)
+        if i is None:
+            return False
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.index[last[2]] = i
+            self._sift_up(i)
+            self._sift_down(self.index[last[2]])
+        return True
+
+    def peek(self) -> Optional[datetime]:
+        return self.heap[0][0] if self.heap else None
+
+    def pop(self) -> Tuple[datetime, Hashable, Any]:
+        deadline, _, key, payload = self.heap[0]
+        self.cancel(key)
+        return deadline, key, payload
+
+    def pop_due(self, now: datetime) -> List[Tuple[datetime, Hashable, Any]]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(self.pop())
+        return due
+
+
+def select_policy(policies: List[Dict[str, Any]], severity: str, area: str) -> Optional[Dict[str, Any]]:
+    """Most specific enabled policy: area+severity, then area, then severity, then catch-all."""
+    best, best_rank = None, -1
+    for policy in policies:
+        if not policy.get("enabled", True) or not policy.get("steps"):
+            continue
+        if policy.get("area") not in (None, area) or policy.get("severity") not in (None, severity):
+            continue
+        rank = (2 if policy.get("area") else 0) + (1 if policy.get("severity") else 0)
+        if rank > best_rank:
+            best, best_rank = policy, rank
+    return best
+
+
+# (alarm id, policy id, step index, deadline, step)
+DueEscalation = Tuple[str, str, int, datetime, Dict[str, Any]]
+
+
+class Escalator:
+    """Delayed escalation steps for every open alarm.
+
+    Each tracked alarm has exactly one queue entry: its next step's deadline
+    (triggered_at + after_seconds). `cancel` removes it in O(log n) when the
+    alarm is acknowledged or resolved; `run()` sleeps until the earliest
+    deadline and hands all due steps to `apply` as one batch, then queues
+    each alarm's following step.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.utcnow, sync_interval: float = 1):
+        self.clock = clock
+        self.queue = DeadlineQueue()
+        self.policies: Dict[str, Dict[str, Any]] = {}
+        self.wakeup = asyncio.Event()
+        self.reload_requested = False
+        self.sync_requested = False
+        self.sync_interval = timedelta(seconds=sync_interval)
+        self.next_sync = datetime.min
+        self.synced_at: Optional[datetime] = None
+        self.escalated = 0
+
+    def set_policies(self, policies: List[Dict[str, Any]]):
+        self.policies = {policy["id"]: policy for policy in policies}
+        for policy in self.policies.values():
+            policy["steps"] = sorted(policy.get("steps") or [], key=lambda step: step["after_seconds"])
+
+    def _queue_step(self, alarm_id: str, triggered_at: datetime, policy: Dict[str, Any], level: int) -> bool:
+        steps = policy["steps"]
+        if level >= len(steps):
+            return False
+        deadline = triggered_at + timedelta(seconds=steps[level]["after_seconds"])
+        self.queue.push(alarm_id, deadline, (policy["id"], level, triggered_at))
+        self.wakeup.set()
+        return True
+
+    def track(self, alarm: Dict[str, Any]) -> bool:
+        """Queue the next escalation step of an open alarm, if a policy applies."""
+        if alarm["id"] in self.queue:
+            return False
+        # Stay on the policy that started escalating it, even if the severity was raised since
+        policy = self.policies.get(alarm.get("escalation_policy_id")) or select_policy(
+            list(self.policies.values()),
+            getattr(alarm["severity"], "value", alarm["severity"]),
+            alarm["area"]
+        )
+        if policy is None:
+            return False
+        return self._queue_step(alarm["id"], alarm["triggered_at"], policy, alarm.get("escalation_level", 0))
+
+    def cancel(self, alarm_ids: List[str]) -> int:
+        return sum(1 for alarm_id in alarm_ids if self.queue.cancel(alarm_id))
+
+    def load(self, alarms: List[Dict[str, Any]]):
+        self.queue = DeadlineQueue()
+        for alarm in alarms:
+            self.track(alarm)
+
+    def request_reload(self):
+        self.reload_requested = True
+        self.wakeup.set()
+
+    def request_sync(self):
+        """New alarms may exist that this process did not raise itself."""
+        self.sync_requested = True
+        self.wakeup.set()
+
+    def pop_due(self, now: datetime) -> List[DueEscalation]:
+        due = []
+        for deadline, alarm_id, (policy_id, level, triggered_at) in self.queue.pop_due(now):
+            policy = self.policies.get(policy_id)
+            if policy is None or level >= len(policy["steps"]):
+                continue
+            due.append((alarm_id, policy_id, level, deadline, policy["steps"][level]))
+            self._queue_step(alarm_id, triggered_at, policy, level + 1)
+        return due
+
+    async def run(self, apply: Callable[[List[DueEscalation]], Awaitable[List[str]]],
+                  load_policies: Callable[[], Awaitable[List[Dict[str, Any]]]],
+                  load_alarms: Callable[[], Awaitable[List[Dict[str, Any]]]],
+                  load_recent_alarms: Callable[[datetime], Awaitable[List[Dict[str, Any]]]]):
+        """Escalate until cancelled.
+
+        `load_alarms` returns every open alarm (on start and after policy
+        changes); `load_recent_alarms(since)` the ones stored since the previous
+        load, fetched at most once per `sync_interval` after `request_sync()`. `apply` returns the
+        alarm ids that turned out to be closed already; their remaining steps
+        are dropped.
+        """
+        self.reload_requested = True
+        try:
+            await self._run(apply, load_policies, load_alarms, load_recent_alarms)
+        finally:
+            self.queue = DeadlineQueue()
+
+    async def _run(self, apply, load_policies, load_alarms, load_recent_alarms):
+        while True:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.sync_requested = False
+                started = self.clock()
+                self.set_policies(await load_policies())
+                self.load(await load_alarms())
+                self.synced_at = started
+            elif self.sync_requested and self.clock() >= self.next_sync:
+                self.sync_requested = False
+                started = self.clock()
+                self.next_sync = started + self.sync_interval
+                for alarm in await load_recent_alarms(self.synced_at):
+                    self.track(alarm)
+                self.synced_at = started
+
+            now = self.clock()
+            deadline = self.queue.peek()
+            timeout = ESCALATION_MAX_SLEEP
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, (deadline - now).total_seconds()))
+            if self.sync_requested and timeout > 0:
+                # Wake up for the sync only while no step is due; a due step
+                # never waits for (or is skipped by) a sync
+                timeout = min(timeout, max(0.0, (self.next_sync - now).total_seconds()))
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+            if self.reload_requested:
+                continue
+
+            batch = self.pop_due(self.clock())
+            if not batch:
+                continue
+            # The queue has moved on to the following steps already
+            closed = await retry_until_done(lambda: apply(batch), f"Applying {len(batch)} escalations")
+            self.cancel(closed)
+            self.escalated += len(batch) - len(closed)
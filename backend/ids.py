@@ -0,0 +1,80 @@
+"""Time-ordered document ids.
+
+New alarms, events and incidents get a UUIDv7 (RFC 9562: 48-bit Unix
+milliseconds, a 12-bit per-millisecond counter, 62 random bits) written as 26
+lowercase Crockford base32 characters instead of the 36-character UUID text.
+The two spare high bits of the 130 that 26 characters hold are set, so every
+such id starts with one of "rstvwxyz" and sorts after every legacy uuid4 id
+(which starts with a hex digit). Among themselves they sort by creation time.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+CROCKFORD = "0123456789abcdefghjkmnpqrstvwxyz"
+ID_LENGTH = 26
+# Every time-ordered id is >= this and every uuid4 id is below it
+TIME_ORDERED_MIN = "g"
+_MARKER = 0b11 << 128
+_DECODE = {char: value for value, char in enumerate(CROCKFORD)}
+
+
+class UUID7Generator:
+    """128-bit UUIDv7 values, strictly increasing within this process."""
+
+    def __init__(self, clock_ms: Callable[[], int] = lambda: int(time.time() * 1000)):
+        self.clock_ms = clock_ms
+        self.lock = threading.Lock()
+        self.last_ms = 0
+        self.counter = 0
+
+    def next(self) -> int:
+        with self.lock:
+            ms = self.clock_ms()
+            if ms > self.last_ms:
+                self.last_ms = ms
+                # Start low in the 12-bit counter so a busy millisecond rarely overflows
+                self.counter = int.from_bytes(os.urandom(2), "big") & 0x1FF
+            else:
+                self.counter += 1
+                if self.counter > 0xFFF:
+                    # Counter exhausted (or the clock went back): borrow the next millisecond
+                    self.last_ms += 1
+                    self.counter = 0
+            ms, counter = self.last_ms, self.counter
+        random_bits = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+        return (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | random_bits
+
+
+_generator = UUID7Generator()
+
+
+def encode(value: int) -> str:
+    chars = []
+    value |= _MARKER
+    for _ in range(ID_LENGTH):
+        chars.append(CROCKFORD[value & 0x1F])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_id() -> str:
+    """A new compact, time-ordered id."""
+    return encode(_generator.next())
+
+
+def is_time_ordered(id: str) -> bool:
+    return len(id) == ID_LENGTH and id >= TIME_ORDERED_MIN
+
+
+def id_time(id: str) -> Optional[datetime]:
+    """Creation time (naive UTC, millisecond precision) of a time-ordered id."""
+    if not is_time_ordered(id):
+        return None
+    value = 0
+    for char in id:
+        value = (value << 5) | _DECODE[char]
+    return datetime.utcfromtimestamp(((value & ~_MARKER) >> 80) / 1000)
+
@@ -0,0 +1,135 @@
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+# Row number (1-based, header excluded) and the raw row
+ImportRow = Tuple[int, Dict[str, Any]]
+
+
+class ImportFormatError(ValueError):
+    """The file itself is malformed at `row`; nothing after it can be read."""
+
+    def __init__(self, row: int, message: str):
+        super().__init__(message)
+        self.row = row
+
+
+async def _decode(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        async for chunk in chunks:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise ImportFormatError(0, f"Not valid UTF-8: {e}")
+    if tail:
+        yield tail
+
+
+async def read_csv_rows(chunks: AsyncIterator[bytes], columns: List[str],
+                        required: List[str]) -> AsyncIterator[ImportRow]:
+    """Rows of a CSV stream with a header line, as dicts of non-empty cells.
+
+    Lines are parsed as they arrive; a quoted cell may span lines.
+    """
+    header = None
+    row = 0
+    pending = ""
+
+    def parse(record: str):
+        nonlocal header, row
+        if not record.strip():
+            return None
+        [cells] = list(csv.reader([record]))
+        if header is None:
+            header = [cell.strip() for cell in cells]
+            unknown = sorted(set(header) - set(columns))
+            missing = [column for column in required if column not in header]
+            if unknown or missing:
+                raise ImportFormatError(0, f"Bad header: unknown columns {unknown}, missing columns {missing}")
+            return None
+        row += 1
+        if len(cells) > len(header):
+            return row, {"__error__": f"{len(cells)} cells for {len(header)} columns"}
+        return row, {name: cell.strip() for name, cell in zip(header, cells) if cell.strip()}
+
+    async for text in _decode(chunks):
+        pending += text
+        *lines, pending = pending.split("\n")
+        record = ""
+        for line in lines:
+            record += line + "\n"
+            # An odd number of quotes means a quoted cell continues on the next line
+            if record.count('"') % 2:
+                continue
+            parsed = parse(record)
+            record = ""
+            if parsed:
+                yield parsed
+        pending = record + pending
+    if pending.count('"') % 2:
+        raise ImportFormatError(row + 1, "Unterminated quoted cell")
+    parsed = parse(pending)
+    if parsed:
+        yield parsed
+    if header is None:
+        raise ImportFormatError(0, "Missing header line")
+
+
+async def read_json_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[ImportRow]:
+    """Objects of a JSON array, or of newline-delimited JSON, as they arrive."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    row = 0
+    in_array = None
+    finished = False
+
+    async def more() -> bool:
+        nonlocal buffer, position
+        try:
+            text = await stream.__anext__()
+        except StopAsyncIteration:
+            return False
+        buffer = buffer[position:] + text
+        position = 0
+        return True
+
+    stream = _decode(chunks).__aiter__()
+    while True:
+        # Skip whitespace and the array punctuation around values
+        while position < len(buffer):
+            char = buffer[position]
+            if char == "[" and in_array is None:
+                in_array = True
+            elif char == "]" and in_array:
+                finished = True
+            elif char not in " \t\r\n,":
+                break
+            position += 1
+        if position == len(buffer):
+            if not await more():
+                break
+            continue
+        if finished:
+            raise ImportFormatError(row + 1, "Data after the end of the array")
+        in_array = bool(in_array)
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            # Most likely the value is cut off at the end of this chunk
+            if await more():
+                continue
+            raise ImportFormatError(row + 1, f"Invalid JSON: {e.msg}")
+        if end == len(buffer) and not isinstance(value, (dict, list, str)):
+            # A bare number or literal may continue in the next chunk
+            if await more():
+                continue
+        position = end
+        row += 1
+        yield row, value if isinstance(value, dict) else {"__error__": "Not a JSON object"}
+    if in_array and not finished:
+        raise ImportFormatError(row + 1, "Unterminated array")
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from storage import DuplicateKeyError, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """Lease-based leader election over a shared `leases` collection.
+
+    One document per election holds the current holder, the lease expiry and
+    a fencing token. The token only increases when leadership changes hands,
+    so a former leader that wakes up late can be told apart from the current
+    one (`still_leader()` checks holder and token against the database).
+
+    The leader renews every `renew_interval` seconds and considers itself
+    leader until `valid_until`, one renew interval short of the stored expiry.
+    A timer cancels the singleton jobs at `valid_until` even while a renewal
+    is still stuck on the database, so a worker that cannot renew has stopped
+    before anyone else can take over. `resign()` releases the lease at
+    shutdown so failover does not wait for the expiry.
+
+    The clock of the database and of each worker may still drift, so jobs
+    should also check `still_leader()` right before their writes.
+
+    Singleton jobs registered with `singleton()` run only while this worker
+    is the leader; other workers run nothing but the periodic lease check.
+    """
+
+    def __init__(self, collection: Callable[[], Any], name: str, lease_seconds: float = 10,
+                 renew_interval: float = 3, holder: Optional[str] = None,
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        if renew_interval >= lease_seconds:
+            raise ValueError("renew_interval must be shorter than the lease")
+        self.collection = collection
+        self.name = name
+        self.lease = timedelta(seconds=lease_seconds)
+        self.renew_interval = renew_interval
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.clock = clock
+        self.token: Optional[int] = None
+        self.valid_until: Optional[datetime] = None
+        self.jobs: Dict[str, Callable[[], Awaitable[None]]] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.expiry: Optional[asyncio.TimerHandle] = None
+        self.transitions = 0
+
+    @property
+    def is_leader(self) -> bool:
+        return self.token is not None and self.valid_until is not None and self.clock() < self.valid_until
+
+    def singleton(self, name: str, job: Callable[[], Awaitable[None]]):
+        """Run `job()` only while this worker leads."""
+        self.jobs[name] = job
+
+    async def _acquire(self, now: datetime) -> Optional[Dict[str, Any]]:
+        lease = {"holder": self.holder, "expires_at": now + self.lease, "renewed_at": now}
+        if self.token is not None:
+            doc = await self.collection().find_one_and_update(
+                {"_id": self.name, "holder": self.holder, "token": self.token},
+                {"$set": lease},
+                return_document=ReturnDocument.AFTER
+            )
+            if doc:
+                return doc
+        doc = await self.collection().find_one_and_update(
+            {"_id": self.name, "expires_at": {"$lt": now}},
+            {"$set": lease, "$inc": {"token": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc or await self.collection().find_one({"_id": self.name}, {"_id": 1}):
+            return doc
+        try:
+            await self.collection().insert_one({"_id": self.name, "token": 1, **lease})
+        except DuplicateKeyError:
+            return None
+        return {"token": 1, **lease}
+
+    async def tick(self) -> bool:
+        """Try to acquire or renew the lease once; start or stop jobs to match."""
+        now = self.clock()
+        timeout = self.renew_interval
+        if self.is_leader:
+            # A stalled database must not hold us past the lease
+            timeout = min(timeout, (self.valid_until - now).total_seconds())
+        try:
+            doc = await asyncio.wait_for(self._acquire(now), timeout=timeout)
+        except Exception as e:
+            logger.error(f"Leader lease {self.name} check failed: {e!r}")
+            doc = None
+            if self.is_leader:
+                # Keep leading until the lease we already hold runs out; the
+                # expiry timer steps down at valid_until if no renewal lands
+                return True
+
+        if doc:
+            if doc["token"] != self.token:
+                logger.info(f"{self.holder} is now leader for {self.name} (token {doc['token']})")
+                self.transitions += 1
+            self.token = doc["token"]
+            # Step down a renew interval early so we never overlap a successor
+            self.valid_until = now + self.lease - timedelta(seconds=self.renew_interval)
+            self._arm_expiry()
+            self._start_jobs()
+            return True
+
+        self._step_down()
+        return False
+
+    def _start_jobs(self):
+        for name, job in self.jobs.items():
+            task = self.tasks.get(name)
+            if task is None or task.done():
+                if task is not None and not task.cancelled() and task.exception():
+                    logger.error(f"Singleton job {name} failed, restarting: {task.exception()}")
+                self.tasks[name] = asyncio.create_task(job())
+
+    def _arm_expiry(self):
+        if self.expiry is not None:
+            self.expiry.cancel()
+        delay = max(0.0, (self.valid_until - self.clock()).total_seconds())
+        self.expiry = asyncio.get_running_loop().call_later(delay, self._expire)
+
+    def _expire(self):
+        self.expiry = None
+        if self.valid_until is None:
+            return
+        if self.clock() < self.valid_until:
+            # Renewed in the meantime, or the timer fired early
+            self._arm_expiry()
+            return
+        logger.warning(f"Leader lease {self.name} ran out without a renewal")
+        self._step_down()
+
+    def _step_down(self):
+        if self.expiry is not None:
+            self.expiry.cancel()
+            self.expiry = None
+        if self.token is not None:
+            logger.warning(f"{self.holder} lost leadership for {self.name}")
+            self.transitions += 1
+        self.token = None
+        self.valid_until = None
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+
+    async def still_leader(self) -> bool:
+        """Fencing check: is our token still the current one in the database?"""
+        if not self.is_leader:
+            return False
+        doc = await self.collection().find_one(
+            {"_id": self.name, "holder": self.holder, "token": self.token}, {"_id": 1}
+        )
+        return doc is not None
+
+    async def run(self):
+        while True:
+            await self.tick()
+            await asyncio.sleep(self.renew_interval)
+
+    async def resign(self):
+        if self.token is None:
+            return
+        token = self.token
+        self._step_down()
+        try:
+            await self.collection().update_one(
+                {"_id": self.name, "holder": self.holder, "token": token},
+                {"$set": {"expires_at": self.clock()}}
+            )
+        except Exception as e:
+            logger.error(f"Could not release leader lease {self.name}: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "election": self.name,
+            "holder": self.holder,
+            "is_leader": self.is_leader,
+            "token": self.token,
+            "valid_until": self.valid_until,
+            "jobs": sorted(self.tasks if self.is_leader else ()),
+            "transitions": self.transitions,
+        }
@@ -0,0 +1,153 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, TextIO
+
+# Request context attached to every record logged while it is set
+log_route: ContextVar[Optional[str]] = ContextVar("log_route", default=None)
+log_user: ContextVar[Optional[str]] = ContextVar("log_user", default=None)
+log_zone: ContextVar[Optional[str]] = ContextVar("log_zone", default=None)
+CONTEXT_VARS = {"route": log_route, "user": log_user, "zone": log_zone}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+@contextmanager
+def log_context(**values: Optional[str]):
+    """Set route/user/zone for the records logged inside the block."""
+    tokens = [(CONTEXT_VARS[name], CONTEXT_VARS[name].set(value)) for name, value in values.items()]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; context fields only when set."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in CONTEXT_VARS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records without blocking; counts the ones a full queue drops.
+
+    Unlike the stdlib QueueHandler it does not format in the caller: it only
+    captures the context variables and freezes the message arguments, and the
+    listener thread does the formatting and I/O.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        for name, var in CONTEXT_VARS.items():
+            setattr(record, name, var.get())
+        if record.args:
+            # The arguments may change after this call returns
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+
+class StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time, not at construction."""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full; wait for the thread to make room
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """Root logging through a bounded queue and one writer thread."""
+
+    def __init__(self, stream: TextIO = None, level: str = "INFO", json_format: bool = True,
+                 queue_size: int = 10000, capture: Iterable[str] = ()):
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.output = logging.StreamHandler(stream) if stream else StdoutHandler()
+        self.output.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+        self.listener = DrainingQueueListener(self.queue, self.output)
+        self.level = level
+        self.capture = list(capture)
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            root = logging.getLogger()
+            for handler in [h for h in root.handlers if isinstance(h, DroppingQueueHandler)]:
+                root.removeHandler(handler)
+            root.addHandler(self.handler)
+            root.setLevel(self.level)
+            # Loggers with handlers of their own (uvicorn's) are routed through the queue too
+            for name in self.capture:
+                logger = logging.getLogger(name)
+                logger.handlers = [self.handler]
+                logger.propagate = False
+            self.listener.start()
+            self.running = True
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write out everything queued so far and stop the thread."""
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+            self.listener.stop()
+            self.output.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "enqueued": self.handler.enqueued,
+            "dropped": self.handler.dropped,
+        }
@@ -0,0 +1,71 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by an arbitrary string (user id, IP, ...).
+
+    Each key may burst up to `capacity` requests and refills at
+    `capacity / period` tokens per second. At most `max_keys` buckets are kept;
+    the least recently used one is evicted first, so memory stays bounded no
+    matter how many distinct clients show up. An evicted key simply starts
+    again with a full bucket.
+    """
+
+    def __init__(self, capacity: int, period: float, max_keys: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+        self.max_keys = max_keys
+        self.clock = clock
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        """Take one token for `key`. Returns 0 if allowed, else seconds until a token is available."""
+        now = self.clock()
+        tokens, updated = self.buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+
+        if tokens >= 1:
+            retry_after = 0.0
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / self.rate
+
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return retry_after
+
+    @classmethod
+    def from_spec(cls, spec: str, **kwargs) -> "TokenBucketLimiter":
+        """Build a limiter from "<requests>/<seconds>", e.g. "10/60"."""
+        requests, seconds = spec.split("/")
+        return cls(int(requests), float(seconds), **kwargs)
+
+
+class ConcurrencyLimiter:
+    """Non-blocking cap on how many requests may run a handler at once."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.rejected = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight = max(0, self.in_flight - 1)
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,405 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+try:
+    import msgpack
+except ImportError:  # compact binary framing is optional
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Close codes sent to clients we turn away or drop
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+WS_CLOSE_GOING_AWAY = 1001
+
+
+class WireEncoding(str, Enum):
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+# Field names shortened in the compact encoding. Clients receive this table in
+# the "hello" frame, so adding an entry here is backwards compatible.
+COMPACT_KEYS = {
+    "type": "t",
+    "data": "d",
+    "id": "i",
+    "zone_id": "z",
+    "zone_name": "zn",
+    "zone_type": "zt",
+    "alarm_type": "at",
+    "severity": "sv",
+    "status": "s",
+    "message": "m",
+    "area": "a",
+    "name": "n",
+    "description": "ds",
+    "is_armed": "ar",
+    "triggered_at": "ta",
+    "acknowledged_at": "aa",
+    "acknowledged_by": "ab",
+    "resolved_at": "ra",
+    "resolved_by": "rb",
+    "created_at": "ca",
+    "last_triggered": "lt",
+    "trigger_count": "tc",
+    "seq": "q",
+}
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _epoch_ms(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+def compact(value: Any) -> Any:
+    """Shorten known keys, turn datetimes into epoch milliseconds and enums into their values."""
+    if isinstance(value, dict):
+        return {COMPACT_KEYS.get(k, k): compact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [compact(v) for v in value]
+    if isinstance(value, datetime):
+        return _epoch_ms(value)
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+def encode_message(message: Dict[str, Any], encoding: WireEncoding) -> Union[str, bytes]:
+    if encoding == WireEncoding.MSGPACK:
+        return msgpack.packb(compact(message))
+    return json.dumps(message, default=_json_default)
+
+def negotiate_encoding(requested: str) -> WireEncoding:
+    if requested == WireEncoding.MSGPACK.value and msgpack is not None:
+        return WireEncoding.MSGPACK
+    return WireEncoding.JSON
+
+def hello_message(encoding: WireEncoding, requested: Optional[str] = None) -> Dict[str, Any]:
+    hello = {"type": "hello", "encoding": encoding.value, "requested": requested or encoding.value}
+    if encoding == WireEncoding.MSGPACK:
+        hello["keys"] = {short: long for long, short in COMPACT_KEYS.items()}
+        hello["timestamps"] = "epoch_ms"
+    return hello
+
+
+# Delivery lanes: lower number is sent first. Messages at SHEDDABLE_PRIORITY
+# or above may be dropped when a client's queue is full; alarms and control
+# frames (hello, heartbeat pings) never are.
+PRIORITY_CONTROL = 0
+PRIORITY_ALARM = {
+    "critical": 1,
+    "high": 2,
+    "medium": 3,
+    "low": 3,
+}
+# Escalations exist because nobody reacted; they must not be shed either
+PRIORITY_ESCALATION = PRIORITY_ALARM["high"]
+PRIORITY_ALARM_UPDATE = 4
+PRIORITY_ZONE_UPDATE = 5
+SHEDDABLE_PRIORITY = PRIORITY_ALARM_UPDATE
+# Message types not listed below queue behind alarms and may be shed
+PRIORITY_DEFAULT = PRIORITY_ALARM_UPDATE
+CONTROL_MESSAGE_TYPES = {"hello", "ping"}
+
+def message_priority(message: Dict[str, Any]) -> int:
+    message_type = message.get("type")
+    if message_type in CONTROL_MESSAGE_TYPES:
+        return PRIORITY_CONTROL
+    if message_type in ("alarm", "incident"):
+        severity = getattr(message["data"].get("severity"), "value", message["data"].get("severity"))
+        return PRIORITY_ALARM.get(severity, PRIORITY_ALARM["medium"])
+    if message_type in ("alarm_escalation", "alarm_escalations"):
+        return PRIORITY_ESCALATION
+    if message_type in ("alarm_update", "alarm_updates", "incident_update"):
+        return PRIORITY_ALARM_UPDATE
+    if message_type in ("zone_update", "zone_updates"):
+        return PRIORITY_ZONE_UPDATE
+    return PRIORITY_DEFAULT
+
+
+class ClientConnection:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        client_ip: str,
+        encoding: WireEncoding = WireEncoding.JSON,
+        max_queue: int = 256
+    ):
+        self.websocket = websocket
+        self.client_ip = client_ip
+        self.encoding = encoding
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at
+        self.max_queue = max_queue
+        self.queue: List[Tuple[int, int, Union[str, bytes]]] = []
+        self.ready = asyncio.Event()
+        self.sender: Optional[asyncio.Task] = None
+
+    def enqueue(self, priority: int, seq: int, frame: Union[str, bytes]) -> Optional[bool]:
+        """Queue a frame. Returns True if something was shed, None if the client is hopelessly behind."""
+        shed = False
+        if len(self.queue) >= self.max_queue:
+            worst = max(range(len(self.queue)), key=lambda i: (self.queue[i][0], self.queue[i][1]))
+            if self.queue[worst][0] < SHEDDABLE_PRIORITY and priority < SHEDDABLE_PRIORITY:
+                return None
+            if priority >= self.queue[worst][0]:
+                # The new frame is the least important one; drop it instead
+                return True
+            self.queue[worst] = self.queue[-1]
+            self.queue.pop()
+            heapq.heapify(self.queue)
+            shed = True
+        heapq.heappush(self.queue, (priority, seq, frame))
+        self.ready.set()
+        return shed
+
+
+# WebSocket connection manager
+class ConnectionManager:
+    """Tracks live /ws clients, keeps them honest with pings and drops dead ones.
+
+    A socket is removed as soon as a send fails or times out, and the heartbeat
+    loop closes clients that have not sent anything (including pongs) within
+    `idle_timeout`, so memory and broadcast cost follow the number of live
+    clients instead of every client that ever connected.
+
+    `zone_update` messages are held for `coalesce_interval` seconds and merged
+    per zone (later fields win), then sent as one `zone_updates` frame. All
+    other messages, alarms in particular, go out immediately.
+
+    Each client has its own priority queue drained by a sender task, so a
+    critical alarm overtakes any routine updates still waiting for that
+    client, and a slow client only delays itself. When a queue is full the
+    lowest-priority updates are shed; a client that cannot even keep up with
+    alarms is disconnected.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 500,
+        max_connections_per_ip: int = 20,
+        ping_interval: float = 20.0,
+        idle_timeout: float = 60.0,
+        send_timeout: float = 5.0,
+        coalesce_interval: float = 0.05,
+        max_queue: int = 256,
+    ):
+        self.max_connections = max_connections
+        self.max_connections_per_ip = max_connections_per_ip
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.send_timeout = send_timeout
+        self.coalesce_interval = coalesce_interval
+        self.max_queue = max_queue
+        self._seq = itertools.count()
+        # Incremented for every data message; clients compare it with the
+        # sequence stamped on a dashboard snapshot to skip stale updates
+        self.sequence = 0
+        self.pending_zone_updates: Dict[str, Dict[str, Any]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.connections_per_ip: Dict[str, int] = {}
+        self.stats = {
+            "accepted": 0,
+            "rejected_global_limit": 0,
+            "rejected_ip_limit": 0,
+            "disconnected": 0,
+            "reaped_send_error": 0,
+            "reaped_idle": 0,
+            "reaped_backlog": 0,
+            "shed_messages": 0,
+            "zone_updates_coalesced": 0,
+            "zone_update_batches": 0,
+        }
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        client_ip: str,
+        encoding: WireEncoding = WireEncoding.JSON,
+        requested_encoding: Optional[str] = None
+    ) -> bool:
+        rejection = None
+        if len(self.active_connections) >= self.max_connections:
+            rejection = "rejected_global_limit"
+        elif self.connections_per_ip.get(client_ip, 0) >= self.max_connections_per_ip:
+            rejection = "rejected_ip_limit"
+
+        # Accept before closing: closing during the handshake would turn into
+        # an HTTP 403 and the client would never see the 1013 close code
+        await websocket.accept()
+        if rejection:
+            self.stats[rejection] += 1
+            await self._close(websocket, WS_CLOSE_TRY_AGAIN_LATER)
+            return False
+
+        connection = ClientConnection(websocket, client_ip, encoding, self.max_queue)
+        self.active_connections[websocket] = connection
+        self.connections_per_ip[client_ip] = self.connections_per_ip.get(client_ip, 0) + 1
+        self.stats["accepted"] += 1
+        connection.sender = asyncio.create_task(self._sender(connection))
+        # Tell clients that asked for a non-default format what they actually
+        # got, so a refused msgpack request is not decoded as binary
+        if encoding != WireEncoding.JSON or (requested_encoding or WireEncoding.JSON.value) != WireEncoding.JSON.value:
+            await self.send_personal_message(hello_message(encoding, requested_encoding), websocket)
+        return True
+
+    def disconnect(self, websocket: WebSocket, reason: str = "disconnected") -> bool:
+        connection = self.active_connections.pop(websocket, None)
+        if connection is None:
+            return False
+        remaining = self.connections_per_ip.get(connection.client_ip, 1) - 1
+        if remaining > 0:
+            self.connections_per_ip[connection.client_ip] = remaining
+        else:
+            self.connections_per_ip.pop(connection.client_ip, None)
+        # The sender task exits on its own once the connection is gone; wake it
+        # up in case it is idle waiting for the next frame
+        connection.queue.clear()
+        connection.ready.set()
+        self.stats[reason] += 1
+        return True
+
+    def touch(self, websocket: WebSocket):
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    async def _close(self, websocket: WebSocket, code: int = WS_CLOSE_GOING_AWAY):
+        if websocket.application_state == WebSocketState.DISCONNECTED:
+            return
+        try:
+            await asyncio.wait_for(websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
+    async def reap(self, websocket: WebSocket, reason: str):
+        if self.disconnect(websocket, reason):
+            await self._close(websocket)
+
+    async def _send(self, websocket: WebSocket, frame: Union[str, bytes]) -> bool:
+        try:
+            if isinstance(frame, bytes):
+                await asyncio.wait_for(websocket.send_bytes(frame), self.send_timeout)
+            else:
+                await asyncio.wait_for(websocket.send_text(frame), self.send_timeout)
+            return True
+        except Exception as e:
+            logger.info(f"Dropping WebSocket client after failed send: {e!r}")
+            await self.reap(websocket, "reaped_send_error")
+            return False
+
+    async def _sender(self, connection: ClientConnection):
+        while self.active_connections.get(connection.websocket) is connection:
+            await connection.ready.wait()
+            connection.ready.clear()
+            while connection.queue and self.active_connections.get(connection.websocket) is connection:
+                _, _, frame = heapq.heappop(connection.queue)
+                if not await self._send(connection.websocket, frame):
+                    return
+
+    def _enqueue(self, connection: ClientConnection, priority: int, frame: Union[str, bytes]):
+        result = connection.enqueue(priority, next(self._seq), frame)
+        if result is None:
+            logger.info("Dropping WebSocket client that cannot keep up with alarms")
+            asyncio.create_task(self.reap(connection.websocket, "reaped_backlog"))
+        elif result:
+            self.stats["shed_messages"] += 1
+
+    async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            self._enqueue(connection, PRIORITY_CONTROL, encode_message(message, connection.encoding))
+
+    async def broadcast(self, message: Dict[str, Any]):
+        if message.get("type") == "zone_update" and self.coalesce_interval > 0:
+            self._queue_zone_update(message["data"])
+            return
+        await self._broadcast_now(message)
+
+    def _queue_zone_update(self, data: Dict[str, Any]):
+        pending = self.pending_zone_updates.get(data["id"])
+        if pending is None:
+            self.pending_zone_updates[data["id"]] = dict(data)
+        else:
+            pending.update(data)
+            self.stats["zone_updates_coalesced"] += 1
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_tick())
+
+    async def _flush_after_tick(self):
+        try:
+            await asyncio.sleep(self.coalesce_interval)
+        finally:
+            self._flush_task = None
+        await self.flush_zone_updates()
+
+    async def flush_zone_updates(self):
+        if not self.pending_zone_updates:
+            return
+        updates = list(self.pending_zone_updates.values())
+        self.pending_zone_updates = {}
+        if len(updates) == 1:
+            await self._broadcast_now({"type": "zone_update", "data": updates[0]})
+        else:
+            self.stats["zone_update_batches"] += 1
+            await self._broadcast_now({"type": "zone_updates", "data": updates})
+
+    async def _broadcast_now(self, message: Dict[str, Any]):
+        # Encode once per wire format and hand the frame to every client's
+        # queue; the per-client sender tasks do the actual network I/O
+        if message.get("type") not in CONTROL_MESSAGE_TYPES:
+            self.sequence += 1
+            message = {**message, "seq": self.sequence}
+        connections = list(self.active_connections.values())
+        if not connections:
+            return
+        priority = message_priority(message)
+        frames: Dict[WireEncoding, Union[str, bytes]] = {}
+        for connection in connections:
+            if connection.encoding not in frames:
+                frames[connection.encoding] = encode_message(message, connection.encoding)
+            self._enqueue(connection, priority, frames[connection.encoding])
+
+    async def ping_idle_check(self):
+        now = time.monotonic()
+        for websocket, connection in list(self.active_connections.items()):
+            if now - connection.last_seen > self.idle_timeout:
+                await self.reap(websocket, "reaped_idle")
+        await self._broadcast_now({"type": "ping", "ts": time.time()})
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                await self.ping_idle_check()
+            except Exception as e:
+                logger.error(f"Error in WebSocket heartbeat: {e}")
+
+    def snapshot(self) -> dict:
+        return {
+            "live_connections": len(self.active_connections),
+            "sequence": self.sequence,
+            "distinct_ips": len(self.connections_per_ip),
+            "max_connections": self.max_connections,
+            "max_connections_per_ip": self.max_connections_per_ip,
+            "queued_messages": sum(len(c.queue) for c in self.active_connections.values()),
+            "encodings": {
+                encoding.value: sum(1 for c in self.active_connections.values() if c.encoding == encoding)
+                for encoding in WireEncoding
+            },
+            **self.stats,
+        }
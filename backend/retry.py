@@ -0,0 +1,30 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+RETRY_MIN_DELAY = 1
+RETRY_MAX_DELAY = 30
+
+T = TypeVar("T")
+
+
+async def retry_until_done(call: Callable[[], Awaitable[T]], what: str,
+                           min_delay: float = RETRY_MIN_DELAY, max_delay: float = RETRY_MAX_DELAY) -> T:
+    """Await `call()` until it succeeds, backing off exponentially.
+
+    For work that has already been taken off a timer heap: giving up would
+    lose it for good, so only cancellation (e.g. losing leadership) ends
+    the retries.
+    """
+    delay = min_delay
+    attempt = 1
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            logger.error(f"{what} failed (attempt {attempt}), retrying in {delay}s: {e}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+        attempt += 1
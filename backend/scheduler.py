@@ -0,0 +1,169 @@
+import asyncio
+import heapq
+import itertools
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from retry import retry_until_done
+
+# Upper bound on one sleep, so a wall-clock jump is noticed within the hour
+SCHEDULE_MAX_SLEEP = 3600
+# How far ahead to look for the next transition (covers exceptions that
+# blank out a long stretch of days)
+SCHEDULE_HORIZON_DAYS = 400
+
+DueChange = Tuple[Dict[str, Any], str, datetime]
+
+
+def parse_time(value: str) -> time:
+    hours, minutes = value.split(":")
+    return time(int(hours), int(minutes))
+
+def _day_rules(schedule: Dict[str, Any], day: date) -> List[Tuple[time, str]]:
+    """(local time, action) pairs for one calendar day, exceptions first."""
+    for exception in schedule.get("exceptions") or []:
+        exception_day = exception["date"]
+        if isinstance(exception_day, datetime):
+            exception_day = exception_day.date()
+        elif isinstance(exception_day, str):
+            exception_day = date.fromisoformat(exception_day)
+        if exception_day == day:
+            rules = exception.get("rules") or []
+            break
+    else:
+        rules = [rule for rule in schedule.get("rules") or [] if day.weekday() in rule["days"]]
+    return sorted((parse_time(rule["time"]), rule["action"]) for rule in rules)
+
+def next_transition(schedule: Dict[str, Any], after: datetime) -> Optional[Tuple[datetime, str]]:
+    """The first (UTC due time, action) strictly after `after` (naive UTC)."""
+    if not schedule.get("enabled", True):
+        return None
+    if not schedule.get("rules") and not schedule.get("exceptions"):
+        return None
+    tz = ZoneInfo(schedule.get("timezone") or "UTC")
+    local_after = after.replace(tzinfo=timezone.utc).astimezone(tz)
+    day = local_after.date()
+    for _ in range(SCHEDULE_HORIZON_DAYS):
+        for at, action in _day_rules(schedule, day):
+            due = datetime.combine(day, at, tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+            if due > after:
+                return due, action
+        day += timedelta(days=1)
+    return None
+
+
+def last_transition(schedule: Dict[str, Any], since: datetime, until: datetime) -> Optional[Tuple[datetime, str]]:
+    """The latest (UTC due time, action) with since < due <= until (naive UTC)."""
+    if not schedule.get("enabled", True):
+        return None
+    tz = ZoneInfo(schedule.get("timezone") or "UTC")
+    first_day = since.replace(tzinfo=timezone.utc).astimezone(tz).date()
+    day = until.replace(tzinfo=timezone.utc).astimezone(tz).date()
+    first_day = max(first_day, day - timedelta(days=SCHEDULE_HORIZON_DAYS))
+    while day >= first_day:
+        for at, action in reversed(_day_rules(schedule, day)):
+            due = datetime.combine(day, at, tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+            if since < due <= until:
+                return due, action
+        day -= timedelta(days=1)
+    return None
+
+def applied_since(schedule: Dict[str, Any]) -> Optional[datetime]:
+    """Transitions after this instant have not been applied yet: the last
+    applied one, or the last edit (an edit never applies past transitions)."""
+    marks = [mark for mark in (schedule.get("last_applied_at"), schedule.get("updated_at")) if mark]
+    return max(marks) if marks else None
+
+
+class ScheduleTimer:
+    """Timer heap of the next arm/disarm transition of every schedule.
+
+    `run()` sleeps until the earliest due time, hands everything that is due
+    to `apply` as one batch and pushes each schedule's following transition,
+    so nothing is scanned between due times. `request_reload()` wakes it up
+    to rebuild the heap from `reload()` after schedules change.
+
+    Loading never skips a transition that came due while no leader was
+    running (a restart, a failover, a reload racing the due time): if one
+    is due after the schedule's `applied_since()` mark, the latest such
+    transition is queued as already due. `apply` is expected to record
+    `last_applied_at` for the schedules it handled.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.utcnow):
+        self.clock = clock
+        self.heap: List[Tuple[datetime, int, str, str]] = []
+        self.schedules: Dict[str, Dict[str, Any]] = {}
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.reload_requested = False
+        self.applied = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def load(self, schedules: List[Dict[str, Any]]):
+        self.heap.clear()
+        self.schedules = {schedule["id"]: schedule for schedule in schedules}
+        now = self.clock()
+        for schedule in schedules:
+            since = applied_since(schedule)
+            missed = last_transition(schedule, since, now) if since else None
+            if missed is not None:
+                # pop_due() queues the following transition from there
+                self._queue(schedule, missed)
+            else:
+                self._push(schedule, now)
+
+    def _queue(self, schedule: Dict[str, Any], transition: Tuple[datetime, str]):
+        due, action = transition
+        heapq.heappush(self.heap, (due, next(self.counter), schedule["id"], action))
+
+    def _push(self, schedule: Dict[str, Any], after: datetime):
+        upcoming = next_transition(schedule, after)
+        if upcoming is not None:
+            self._queue(schedule, upcoming)
+
+    def request_reload(self):
+        self.reload_requested = True
+        self.wakeup.set()
+
+    def next_due(self) -> Optional[datetime]:
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: datetime) -> List[DueChange]:
+        due_changes = []
+        while self.heap and self.heap[0][0] <= now:
+            due, _, schedule_id, action = heapq.heappop(self.heap)
+            schedule = self.schedules[schedule_id]
+            due_changes.append((schedule, action, due))
+            self._push(schedule, due)
+        return due_changes
+
+    async def run(self, apply: Callable[[List[DueChange]], Awaitable[None]],
+                  reload: Callable[[], Awaitable[List[Dict[str, Any]]]]):
+        self.reload_requested = True
+        while True:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.load(await reload())
+
+            due = self.next_due()
+            timeout = SCHEDULE_MAX_SLEEP
+            if due is not None:
+                timeout = min(timeout, max(0.0, (due - self.clock()).total_seconds()))
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            if self.reload_requested:
+                continue
+
+            batch = self.pop_due(self.clock())
+            if not batch:
+                continue
+            # The heap has moved on to the following transitions already
+            await retry_until_done(lambda: apply(batch), f"Applying {len(batch)} scheduled changes")
+            self.applied += len(batch)
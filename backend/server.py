@@ -1,29 +1,41 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.requests import HTTPConnection
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 import bcrypt
 import jwt
 import asyncio
-import json
+import math
 from enum import Enum
 import random
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from ratelimit import ConcurrencyLimiter, TokenBucketLimiter, retry_after_header
+from realtime import ConnectionManager, negotiate_encoding
+from leader import LeaderElection
+from logqueue import LogPipeline, log_context, log_route, log_user, log_zone
+from correlation import INCIDENT_MAX_ALARM_IDS, CorrelationEngine
+from escalation import Escalator
+from ids import TIME_ORDERED_MIN, is_time_ordered, new_id
+from importer import ImportFormatError, read_csv_rows, read_json_rows
+from scheduler import ScheduleTimer, next_transition
+from spool import WriteAheadSpool
+from storage import ReturnDocument, UpdateOne, create_storage
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Storage backend: STORAGE_BACKEND=mongo (default, needs MONGO_URL/DB_NAME),
+# memory, or sqlite (SQLITE_PATH). All handlers go through `db.<collection>`.
+db = create_storage(os.environ)
 
 # Create the main app without a prefix
 app = FastAPI(title="EMA NextGen IDS API", version="1.0.0")
@@ -35,8 +47,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def bind_log_context(request: Request):
+    # Set fresh for every request; get_current_user fills in the user
+    route = request.scope.get("route")
+    log_route.set(f"{request.method} {route.path}" if route else request.url.path)
+    log_zone.set(request.path_params.get("zone_id"))
+    log_user.set(None)
+
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", dependencies=[Depends(bind_log_context)])
 
 # Security setup
 security = HTTPBearer()
@@ -45,28 +64,179 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 
 # WebSocket connection manager
-class ConnectionManager:
+# Set TRUST_FORWARDED_FOR=true when running behind a reverse proxy (e.g. Render)
+# so per-IP limits use the client address instead of the proxy's.
+TRUST_FORWARDED_FOR = os.environ.get('TRUST_FORWARDED_FOR', 'false').lower() == 'true'
+
+def client_ip(connection: HTTPConnection) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = connection.headers.get('x-forwarded-for')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return connection.client.host if connection.client else "unknown"
+
+manager = ConnectionManager(
+    max_connections=int(os.environ.get('WS_MAX_CONNECTIONS', 500)),
+    max_connections_per_ip=int(os.environ.get('WS_MAX_CONNECTIONS_PER_IP', 20)),
+    ping_interval=float(os.environ.get('WS_PING_INTERVAL', 20)),
+    idle_timeout=float(os.environ.get('WS_IDLE_TIMEOUT', 60)),
+    send_timeout=float(os.environ.get('WS_SEND_TIMEOUT', 5)),
+    coalesce_interval=float(os.environ.get('WS_COALESCE_INTERVAL', 0.05)),
+    max_queue=int(os.environ.get('WS_MAX_QUEUE', 256))
+)
+
+# Alarm write-ahead spool
+# Zone triggers are appended to a local log and broadcast before any database
+# write; replay_alarm_spool() applies them to the database in order, retrying
+# until it is reachable.
+alarm_spool = WriteAheadSpool(
+    os.environ.get('ALARM_SPOOL_DIR', str(ROOT_DIR / 'spool')),
+    fsync=os.environ.get('ALARM_SPOOL_FSYNC', 'true').lower() in ('1', 'true', 'yes')
+)
+ALARM_SPOOL_RETRY_MIN = 1
+ALARM_SPOOL_RETRY_MAX = 30
+
+# Leader election
+# Singleton background jobs (the zone simulator, and anything else that must
+# not run once per worker) only run on the worker holding the lease.
+leader = LeaderElection(
+    lambda: db.leases,
+    "background-jobs",
+    lease_seconds=float(os.environ.get('LEADER_LEASE_SECONDS', 10)),
+    renew_interval=float(os.environ.get('LEADER_RENEW_INTERVAL', 3))
+)
+
+def leader_fenced(apply, skipped=None):
+    """Wrap a singleton job's write step so it only runs while our fencing
+    token is still the current one; a deposed leader's batch is dropped (the
+    new leader reloads its state from the database)."""
+    async def fenced(batch):
+        if not await leader.still_leader():
+            logging.warning(f"No longer the leader, skipping {len(batch)} items of {apply.__name__}")
+            return skipped
+        return await apply(batch)
+    return fenced
+
+# Change versions for conditional GETs
+# Every write to zones, alarms or events bumps an in-process counter, so list
+# and stats endpoints can answer If-None-Match with 304 without querying
+# MongoDB. Bumps are mirrored to the `change_versions` collection and other
+# workers pick them up every CHANGE_VERSION_SYNC_INTERVAL seconds, which bounds
+# how long a worker can serve a stale 304 after another worker's write.
+CHANGE_VERSION_SYNC_INTERVAL = float(os.environ.get('CHANGE_VERSION_SYNC_INTERVAL', 1))
+
+class ChangeVersions:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.local: Dict[str, int] = {}
+        self.shared: Dict[str, int] = {}
+        self.watchers: Dict[str, List[Any]] = {}
+        self.synced = False
+
+    def watch(self, name: str, callback):
+        """Call `callback()` whenever `name` changes, here or on another worker."""
+        self.watchers.setdefault(name, []).append(callback)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    def _notify(self, name: str):
+        for callback in self.watchers.get(name, ()):
+            callback()
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+    async def bump(self, *collections: str):
+        for name in collections:
+            self.local[name] = self.local.get(name, 0) + 1
+            self._notify(name)
+        try:
+            await db.change_versions.bulk_write([
+                UpdateOne({"_id": name}, {"$inc": {"version": 1}}, upsert=True) for name in collections
+            ], ordered=False)
+        except Exception as e:
+            logging.error(f"Error publishing change versions: {e}")
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+    def etag(self, *parts: str) -> str:
+        state = ";".join(
+            f"{name}:{self.local.get(name, 0)}:{self.shared.get(name, 0)}" for name in parts
+        )
+        return f'W/"{self.boot_id}-{uuid.uuid5(uuid.NAMESPACE_OID, state).hex[:16]}"'
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
+    async def sync(self):
+        while True:
             try:
-                await connection.send_text(message)
-            except:
-                pass
+                async for doc in db.change_versions.find({}):
+                    previous = self.shared.get(doc["_id"])
+                    self.shared[doc["_id"]] = doc["version"]
+                    if self.synced and previous != doc["version"]:
+                        self._notify(doc["_id"])
+                self.synced = True
+            except Exception as e:
+                logging.error(f"Error syncing change versions: {e}")
+            await asyncio.sleep(CHANGE_VERSION_SYNC_INTERVAL)
+
+change_versions = ChangeVersions()
+
+# Admission control
+# Expensive routes get token buckets keyed by client IP and by user (JWT
+# subject, or the account e-mail for login), given as "<requests>/<seconds>"
+# and overridable with RATE_LIMIT_<ROUTE>_<SCOPE>, e.g. RATE_LIMIT_LOGIN_IP=20/60.
+# Heavy handlers also share a global concurrency cap. Over-limit requests get
+# an immediate 429 with Retry-After, before any database work.
+ROUTE_LIMITS = {
+    "login": {"ip": "20/60", "account": "5/60"},
+    "dashboard_stats": {"ip": "120/60", "user": "60/60"},
+    "zones": {"ip": "120/60", "user": "60/60"},
+    "dashboard_snapshot": {"ip": "120/60", "user": "60/60"},
+    "zones_import": {"ip": "10/60", "user": "5/60"},
+}
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 10000))
+rate_limiters = {
+    (route, scope): TokenBucketLimiter.from_spec(
+        os.environ.get(f'RATE_LIMIT_{route.upper()}_{scope.upper()}', spec),
+        max_keys=RATE_LIMIT_MAX_KEYS
+    )
+    for route, scopes in ROUTE_LIMITS.items()
+    for scope, spec in scopes.items()
+}
+rate_limit_rejections: Dict[str, int] = {route: 0 for route in ROUTE_LIMITS}
+heavy_requests = ConcurrencyLimiter(int(os.environ.get('HEAVY_CONCURRENCY_LIMIT', 32)))
+
+def check_rate_limit(route: str, scope: str, key: str):
+    retry_after = rate_limiters[(route, scope)].acquire(key)
+    if retry_after:
+        rate_limit_rejections[route] += 1
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": retry_after_header(retry_after)}
+        )
+
+def _token_subject(request: Request) -> Optional[str]:
+    # Signature check only, no database lookup: this runs before authentication
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except jwt.PyJWTError:
+        return None
 
-manager = ConnectionManager()
+def rate_limit(route: str, heavy: bool = False):
+    async def dependency(request: Request):
+        scopes = ROUTE_LIMITS[route]
+        if "ip" in scopes:
+            check_rate_limit(route, "ip", client_ip(request))
+        if "user" in scopes:
+            subject = _token_subject(request)
+            if subject:
+                check_rate_limit(route, "user", subject)
+        if not heavy:
+            yield
+            return
+        if not heavy_requests.try_acquire():
+            raise HTTPException(status_code=429, detail="Server busy", headers={"Retry-After": "1"})
+        try:
+            yield
+        finally:
+            heavy_requests.release()
+    return dependency
 
 # Enums
 class UserRole(str, Enum):
@@ -147,8 +317,28 @@ class ZoneUpdate(BaseModel):
     description: Optional[str] = None
     is_armed: Optional[bool] = None
 
+class ZoneImportMode(str, Enum):
+    INSERT = "insert"  # rows matching an existing zone (same area and name) fail
+    UPSERT = "upsert"  # such rows update the zone in place
+
+class ZoneImportError(BaseModel):
+    row: int  # 1-based, header line excluded
+    errors: List[str]
+
+class ZoneImportResult(BaseModel):
+    mode: ZoneImportMode
+    dry_run: bool
+    ordered: bool
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    stopped_at: Optional[int] = None  # row that ended the import early
+    errors: List[ZoneImportError] = []  # the first ZONE_IMPORT_MAX_ERRORS
+
 class Alarm(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)  # time-ordered; older documents have uuid4 ids
     zone_id: str
     zone_name: str
     alarm_type: ZoneType
@@ -161,9 +351,10 @@ class Alarm(BaseModel):
     acknowledged_by: Optional[str] = None
     resolved_by: Optional[str] = None
     area: str
+    escalation_level: int = 0
 
 class Event(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)  # time-ordered; older documents have uuid4 ids
     event_type: str
     description: str
     user_id: Optional[str] = None
@@ -181,6 +372,214 @@ class SystemStats(BaseModel):
     system_uptime: str
     last_maintenance: Optional[datetime] = None
 
+class BulkAlarmFilter(BaseModel):
+    zone_id: Optional[str] = None
+    area: Optional[str] = None
+    severity: Optional[AlarmSeverity] = None
+    triggered_before: Optional[datetime] = None
+
+class BulkAlarmRequest(BaseModel):
+    alarm_ids: Optional[List[str]] = None
+    filter: Optional[BulkAlarmFilter] = None
+
+class BulkAlarmResult(BaseModel):
+    status: AlarmStatus
+    updated: int
+    alarm_ids: List[str]
+    has_more: bool = False
+
+class AnalyticsGroup(str, Enum):
+    ZONE = "zone"
+    AREA = "area"
+    SEVERITY = "severity"
+    OPERATOR = "operator"
+
+class ResponseTimeStats(BaseModel):
+    group_by: AnalyticsGroup
+    key: str
+    label: Optional[str] = None
+    acknowledged_count: int = 0
+    mtta_seconds: Optional[float] = None
+    tta_p50_seconds: Optional[float] = None
+    tta_p90_seconds: Optional[float] = None
+    tta_p95_seconds: Optional[float] = None
+    resolved_count: int = 0
+    mttr_seconds: Optional[float] = None
+    ttr_p50_seconds: Optional[float] = None
+    ttr_p90_seconds: Optional[float] = None
+    ttr_p95_seconds: Optional[float] = None
+
+class ActivityGranularity(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+class ActivityBucket(BaseModel):
+    bucket: datetime
+    count: int = 0
+
+class ZoneActivity(BaseModel):
+    zone_id: str
+    granularity: ActivityGranularity
+    total: int
+    buckets: List[ActivityBucket]
+
+class AreaHeatmapRow(BaseModel):
+    area: str
+    total: int
+    counts: List[int]
+
+class AreaHeatmap(BaseModel):
+    granularity: ActivityGranularity
+    buckets: List[datetime]
+    rows: List[AreaHeatmapRow]
+
+class EscalationAction(str, Enum):
+    REBROADCAST = "rebroadcast"
+    RAISE_SEVERITY = "raise_severity"
+
+class EscalationStep(BaseModel):
+    after_seconds: int = Field(gt=0)  # counted from triggered_at
+    action: EscalationAction
+    audience: Optional[str] = None  # e.g. "supervisors"; passed on to clients
+
+class EscalationPolicy(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    severity: Optional[AlarmSeverity] = None  # None matches any severity
+    area: Optional[str] = None  # None matches any area
+    enabled: bool = True
+    steps: List[EscalationStep]
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class EscalationPolicyCreate(BaseModel):
+    name: str
+    severity: Optional[AlarmSeverity] = None
+    area: Optional[str] = None
+    enabled: bool = True
+    steps: List[EscalationStep]
+
+class EscalationPolicyUpdate(BaseModel):
+    name: Optional[str] = None
+    severity: Optional[AlarmSeverity] = None
+    area: Optional[str] = None
+    enabled: Optional[bool] = None
+    steps: Optional[List[EscalationStep]] = None
+
+class ScheduleAction(str, Enum):
+    ARM = "arm"
+    DISARM = "disarm"
+
+class ScheduleTime(BaseModel):
+    time: str = Field(pattern=r"^([01][0-9]|2[0-3]):[0-5][0-9]$")  # local "HH:MM"
+    action: ScheduleAction
+
+class ScheduleRule(ScheduleTime):
+    days: List[int]  # 0 = Monday ... 6 = Sunday
+
+class ScheduleException(BaseModel):
+    date: date
+    rules: List[ScheduleTime] = []  # replace the weekly rules on this date; empty = no changes
+
+class Schedule(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    zone_id: Optional[str] = None
+    area: Optional[str] = None
+    timezone: str = "UTC"
+    enabled: bool = True
+    rules: List[ScheduleRule] = []
+    exceptions: List[ScheduleException] = []
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    last_applied_at: Optional[datetime] = None  # due time of the last transition carried out
+    next_run: Optional[datetime] = None
+    next_action: Optional[ScheduleAction] = None
+
+class ScheduleCreate(BaseModel):
+    name: str
+    zone_id: Optional[str] = None
+    area: Optional[str] = None
+    timezone: str = "UTC"
+    enabled: bool = True
+    rules: List[ScheduleRule] = []
+    exceptions: List[ScheduleException] = []
+
+class ScheduleUpdate(BaseModel):
+    name: Optional[str] = None
+    zone_id: Optional[str] = None
+    area: Optional[str] = None
+    timezone: Optional[str] = None
+    enabled: Optional[bool] = None
+    rules: Optional[List[ScheduleRule]] = None
+    exceptions: Optional[List[ScheduleException]] = None
+
+class CorrelationRule(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    zone_types: List[ZoneType] = []  # all must occur within the window; empty = any type
+    first: Optional[ZoneType] = None  # the sequence must open with this type
+    min_alarms: int = Field(default=1, ge=1)
+    window_seconds: int = Field(default=60, gt=0, le=3600)
+    area: Optional[str] = None  # None = every area, each correlated on its own
+    severity: AlarmSeverity = AlarmSeverity.HIGH
+    enabled: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CorrelationRuleCreate(BaseModel):
+    name: str
+    zone_types: List[ZoneType] = []
+    first: Optional[ZoneType] = None
+    min_alarms: int = Field(default=1, ge=1)
+    window_seconds: int = Field(default=60, gt=0, le=3600)
+    area: Optional[str] = None
+    severity: AlarmSeverity = AlarmSeverity.HIGH
+    enabled: bool = True
+
+class CorrelationRuleUpdate(BaseModel):
+    name: Optional[str] = None
+    zone_types: Optional[List[ZoneType]] = None
+    first: Optional[ZoneType] = None
+    min_alarms: Optional[int] = Field(default=None, ge=1)
+    window_seconds: Optional[int] = Field(default=None, gt=0, le=3600)
+    area: Optional[str] = None
+    severity: Optional[AlarmSeverity] = None
+    enabled: Optional[bool] = None
+
+class IncidentStatus(str, Enum):
+    OPEN = "open"
+    ACKNOWLEDGED = "acknowledged"
+    RESOLVED = "resolved"
+
+class Incident(BaseModel):
+    id: str = Field(default_factory=new_id)  # time-ordered; older documents have uuid4 ids
+    rule_id: str
+    name: str
+    area: str
+    severity: AlarmSeverity
+    status: IncidentStatus = IncidentStatus.OPEN
+    alarm_ids: List[str] = []  # the first INCIDENT_MAX_ALARM_IDS
+    zone_ids: List[str] = []
+    alarm_count: int = 0
+    first_alarm_at: datetime
+    last_alarm_at: datetime
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    acknowledged_at: Optional[datetime] = None
+    resolved_at: Optional[datetime] = None
+    acknowledged_by: Optional[str] = None
+    resolved_by: Optional[str] = None
+
+class DashboardSnapshot(BaseModel):
+    zones: List[Zone]
+    active_alarms: List[Alarm]
+    recent_alarms: List[Alarm]
+    open_incidents: List[Incident] = []
+    stats: SystemStats
+    ws_sequence: int
+    version: str
+    generated_at: datetime
+
 # Utility functions
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -209,6 +608,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         
+        log_user.set(user_id)
         return User(**user)
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
@@ -222,6 +622,922 @@ async def log_event(event_type: str, description: str, user_id: str = None, zone
         metadata=metadata or {}
     )
     await db.events.insert_one(event.dict())
+    await change_versions.bump("events")
+
+# Alarm response analytics
+# Time-to-acknowledge and time-to-resolve are folded into pre-aggregated
+# buckets (one document per day and per month for every zone, area, severity
+# and operator) when an alarm changes state, so reports never scan `alarms`.
+# Durations go into a log-scale histogram for approximate percentiles.
+RESPONSE_HIST_STEPS_PER_OCTAVE = 4
+RESPONSE_PERCENTILES = (50, 90, 95)
+
+def _enum_value(value):
+    return getattr(value, "value", value)
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _day_bucket(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _month_bucket(ts: datetime) -> datetime:
+    return _day_bucket(ts).replace(day=1)
+
+def _next_month(ts: datetime) -> datetime:
+    return (_month_bucket(ts) + timedelta(days=32)).replace(day=1)
+
+def _response_bin(seconds: float) -> int:
+    return int(math.log2(max(seconds, 0.0) + 1) * RESPONSE_HIST_STEPS_PER_OCTAVE)
+
+def _response_bin_value(bin_index: int) -> float:
+    # Geometric midpoint of the bin
+    return 2 ** ((bin_index + 0.5) / RESPONSE_HIST_STEPS_PER_OCTAVE) - 1
+
+def _histogram_percentile(hist: Dict[int, int], count: int, percentile: float) -> Optional[float]:
+    if not count:
+        return None
+    threshold = count * percentile / 100
+    seen = 0
+    for bin_index in sorted(hist):
+        seen += hist[bin_index]
+        if seen >= threshold:
+            return round(_response_bin_value(bin_index), 3)
+    return round(_response_bin_value(max(hist)), 3)
+
+def response_time_updates(
+    alarm: dict, metric: str, at: datetime, operator_id: str, operator_name: Optional[str] = None
+) -> List[UpdateOne]:
+    """Build the bucket upserts for one acknowledge ("ack") or resolve ("resolve")."""
+    triggered_at = alarm["triggered_at"]
+    seconds = max((at - triggered_at).total_seconds(), 0.0)
+    hist_bin = _response_bin(seconds)
+    groups = [
+        (AnalyticsGroup.ZONE, alarm["zone_id"], alarm.get("zone_name")),
+        (AnalyticsGroup.AREA, alarm["area"], alarm["area"]),
+        (AnalyticsGroup.SEVERITY, _enum_value(alarm["severity"]), _enum_value(alarm["severity"])),
+        (AnalyticsGroup.OPERATOR, operator_id, operator_name),
+    ]
+    updates = []
+    for granularity, bucket in (("day", _day_bucket(triggered_at)), ("month", _month_bucket(triggered_at))):
+        for group_by, key, label in groups:
+            updates.append(UpdateOne(
+                {"group_by": group_by.value, "key": key, "granularity": granularity, "bucket": bucket},
+                {
+                    "$inc": {
+                        f"{metric}_count": 1,
+                        f"{metric}_sum": seconds,
+                        f"{metric}_hist.{hist_bin}": 1
+                    },
+                    "$set": {"label": label}
+                },
+                upsert=True
+            ))
+    return updates
+
+def response_bucket_filter(start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """Cover [start, end) with whole-month buckets plus day buckets at the edges."""
+    start_day = _day_bucket(start)
+    end_day = _day_bucket(end) if end == _day_bucket(end) else _day_bucket(end) + timedelta(days=1)
+    first_month = start_day if start_day.day == 1 else _next_month(start_day)
+    last_month = _month_bucket(end_day)
+
+    if first_month >= last_month:
+        return [{"granularity": "day", "bucket": {"$gte": start_day, "$lt": end_day}}]
+
+    ranges = [{"granularity": "month", "bucket": {"$gte": first_month, "$lt": last_month}}]
+    if start_day < first_month:
+        ranges.append({"granularity": "day", "bucket": {"$gte": start_day, "$lt": first_month}})
+    if last_month < end_day:
+        ranges.append({"granularity": "day", "bucket": {"$gte": last_month, "$lt": end_day}})
+    return ranges
+
+def merge_response_buckets(group_by: AnalyticsGroup, buckets: List[dict]) -> List[ResponseTimeStats]:
+    merged: Dict[str, Dict[str, Any]] = {}
+    for bucket in buckets:
+        entry = merged.setdefault(bucket["key"], {
+            "label": bucket.get("label"),
+            "ack_count": 0, "ack_sum": 0.0, "ack_hist": {},
+            "resolve_count": 0, "resolve_sum": 0.0, "resolve_hist": {}
+        })
+        for metric in ("ack", "resolve"):
+            entry[f"{metric}_count"] += bucket.get(f"{metric}_count", 0)
+            entry[f"{metric}_sum"] += bucket.get(f"{metric}_sum", 0.0)
+            hist = entry[f"{metric}_hist"]
+            for hist_bin, count in bucket.get(f"{metric}_hist", {}).items():
+                hist[int(hist_bin)] = hist.get(int(hist_bin), 0) + count
+
+    results = []
+    for key, entry in merged.items():
+        stats = ResponseTimeStats(
+            group_by=group_by,
+            key=key,
+            label=entry["label"],
+            acknowledged_count=entry["ack_count"],
+            resolved_count=entry["resolve_count"]
+        )
+        for metric, prefix, mean_field in (("ack", "tta", "mtta_seconds"), ("resolve", "ttr", "mttr_seconds")):
+            count = entry[f"{metric}_count"]
+            if not count:
+                continue
+            setattr(stats, mean_field, round(entry[f"{metric}_sum"] / count, 3))
+            for percentile in RESPONSE_PERCENTILES:
+                setattr(stats, f"{prefix}_p{percentile}_seconds",
+                        _histogram_percentile(entry[f"{metric}_hist"], count, percentile))
+        results.append(stats)
+    results.sort(key=lambda s: (s.acknowledged_count + s.resolved_count), reverse=True)
+    return results
+
+# Zone activity time series
+# Every trigger bumps per-zone and per-area counters in hourly and daily
+# buckets, so activity charts and heatmaps read a fixed number of small
+# documents per time range no matter how many alarms exist.
+ACTIVITY_MAX_POINTS = 2000
+
+def _hour_bucket(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def _activity_bucket(ts: datetime, granularity: ActivityGranularity) -> datetime:
+    return _hour_bucket(ts) if granularity == ActivityGranularity.HOUR else _day_bucket(ts)
+
+def _activity_step(granularity: ActivityGranularity) -> timedelta:
+    return timedelta(hours=1) if granularity == ActivityGranularity.HOUR else timedelta(days=1)
+
+def activity_bucket_range(start: datetime, end: datetime, granularity: ActivityGranularity) -> List[datetime]:
+    step = _activity_step(granularity)
+    bucket = _activity_bucket(start, granularity)
+    buckets = []
+    while bucket < end:
+        buckets.append(bucket)
+        bucket += step
+    return buckets
+
+def zone_activity_updates(zone: dict, triggered_at: datetime) -> List[UpdateOne]:
+    updates = []
+    for scope, key in (("zone", zone["id"]), ("area", zone["area"])):
+        for granularity in ActivityGranularity:
+            updates.append(UpdateOne(
+                {
+                    "scope": scope,
+                    "key": key,
+                    "granularity": granularity.value,
+                    "bucket": _activity_bucket(triggered_at, granularity)
+                },
+                {"$inc": {"count": 1}},
+                upsert=True
+            ))
+    return updates
+
+async def record_zone_activity(zone: dict, triggered_at: datetime):
+    await db.zone_activity.bulk_write(zone_activity_updates(zone, triggered_at), ordered=False)
+
+def resolve_activity_range(start: Optional[datetime], end: Optional[datetime], granularity: ActivityGranularity):
+    end = _naive_utc(end) if end else datetime.utcnow()
+    if start:
+        start = _naive_utc(start)
+    else:
+        start = end - (timedelta(days=1) if granularity == ActivityGranularity.HOUR else timedelta(days=30))
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    # Check the size before materialising the bucket list
+    if (end - _activity_bucket(start, granularity)) / _activity_step(granularity) > ACTIVITY_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Range too large: at most {ACTIVITY_MAX_POINTS} buckets")
+    return activity_bucket_range(start, end, granularity)
+
+async def trigger_zone(zone: dict, severity: AlarmSeverity, message: str, event_type: str,
+                       description: str, user_id: str = None, metadata: Dict = None) -> Alarm:
+    """Raise an alarm for a zone: correlate it, spool it, broadcast it, and let
+    the replayer write the alarm, its event, incidents and the zone state to
+    the database."""
+    triggered_at = datetime.utcnow()
+    alarm = Alarm(
+        zone_id=zone["id"],
+        zone_name=zone["name"],
+        alarm_type=ZoneType(zone["zone_type"]),
+        severity=severity,
+        message=message,
+        triggered_at=triggered_at,
+        area=zone["area"]
+    )
+    event = Event(
+        event_type=event_type,
+        description=description,
+        user_id=user_id,
+        zone_id=zone["id"],
+        metadata=metadata or {}
+    )
+    alarm_doc = alarm.dict()
+    incident_changes = correlator.observe(alarm_doc)
+    await alarm_spool.append({
+        "type": "zone_trigger",
+        "zone": {"id": zone["id"], "area": zone["area"]},
+        "alarm": alarm_doc,
+        "event": event.dict(),
+        "incidents": [incident_record(alarm_doc, *change) for change in incident_changes]
+    })
+
+    await manager.broadcast({
+        "type": "alarm",
+        "data": alarm_doc
+    })
+    await manager.broadcast({
+        "type": "zone_update",
+        "data": {"id": zone["id"], "status": ZoneStatus.ALARM}
+    })
+    for change in incident_changes:
+        await manager.broadcast(incident_message(alarm_doc, *change))
+    if leader.is_leader:
+        escalator.track(alarm_doc)
+    return alarm
+
+async def apply_spooled_trigger(record: Dict[str, Any]):
+    """Write one spooled zone trigger. Safe to run more than once per record."""
+    alarm, event, zone = record["alarm"], record["event"], record["zone"]
+    if await db.alarms.find_one({"id": alarm["id"]}, {"_id": 1}):
+        return
+
+    # last_alarm_id keeps the $inc from being applied twice if we crashed
+    # between this write and the alarm insert below
+    result = await db.zones.update_one(
+        {"id": zone["id"], "last_alarm_id": {"$ne": alarm["id"]}},
+        {
+            "$set": {
+                "status": ZoneStatus.ALARM,
+                "last_triggered": alarm["triggered_at"],
+                "last_alarm_id": alarm["id"]
+            },
+            "$inc": {
+                "trigger_count": 1
+            }
+        }
+    )
+    if result.modified_count:
+        await record_zone_activity(zone, alarm["triggered_at"])
+    await db.events.update_one({"id": event["id"]}, {"$setOnInsert": event}, upsert=True)
+    incidents = record.get("incidents") or []
+    for incident in incidents:
+        await apply_incident_record(incident)
+    # The alarm goes last: its presence marks the record as fully applied
+    await db.alarms.update_one(
+        {"id": alarm["id"]}, {"$setOnInsert": {**alarm, "stored_at": datetime.utcnow()}}, upsert=True
+    )
+    await change_versions.bump("zones", "alarms", "events", *(["incidents"] if incidents else []))
+
+async def replay_alarm_spool():
+    """Drain spooled triggers into the database, oldest first, backing off
+    while it is unavailable. Logs left by stopped workers are drained first."""
+    delay = ALARM_SPOOL_RETRY_MIN
+    orphans = alarm_spool.orphans()
+    while True:
+        if not orphans:
+            await alarm_spool.ready.wait()
+            alarm_spool.ready.clear()
+        try:
+            while orphans:
+                path, file = orphans[0]
+                for _, record in alarm_spool.orphan_records(path):
+                    await apply_spooled_trigger(record)
+                alarm_spool.discard_orphan(path, file)
+                orphans.pop(0)
+            for offset, record in alarm_spool.pending():
+                await apply_spooled_trigger(record)
+                await alarm_spool.commit(offset)
+            delay = ALARM_SPOOL_RETRY_MIN
+        except Exception as e:
+            logging.error(f"Alarm spool replay failed, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, ALARM_SPOOL_RETRY_MAX)
+            alarm_spool.ready.set()
+
+# Zone import
+# Commissioning a site uploads its zone plan as CSV (with a header line) or as
+# a JSON array / newline-delimited JSON of ZoneCreate objects. The body is
+# parsed as it streams in and handled ZONE_IMPORT_BATCH_SIZE rows at a time:
+# one read finds the batch's existing zones (matched on area and name), then
+# one insert_many and one bulk_write store it. Ordered imports stop at the
+# first failing row, after writing the rows before it; unordered ones skip
+# failing rows and carry on. One event and one broadcast cover the import.
+ZONE_IMPORT_BATCH_SIZE = 500
+ZONE_IMPORT_MAX_ROWS = int(os.environ.get('ZONE_IMPORT_MAX_ROWS', 50000))
+ZONE_IMPORT_MAX_ERRORS = 1000
+ZONE_IMPORT_COLUMNS = ["name", "zone_type", "area", "description"]
+ZONE_IMPORT_REQUIRED = ["name", "zone_type", "area"]
+
+class ZoneImport:
+    def __init__(self, mode: ZoneImportMode, dry_run: bool, ordered: bool):
+        self.result = ZoneImportResult(mode=mode, dry_run=dry_run, ordered=ordered)
+        self.batch: List[tuple] = []
+        self.seen: Dict[tuple, int] = {}
+
+    @property
+    def stopped(self) -> bool:
+        return self.result.stopped_at is not None
+
+    def fail(self, row: int, errors: List[str]):
+        self.result.failed += 1
+        if len(self.result.errors) < ZONE_IMPORT_MAX_ERRORS:
+            self.result.errors.append(ZoneImportError(row=row, errors=errors))
+        if self.result.ordered:
+            self.result.stopped_at = row
+
+    async def add(self, row: int, raw: Dict[str, Any]):
+        self.result.rows += 1
+        if "__error__" in raw:
+            return self.fail(row, [raw["__error__"]])
+        try:
+            zone = ZoneCreate(**raw)
+        except ValidationError as e:
+            return self.fail(row, [f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()])
+        key = (zone.area, zone.name)
+        if key in self.seen:
+            return self.fail(row, [f"Same area and name as row {self.seen[key]}"])
+        self.seen[key] = row
+        self.batch.append((row, zone))
+        if len(self.batch) >= ZONE_IMPORT_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        existing = {
+            (zone["area"], zone["name"]): zone async for zone in db.zones.find(
+                {"area": {"$in": sorted({z.area for _, z in batch})}, "name": {"$in": [z.name for _, z in batch]}},
+                {"_id": 0, "id": 1, "area": 1, "name": 1, "zone_type": 1, "description": 1}
+            )
+        }
+        inserts, updates = [], []
+        for row, zone in batch:
+            current = existing.get((zone.area, zone.name))
+            if current is None:
+                inserts.append(Zone(**zone.dict()).dict())
+            elif self.result.mode == ZoneImportMode.INSERT:
+                self.fail(row, [f"Zone {zone.name!r} already exists in {zone.area!r}"])
+                if self.result.ordered:
+                    break
+            else:
+                changes = {
+                    field: value for field, value in zone.dict().items()
+                    if _enum_value(current.get(field)) != _enum_value(value)
+                }
+                if changes:
+                    updates.append(UpdateOne({"id": current["id"]}, {"$set": changes}))
+                else:
+                    self.result.unchanged += 1
+
+        if not self.result.dry_run:
+            if inserts:
+                await db.zones.insert_many(inserts, ordered=self.result.ordered)
+            if updates:
+                await db.zones.bulk_write(updates, ordered=self.result.ordered)
+        self.result.inserted += len(inserts)
+        self.result.updated += len(updates)
+
+async def import_zone_rows(rows, zone_import: ZoneImport) -> ZoneImportResult:
+    try:
+        async for row, raw in rows:
+            if zone_import.result.rows >= ZONE_IMPORT_MAX_ROWS:
+                zone_import.result.stopped_at = row
+                zone_import.result.errors.append(
+                    ZoneImportError(row=row, errors=[f"At most {ZONE_IMPORT_MAX_ROWS} rows per import"])
+                )
+                break
+            await zone_import.add(row, raw)
+            if zone_import.stopped:
+                break
+    except ImportFormatError as e:
+        if not e.row:
+            raise HTTPException(status_code=400, detail=str(e))
+        zone_import.result.stopped_at = e.row
+        zone_import.result.errors.append(ZoneImportError(row=e.row, errors=[str(e)]))
+    await zone_import.flush()
+    # Existing-zone conflicts are found at flush time, after later rows' validation errors
+    zone_import.result.errors.sort(key=lambda error: error.row)
+    return zone_import.result
+
+# Alarm state transitions
+# Alarms only move forward: ACTIVE -> ACKNOWLEDGED -> RESOLVED (an ACTIVE alarm
+# may also be resolved directly). Every write carries the allowed source states
+# in its filter, so concurrent operators cannot transition the same alarm twice.
+ALARM_TRANSITIONS = {
+    AlarmStatus.ACKNOWLEDGED: ([AlarmStatus.ACTIVE], "acknowledged_at", "acknowledged_by", "ack", "alarm_acknowledged"),
+    AlarmStatus.RESOLVED: ([AlarmStatus.ACTIVE, AlarmStatus.ACKNOWLEDGED], "resolved_at", "resolved_by", "resolve", "alarm_resolved"),
+}
+BULK_ALARM_LIMIT = 5000
+
+def merge_bucket_updates(updates: List[UpdateOne]) -> List[UpdateOne]:
+    """Fold upserts that hit the same bucket into one, summing their $inc."""
+    merged: Dict[tuple, UpdateOne] = {}
+    for update in updates:
+        key = tuple(sorted((k, str(v)) for k, v in update._filter.items()))
+        existing = merged.get(key)
+        if existing is None:
+            merged[key] = UpdateOne(update._filter, {k: dict(v) for k, v in update._doc.items()}, upsert=True)
+            continue
+        for field, amount in update._doc["$inc"].items():
+            existing._doc["$inc"][field] = existing._doc["$inc"].get(field, 0) + amount
+    return list(merged.values())
+
+def bulk_alarm_query(request: BulkAlarmRequest) -> Dict[str, Any]:
+    if (request.alarm_ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Provide either alarm_ids or filter")
+    if request.alarm_ids is not None:
+        if len(request.alarm_ids) > BULK_ALARM_LIMIT:
+            raise HTTPException(status_code=400, detail=f"At most {BULK_ALARM_LIMIT} alarm ids per request")
+        return {"id": {"$in": request.alarm_ids}}
+
+    query: Dict[str, Any] = {}
+    if request.filter.zone_id:
+        query["zone_id"] = request.filter.zone_id
+    if request.filter.area:
+        query["area"] = request.filter.area
+    if request.filter.severity:
+        query["severity"] = request.filter.severity
+    if request.filter.triggered_before:
+        query["triggered_at"] = {"$lt": _naive_utc(request.filter.triggered_before)}
+    return query
+
+async def transition_alarms(query: Dict[str, Any], target: AlarmStatus, user: User) -> BulkAlarmResult:
+    """Move every matching alarm to `target` with one update_many, one event
+    insert and one broadcast, and return the alarms this call transitioned."""
+    sources, at_field, by_field, metric, event_type = ALARM_TRANSITIONS[target]
+    query = {**query, "status": {"$in": sources}}
+    candidates = await db.alarms.find(
+        query,
+        {"_id": 0, "id": 1, "zone_id": 1, "zone_name": 1, "area": 1, "severity": 1, "triggered_at": 1}
+    ).limit(BULK_ALARM_LIMIT + 1).to_list(None)
+    has_more = len(candidates) > BULK_ALARM_LIMIT
+    candidates = candidates[:BULK_ALARM_LIMIT]
+    if not candidates:
+        return BulkAlarmResult(status=target, updated=0, alarm_ids=[])
+
+    # MongoDB stores milliseconds; truncate so the read-back below matches
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    ids = [alarm["id"] for alarm in candidates]
+    result = await db.alarms.update_many(
+        {**query, "id": {"$in": ids}},
+        {"$set": {"status": target, at_field: now, by_field: user.id}}
+    )
+    if result.modified_count < len(ids):
+        # Someone else moved some of them first; keep only the ones we changed
+        ours = {
+            doc["id"] async for doc in db.alarms.find(
+                {"id": {"$in": ids}, "status": target, at_field: now, by_field: user.id},
+                {"_id": 0, "id": 1}
+            )
+        }
+        candidates = [alarm for alarm in candidates if alarm["id"] in ours]
+        ids = [alarm["id"] for alarm in candidates]
+    if not candidates:
+        return BulkAlarmResult(status=target, updated=0, alarm_ids=[], has_more=has_more)
+    escalator.cancel(ids)
+
+    analytics = []
+    for alarm in candidates:
+        analytics.extend(response_time_updates(alarm, metric, now, user.id, user.name))
+    await db.alarm_response_stats.bulk_write(merge_bucket_updates(analytics), ordered=False)
+
+    zone_ids = sorted({alarm["zone_id"] for alarm in candidates})
+    if target == AlarmStatus.RESOLVED:
+        await db.zones.update_many({"id": {"$in": zone_ids}}, {"$set": {"status": ZoneStatus.NORMAL}})
+        await change_versions.bump("alarms", "zones")
+    else:
+        await change_versions.bump("alarms")
+
+    action = "acknowledged" if target == AlarmStatus.ACKNOWLEDGED else "resolved"
+    await db.events.insert_many([
+        Event(
+            event_type=event_type,
+            description=f"Alarm {alarm['id']} {action}",
+            user_id=user.id,
+            zone_id=alarm["zone_id"],
+            timestamp=now,
+            metadata={"bulk": len(candidates) > 1}
+        ).dict()
+        for alarm in candidates
+    ])
+    await change_versions.bump("events")
+
+    if len(ids) == 1:
+        await manager.broadcast({"type": "alarm_update", "data": {"id": ids[0], "status": target}})
+    else:
+        await manager.broadcast({"type": "alarm_updates", "data": {"ids": ids, "status": target}})
+    if target == AlarmStatus.RESOLVED:
+        if len(zone_ids) == 1:
+            await manager.broadcast({"type": "zone_update", "data": {"id": zone_ids[0], "status": ZoneStatus.NORMAL}})
+        else:
+            await manager.broadcast({
+                "type": "zone_updates",
+                "data": [{"id": zone_id, "status": ZoneStatus.NORMAL} for zone_id in zone_ids]
+            })
+
+    return BulkAlarmResult(status=target, updated=len(ids), alarm_ids=ids, has_more=has_more)
+
+async def raise_transition_conflict(alarm_id: str):
+    alarm = await db.alarms.find_one({"id": alarm_id}, {"_id": 0, "status": 1})
+    if not alarm:
+        raise HTTPException(status_code=404, detail="Alarm not found")
+    raise HTTPException(status_code=409, detail=f"Alarm is already {_enum_value(alarm['status'])}")
+
+# Arming schedules
+# Each schedule arms or disarms one zone or a whole area on weekly rules, with
+# per-date exceptions, in its own time zone. The leader keeps a timer heap of
+# every schedule's next transition and sleeps until the earliest one; due
+# changes are written with one update_many per action and sent as a single
+# broadcast. Any schedule write bumps the "schedules" change version, which
+# makes the leader reload the heap (within CHANGE_VERSION_SYNC_INTERVAL when
+# the write landed on another worker). Each schedule remembers the due time
+# of its last applied transition, so one missed while no leader ran is still
+# carried out when the heap is next loaded.
+schedule_timer = ScheduleTimer()
+
+def schedule_document(schedule: Schedule) -> Dict[str, Any]:
+    doc = schedule.dict(exclude={"next_run", "next_action"})
+    for exception in doc["exceptions"]:
+        exception["date"] = exception["date"].isoformat()
+    return doc
+
+def schedule_response(doc: Dict[str, Any]) -> Schedule:
+    schedule = Schedule(**doc)
+    upcoming = next_transition(doc, datetime.utcnow())
+    if upcoming:
+        schedule.next_run, schedule.next_action = upcoming
+    return schedule
+
+async def validate_schedule(schedule: Schedule):
+    if (schedule.zone_id is None) == (schedule.area is None):
+        raise HTTPException(status_code=400, detail="Provide either zone_id or area")
+    try:
+        ZoneInfo(schedule.timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone {schedule.timezone}")
+    if any(not rule.days or any(day not in range(7) for day in rule.days) for rule in schedule.rules):
+        raise HTTPException(status_code=400, detail="Rule days must be 0 (Monday) to 6 (Sunday)")
+    if schedule.zone_id and not await db.zones.find_one({"id": schedule.zone_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Zone not found")
+
+async def load_schedules() -> List[Dict[str, Any]]:
+    return await db.schedules.find({"enabled": True}, {"_id": 0}).to_list(None)
+
+async def apply_scheduled_changes(batch):
+    """Arm/disarm every zone a batch of due schedule transitions targets."""
+    # The latest transition per target wins; at the same instant arming wins
+    latest: Dict[tuple, tuple] = {}
+    for schedule, action, due in batch:
+        target = ("zone", schedule["zone_id"]) if schedule.get("zone_id") else ("area", schedule["area"])
+        rank = (due, action == ScheduleAction.ARM)
+        if target not in latest or rank > latest[target][0]:
+            latest[target] = (rank, action)
+
+    updates = []
+    counts = {}
+    for action in (ScheduleAction.DISARM, ScheduleAction.ARM):
+        zone_ids = [key for (kind, key), (_, a) in latest.items() if kind == "zone" and a == action]
+        areas = [key for (kind, key), (_, a) in latest.items() if kind == "area" and a == action]
+        if not zone_ids and not areas:
+            continue
+        arm = action == ScheduleAction.ARM
+        fields = {"is_armed": True} if arm else {"is_armed": False, "status": ZoneStatus.NORMAL}
+        # Only zones that actually change are written and broadcast
+        query = {"$or": [{"id": {"$in": zone_ids}}, {"area": {"$in": areas}}], "is_armed": not arm}
+        changed = [doc["id"] async for doc in db.zones.find(query, {"_id": 0, "id": 1})]
+        if changed:
+            await db.zones.update_many({"id": {"$in": changed}, "is_armed": not arm}, {"$set": fields})
+            updates.extend({"id": zone_id, **fields} for zone_id in changed)
+        counts[action.value] = len(changed)
+
+    # Recorded after the zone writes, so a leader that dies in between
+    # leaves the transition to be caught up by the next one
+    applied: Dict[datetime, List[str]] = {}
+    for schedule, _, due in batch:
+        applied.setdefault(due, []).append(schedule["id"])
+    for due, schedule_ids in applied.items():
+        await db.schedules.update_many({"id": {"$in": schedule_ids}}, {"$set": {"last_applied_at": due}})
+
+    if not updates:
+        return
+    await change_versions.bump("zones")
+    await log_event(
+        "schedule_applied",
+        f"Schedules armed {counts.get('arm', 0)} and disarmed {counts.get('disarm', 0)} zones",
+        metadata={
+            "schedules": sorted({schedule["id"] for schedule, _, _ in batch}),
+            "armed": counts.get("arm", 0),
+            "disarmed": counts.get("disarm", 0)
+        }
+    )
+    if len(updates) == 1:
+        await manager.broadcast({"type": "zone_update", "data": updates[0]})
+    else:
+        await manager.broadcast({"type": "zone_updates", "data": updates})
+
+async def run_schedules():
+    await schedule_timer.run(leader_fenced(apply_scheduled_changes), load_schedules)
+
+change_versions.watch("schedules", schedule_timer.request_reload)
+
+# Alarm escalation
+# Policies (per severity and/or area, most specific wins) list steps that fire
+# a number of seconds after an alarm was triggered if it is still ACTIVE:
+# re-broadcast it to a wider audience or raise its severity. The leader keeps
+# one deadline per open alarm in an indexed heap: acknowledging or resolving
+# removes it in O(log n), and nothing scans `alarms` while waiting. Alarms
+# raised on other workers are picked up from the "alarms" change version by
+# reading the ones stored since the last look (stored_at is set when the spool
+# replayer writes an alarm; the overlap covers clock skew between workers).
+ESCALATION_SYNC_OVERLAP = timedelta(seconds=float(os.environ.get('ESCALATION_SYNC_OVERLAP', 10)))
+SEVERITY_ORDER = [AlarmSeverity.LOW, AlarmSeverity.MEDIUM, AlarmSeverity.HIGH, AlarmSeverity.CRITICAL]
+ESCALATION_ALARM_FIELDS = {
+    "_id": 0, "id": 1, "severity": 1, "area": 1, "triggered_at": 1,
+    "escalation_level": 1, "escalation_policy_id": 1
+}
+
+escalator = Escalator(sync_interval=CHANGE_VERSION_SYNC_INTERVAL)
+
+def raised_severity(severity) -> AlarmSeverity:
+    index = SEVERITY_ORDER.index(AlarmSeverity(severity))
+    return SEVERITY_ORDER[min(index + 1, len(SEVERITY_ORDER) - 1)]
+
+async def load_escalation_policies() -> List[Dict[str, Any]]:
+    return await db.escalation_policies.find({"enabled": True}, {"_id": 0}).to_list(None)
+
+async def load_open_alarms() -> List[Dict[str, Any]]:
+    return await db.alarms.find({"status": AlarmStatus.ACTIVE}, ESCALATION_ALARM_FIELDS).to_list(None)
+
+async def load_recent_alarms(since: datetime) -> List[Dict[str, Any]]:
+    return await db.alarms.find(
+        {"status": AlarmStatus.ACTIVE, "stored_at": {"$gte": since - ESCALATION_SYNC_OVERLAP}},
+        ESCALATION_ALARM_FIELDS
+    ).to_list(None)
+
+async def apply_escalations(batch) -> List[str]:
+    """Carry out a batch of due escalation steps; returns the alarms that
+    were no longer ACTIVE and so were skipped."""
+    ids = [alarm_id for alarm_id, *_ in batch]
+    open_alarms = {
+        doc["id"]: doc async for doc in db.alarms.find(
+            {"id": {"$in": ids}, "status": AlarmStatus.ACTIVE},
+            {"_id": 0, "id": 1, "severity": 1, "zone_id": 1, "zone_name": 1, "area": 1}
+        )
+    }
+    closed = [alarm_id for alarm_id in ids if alarm_id not in open_alarms]
+
+    escalations = {}
+    for alarm_id, policy_id, level, _, step in batch:
+        alarm = open_alarms.get(alarm_id)
+        if alarm is None:
+            continue
+        previous = escalations.get(alarm_id)
+        severity = AlarmSeverity(previous["severity"] if previous else alarm["severity"])
+        if step["action"] == EscalationAction.RAISE_SEVERITY:
+            severity = raised_severity(severity)
+        escalations[alarm_id] = {
+            "id": alarm_id,
+            "level": level + 1,
+            "action": step["action"],
+            "audience": step.get("audience"),
+            "severity": severity,
+            "policy_id": policy_id,
+            "zone_id": alarm["zone_id"],
+            "zone_name": alarm["zone_name"],
+            "area": alarm["area"]
+        }
+    if not escalations:
+        return closed
+
+    # One update_many per resulting (severity, level, policy)
+    now = datetime.utcnow()
+    groups: Dict[tuple, List[str]] = {}
+    for escalation in escalations.values():
+        key = (escalation["severity"], escalation["level"], escalation["policy_id"])
+        groups.setdefault(key, []).append(escalation["id"])
+    for (severity, level, policy_id), group in groups.items():
+        await db.alarms.update_many(
+            {"id": {"$in": group}, "status": AlarmStatus.ACTIVE},
+            {"$set": {
+                "severity": severity,
+                "escalation_level": level,
+                "escalation_policy_id": policy_id,
+                "escalated_at": now
+            }}
+        )
+    await change_versions.bump("alarms")
+
+    await db.events.insert_many([
+        Event(
+            event_type="alarm_escalated",
+            description=f"Alarm {e['id']} escalated to level {e['level']} ({_enum_value(e['action'])})",
+            zone_id=e["zone_id"],
+            timestamp=now,
+            metadata={"level": e["level"], "severity": e["severity"], "audience": e["audience"], "policy_id": e["policy_id"]}
+        ).dict()
+        for e in escalations.values()
+    ])
+    await change_versions.bump("events")
+
+    data = list(escalations.values())
+    if len(data) == 1:
+        await manager.broadcast({"type": "alarm_escalation", "data": data[0]})
+    else:
+        await manager.broadcast({"type": "alarm_escalations", "data": data})
+    return closed
+
+async def run_escalations():
+    await escalator.run(leader_fenced(apply_escalations, []), load_escalation_policies,
+                        load_open_alarms, load_recent_alarms)
+
+change_versions.watch("escalation_policies", escalator.request_reload)
+change_versions.watch("alarms", escalator.request_sync)
+
+# Incident correlation
+# Every worker feeds the alarms it raises through an in-memory correlator
+# (sliding windows per rule and area, see correlation.py) before spooling
+# them, so grouping costs O(1) per trigger and never reads `alarms` back.
+# Incident changes travel in the alarm's spool record: a new incident as a
+# full document, a joining alarm as a delta guarded by last_alarm_id so a
+# replay cannot apply it twice. A delta never lands on a RESOLVED incident:
+# if another worker resolved it, the alarm starts (or joins) a successor
+# incident instead. Correlation is per worker: alarms of one area are
+# expected to be raised on one worker (as the simulator, a leader singleton,
+# does); alarms of one area split across workers never correlate.
+DEFAULT_CORRELATION_RULES = [
+    CorrelationRule(
+        id="intrusion",
+        name="Intrusion",
+        first=ZoneType.GLASS_BREAK,
+        zone_types=[ZoneType.GLASS_BREAK, ZoneType.MOTION, ZoneType.DOOR_CONTACT],
+        window_seconds=60,
+        severity=AlarmSeverity.CRITICAL
+    )
+]
+CORRELATION_RELOAD_RETRY_DELAY = 5
+
+correlator = CorrelationEngine(id_factory=new_id)
+correlation_rules_changed = asyncio.Event()
+change_versions.watch("correlation_rules", correlation_rules_changed.set)
+
+def validate_correlation_rule(rule: CorrelationRule):
+    if not rule.zone_types and rule.min_alarms < 2:
+        raise HTTPException(status_code=400, detail="A rule needs zone_types or min_alarms of at least 2")
+    if rule.first and rule.zone_types and rule.first not in rule.zone_types:
+        raise HTTPException(status_code=400, detail="first must be one of zone_types")
+
+async def seed_correlation_rules():
+    """Install the default rules on a fresh database (disable them rather than delete)."""
+    if await db.correlation_rules.count_documents({}):
+        return
+    for rule in DEFAULT_CORRELATION_RULES:
+        await db.correlation_rules.update_one({"id": rule.id}, {"$setOnInsert": rule.dict()}, upsert=True)
+    await change_versions.bump("correlation_rules")
+
+async def run_correlation_rules():
+    """Keep this worker's correlator in step with `correlation_rules`."""
+    correlation_rules_changed.set()
+    while True:
+        await correlation_rules_changed.wait()
+        correlation_rules_changed.clear()
+        try:
+            correlator.set_rules(await db.correlation_rules.find({"enabled": True}, {"_id": 0}).to_list(None))
+        except Exception as e:
+            logging.error(f"Loading correlation rules failed: {e}")
+            await asyncio.sleep(CORRELATION_RELOAD_RETRY_DELAY)
+            correlation_rules_changed.set()
+
+def incident_record(alarm: Dict[str, Any], change: str, incident: Dict[str, Any], pushed: Dict[str, Any]) -> Dict[str, Any]:
+    """The spooled form of one incident change caused by `alarm`."""
+    if change == "created":
+        return {"change": change, "incident": {**incident, "last_alarm_id": alarm["id"]}}
+    return {
+        "change": change,
+        "id": incident["id"],
+        "alarm_id": alarm["id"],
+        "zone_id": alarm["zone_id"],
+        "last_alarm_at": incident["last_alarm_at"],
+        "push": pushed,
+        # Used if the incident turns out to be resolved (on another worker)
+        "successor_id": new_id()
+    }
+
+def incident_message(alarm: Dict[str, Any], change: str, incident: Dict[str, Any], pushed: Dict[str, Any]) -> Dict[str, Any]:
+    if change == "created":
+        return {"type": "incident", "data": Incident(**incident).dict()}
+    return {"type": "incident_update", "data": {
+        "id": incident["id"],
+        "alarm_id": alarm["id"],
+        "zone_id": alarm["zone_id"],
+        "alarm_count": incident["alarm_count"],
+        "last_alarm_at": incident["last_alarm_at"]
+    }}
+
+async def apply_incident_record(record: Dict[str, Any]):
+    if record["change"] == "created":
+        incident = record["incident"]
+        await db.incidents.update_one(
+            {"id": incident["id"]},
+            {"$setOnInsert": {**Incident(**incident).dict(), "last_alarm_id": incident["last_alarm_id"]}},
+            upsert=True
+        )
+        return
+    joined_id, alarm_id, push = record["id"], record["alarm_id"], record["push"]
+    incident_id = joined_id
+    while True:
+        update = {
+            "$inc": {"alarm_count": 1},
+            "$max": {"last_alarm_at": record["last_alarm_at"]},
+            "$set": {"last_alarm_id": alarm_id}
+        }
+        if push:
+            update["$push"] = push
+        result = await db.incidents.update_one(
+            {"id": incident_id, "status": {"$ne": IncidentStatus.RESOLVED}, "last_alarm_id": {"$ne": alarm_id}},
+            update
+        )
+        if result.modified_count:
+            return
+        doc = await db.incidents.find_one({"id": incident_id}, {"_id": 0})
+        if doc is None or doc.get("last_alarm_id") == alarm_id or alarm_id in doc["alarm_ids"]:
+            return
+        if doc["status"] != IncidentStatus.RESOLVED:
+            return
+        # Resolved while this worker still had it open: the alarm starts a
+        # successor incident, shared by every alarm that arrives this way
+        await db.incidents.update_one(
+            {"id": incident_id, "successor_id": {"$exists": False}},
+            {"$set": {"successor_id": record.get("successor_id") or new_id()}}
+        )
+        successor_id = (await db.incidents.find_one({"id": incident_id}, {"_id": 0, "successor_id": 1}))["successor_id"]
+        zone_id = record.get("zone_id") or push.get("zone_ids")
+        successor = Incident(
+            id=successor_id,
+            rule_id=doc["rule_id"],
+            name=doc["name"],
+            area=doc["area"],
+            severity=doc["severity"],
+            alarm_ids=[alarm_id],
+            zone_ids=[zone_id] if zone_id else [],
+            alarm_count=1,
+            first_alarm_at=record["last_alarm_at"],
+            last_alarm_at=record["last_alarm_at"]
+        ).dict()
+        result = await db.incidents.update_one(
+            {"id": successor_id},
+            {"$setOnInsert": {**successor, "last_alarm_id": alarm_id, "previous_id": incident_id}},
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            correlator.adopt(joined_id, successor)
+            await change_versions.bump("incidents")
+            await manager.broadcast({"type": "incident", "data": successor})
+            return
+        # Someone else started it already: join it like any open incident
+        existing = await db.incidents.find_one({"id": successor_id}, {"_id": 0})
+        correlator.adopt(joined_id, existing)
+        if alarm_id in existing["alarm_ids"]:
+            return
+        incident_id = successor_id
+        push = {}
+        if alarm_id not in existing["alarm_ids"] and len(existing["alarm_ids"]) < INCIDENT_MAX_ALARM_IDS:
+            push["alarm_ids"] = alarm_id
+        if zone_id and zone_id not in existing["zone_ids"]:
+            push["zone_ids"] = zone_id
+
+# Incidents move forward like alarms; acknowledging or resolving one does the
+# same to its (first INCIDENT_MAX_ALARM_IDS) alarms
+INCIDENT_TRANSITIONS = {
+    IncidentStatus.ACKNOWLEDGED: ([IncidentStatus.OPEN], "acknowledged_at", "acknowledged_by", AlarmStatus.ACKNOWLEDGED),
+    IncidentStatus.RESOLVED: ([IncidentStatus.OPEN, IncidentStatus.ACKNOWLEDGED], "resolved_at", "resolved_by", AlarmStatus.RESOLVED),
+}
+
+async def transition_incident(incident_id: str, target: IncidentStatus, user: User) -> Incident:
+    sources, at_field, by_field, alarm_target = INCIDENT_TRANSITIONS[target]
+    now = datetime.utcnow()
+    doc = await db.incidents.find_one_and_update(
+        {"id": incident_id, "status": {"$in": sources}},
+        {"$set": {"status": target, at_field: now, by_field: user.id}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if doc is None:
+        existing = await db.incidents.find_one({"id": incident_id}, {"_id": 0, "status": 1})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Incident not found")
+        raise HTTPException(status_code=409, detail=f"Incident is already {_enum_value(existing['status'])}")
+    if target == IncidentStatus.RESOLVED:
+        correlator.close(incident_id)
+    await change_versions.bump("incidents")
+
+    await transition_alarms({"id": {"$in": doc["alarm_ids"]}}, alarm_target, user)
+    action = "acknowledged" if target == IncidentStatus.ACKNOWLEDGED else "resolved"
+    await log_event(f"incident_{action}", f"Incident {doc['name']} in {doc['area']} {action}", user.id,
+                    metadata={"incident_id": incident_id, "alarm_count": doc["alarm_count"]})
+    await manager.broadcast({
+        "type": "incident_update",
+        "data": {"id": incident_id, "status": target, at_field: now, by_field: user.id}
+    })
+    return Incident(**doc)
 
 # Background task to simulate zone activity
 async def simulate_zone_activity():
@@ -230,51 +1546,21 @@ async def simulate_zone_activity():
             zones = await db.zones.find({"is_armed": True}).to_list(1000)
             if zones:
                 # Randomly trigger some zones (very low probability)
-                if random.random() < 0.1:  # 10% chance every 30 seconds
+                # Fencing check, in case we were paused past our lease
+                if random.random() < 0.1 and await leader.still_leader():  # 10% chance every 30 seconds
                     zone = random.choice(zones)
                     
-                    # Update zone status
-                    await db.zones.update_one(
-                        {"id": zone["id"]},
-                        {
-                            "$set": {
-                                "status": ZoneStatus.ALARM,
-                                "last_triggered": datetime.utcnow(),
-                                "$inc": {"trigger_count": 1}
-                            }
-                        }
-                    )
-                    
-                    # Create alarm
+                    # Update zone status and create alarm
                     severity = random.choice([AlarmSeverity.LOW, AlarmSeverity.MEDIUM, AlarmSeverity.HIGH, AlarmSeverity.CRITICAL])
-                    alarm = Alarm(
-                        zone_id=zone["id"],
-                        zone_name=zone["name"],
-                        alarm_type=ZoneType(zone["zone_type"]),
-                        severity=severity,
-                        message=f"Zone '{zone['name']}' triggered - {zone['zone_type']} detected",
-                        area=zone["area"]
-                    )
-                    await db.alarms.insert_one(alarm.dict())
-                    
-                    # Log event
-                    await log_event(
-                        "zone_triggered",
-                        f"Zone {zone['name']} triggered alarm",
-                        zone_id=zone["id"],
-                        metadata={"severity": severity, "zone_type": zone["zone_type"]}
-                    )
-                    
-                    # Broadcast to all connected clients
-                    await manager.broadcast(json.dumps({
-                        "type": "alarm",
-                        "data": alarm.dict()
-                    }))
-                    
-                    await manager.broadcast(json.dumps({
-                        "type": "zone_update",
-                        "data": {"id": zone["id"], "status": ZoneStatus.ALARM}
-                    }))
+                    with log_context(route="simulator", zone=zone["id"]):
+                        await trigger_zone(
+                            zone,
+                            severity,
+                            f"Zone '{zone['name']}' triggered - {zone['zone_type']} detected",
+                            "zone_triggered",
+                            f"Zone {zone['name']} triggered alarm",
+                            metadata={"severity": severity, "zone_type": zone["zone_type"]}
+                        )
                     
         except Exception as e:
             logging.error(f"Error in simulation: {e}")
@@ -284,19 +1570,138 @@ async def simulate_zone_activity():
 # Start background task
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(simulate_zone_activity())
+    await db.alarm_response_stats.create_index(
+        [("group_by", 1), ("granularity", 1), ("bucket", 1), ("key", 1)], unique=True
+    )
+    await db.zone_activity.create_index(
+        [("scope", 1), ("key", 1), ("granularity", 1), ("bucket", 1)], unique=True
+    )
+    await db.alarms.create_index([("status", 1), ("stored_at", 1)])
+    # Newest-first pages read these backwards
+    await db.alarms.create_index([("id", 1)])
+    await db.events.create_index([("id", 1)])
+    await db.incidents.create_index([("id", 1)], unique=True)
+    await seed_correlation_rules()
+    asyncio.create_task(run_correlation_rules())
+    alarm_spool.open()
+    asyncio.create_task(replay_alarm_spool())
+    leader.singleton("simulator", simulate_zone_activity)
+    leader.singleton("scheduler", run_schedules)
+    leader.singleton("escalation", run_escalations)
+    asyncio.create_task(leader.run())
+    asyncio.create_task(manager.heartbeat())
+    asyncio.create_task(change_versions.sync())
 
 # WebSocket endpoint
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # Clients pick their wire format at connect time: /ws?encoding=msgpack
+    # selects compact binary frames, anything else keeps JSON text frames.
+    requested_encoding = websocket.query_params.get("encoding", "json")
+    encoding = negotiate_encoding(requested_encoding)
+    if not await manager.connect(websocket, client_ip(websocket), encoding, requested_encoding):
+        return
     try:
         while True:
-            data = await websocket.receive_text()
-            # Handle incoming WebSocket messages if needed
-    except WebSocketDisconnect:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            # Any inbound frame (including the client's "pong") proves liveness
+            manager.touch(websocket)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
         manager.disconnect(websocket)
 
+@api_router.get("/admission/stats")
+async def get_admission_stats(current_user: User = Depends(get_current_user)):
+    return {
+        "rate_limited": rate_limit_rejections,
+        "tracked_keys": {f"{route}:{scope}": len(l.buckets) for (route, scope), l in rate_limiters.items()},
+        "heavy_in_flight": heavy_requests.in_flight,
+        "heavy_limit": heavy_requests.limit,
+        "heavy_rejected": heavy_requests.rejected
+    }
+
+@api_router.get("/ws/stats")
+async def get_websocket_stats(current_user: User = Depends(get_current_user)):
+    return manager.snapshot()
+
+@api_router.get("/spool/stats")
+async def get_spool_stats(current_user: User = Depends(get_current_user)):
+    return alarm_spool.snapshot()
+
+@api_router.get("/logging/stats")
+async def get_logging_stats(current_user: User = Depends(get_current_user)):
+    return log_pipeline.snapshot()
+
+@api_router.get("/leader/status")
+async def get_leader_status(current_user: User = Depends(get_current_user)):
+    return leader.snapshot()
+
+# Conditional GET support
+# Newest-first pages
+# Time-ordered ids (ids.py) sort by creation time and after every legacy uuid4
+# id, so pages of new documents come straight off the `id` index. Once those
+# run out, legacy documents follow in `time_field` order; `before` takes the
+# last id of the previous page either way.
+PAGE_MAX_LIMIT = 1000
+
+def check_page_limit(limit: int) -> int:
+    if not 1 <= limit <= PAGE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {PAGE_MAX_LIMIT}")
+    return limit
+
+async def newest_first(collection, query: Dict[str, Any], limit: int, before: Optional[str],
+                       time_field: str) -> List[Dict[str, Any]]:
+    docs = []
+    legacy = {"id": {"$lt": TIME_ORDERED_MIN}}
+    if before is None or is_time_ordered(before):
+        id_range = {"$gte": TIME_ORDERED_MIN}
+        if before is not None:
+            id_range["$lt"] = before
+        docs = await collection.find({**query, "id": id_range}, {"_id": 0}).sort("id", -1).to_list(limit)
+        if len(docs) == limit:
+            return docs
+    else:
+        # The last document of the previous page
+        boundary = await collection.find_one({"id": before}, {"_id": 0, time_field: 1})
+        if boundary is None:
+            raise HTTPException(status_code=400, detail="Unknown 'before' id")
+        legacy["$or"] = [
+            {time_field: {"$lt": boundary[time_field]}},
+            {time_field: boundary[time_field], "id": {"$lt": before}}
+        ]
+    docs += await collection.find({**query, **legacy}, {"_id": 0}).sort(
+        [(time_field, -1), ("id", -1)]
+    ).to_list(limit - len(docs))
+    return docs
+
+def _etag_for(resource: str) -> str:
+    if resource == "dashboard_stats":
+        # total_events_today also changes at midnight
+        return change_versions.etag("zones", "alarms", "events", f"day-{datetime.utcnow().date()}")
+    if resource == "dashboard_snapshot":
+        return change_versions.etag("zones", "alarms", "events", "incidents", f"day-{datetime.utcnow().date()}")
+    return change_versions.etag(resource)
+
+def conditional_get(resource: str):
+    """Answer If-None-Match with 304 before authentication touches MongoDB.
+
+    Only a token with a valid signature gets a 304; anything else falls
+    through to the normal handler and its authentication.
+    """
+    async def dependency(request: Request):
+        etag = _etag_for(resource)
+        if request.headers.get('if-none-match') == etag and _token_subject(request):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+        request.state.etag = etag
+    return dependency
+
+def set_etag(request: Request, response: Response):
+    response.headers["ETag"] = request.state.etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
 # Auth endpoints
 @api_router.post("/auth/register")
 async def register_user(user_data: UserCreate):
@@ -324,8 +1729,10 @@ async def register_user(user_data: UserCreate):
     
     return {"message": "User registered successfully", "user": user}
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(rate_limit("login", heavy=True))])
 async def login_user(login_data: UserLogin):
+    check_rate_limit("login", "account", login_data.email.lower())
+
     # Find user
     user_doc = await db.users.find_one({"email": login_data.email})
     if not user_doc:
@@ -360,11 +1767,41 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 async def create_zone(zone_data: ZoneCreate, current_user: User = Depends(get_current_user)):
     zone = Zone(**zone_data.dict())
     await db.zones.insert_one(zone.dict())
+    await change_versions.bump("zones")
     await log_event("zone_created", f"Zone {zone.name} created", current_user.id, zone.id)
     return zone
 
-@api_router.get("/zones", response_model=List[Zone])
-async def get_zones(current_user: User = Depends(get_current_user)):
+@api_router.post("/zones/import", response_model=ZoneImportResult,
+                 dependencies=[Depends(rate_limit("zones_import", heavy=True))])
+async def import_zones(request: Request, mode: ZoneImportMode = ZoneImportMode.INSERT, dry_run: bool = False,
+                       ordered: bool = True, current_user: User = Depends(get_current_user)):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "text/csv":
+        rows = read_csv_rows(request.stream(), ZONE_IMPORT_COLUMNS, ZONE_IMPORT_REQUIRED)
+    elif content_type in ("application/json", "application/x-ndjson"):
+        rows = read_json_rows(request.stream())
+    else:
+        raise HTTPException(status_code=415, detail="Send text/csv, application/json or application/x-ndjson")
+
+    result = await import_zone_rows(rows, ZoneImport(mode, dry_run, ordered))
+    if not dry_run and (result.inserted or result.updated):
+        await change_versions.bump("zones")
+        await log_event(
+            "zones_imported",
+            f"Zone import: {result.inserted} created, {result.updated} updated, {result.failed} failed",
+            current_user.id,
+            metadata=result.dict(include={"mode", "ordered", "rows", "inserted", "updated", "unchanged", "failed"})
+        )
+        await manager.broadcast({
+            "type": "zones_imported",
+            "data": {"inserted": result.inserted, "updated": result.updated}
+        })
+    return result
+
+@api_router.get("/zones", response_model=List[Zone],
+                dependencies=[Depends(conditional_get("zones")), Depends(rate_limit("zones", heavy=True))])
+async def get_zones(request: Request, response: Response, current_user: User = Depends(get_current_user)):
+    set_etag(request, response)
     zones = await db.zones.find().to_list(1000)
     return [Zone(**zone) for zone in zones]
 
@@ -375,6 +1812,37 @@ async def get_zone(zone_id: str, current_user: User = Depends(get_current_user))
         raise HTTPException(status_code=404, detail="Zone not found")
     return Zone(**zone)
 
+@api_router.get("/zones/{zone_id}/activity", response_model=ZoneActivity)
+async def get_zone_activity(
+    zone_id: str,
+    granularity: ActivityGranularity = ActivityGranularity.HOUR,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    buckets = resolve_activity_range(start, end, granularity)
+    if not await db.zones.find_one({"id": zone_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Zone not found")
+    counts = {
+        doc["bucket"]: doc["count"]
+        async for doc in db.zone_activity.find(
+            {
+                "scope": "zone",
+                "key": zone_id,
+                "granularity": granularity.value,
+                "bucket": {"$gte": buckets[0], "$lte": buckets[-1]}
+            },
+            {"_id": 0, "bucket": 1, "count": 1}
+        )
+    }
+    series = [ActivityBucket(bucket=bucket, count=counts.get(bucket, 0)) for bucket in buckets]
+    return ZoneActivity(
+        zone_id=zone_id,
+        granularity=granularity,
+        total=sum(counts.values()),
+        buckets=series
+    )
+
 @api_router.put("/zones/{zone_id}", response_model=Zone)
 async def update_zone(zone_id: str, zone_data: ZoneUpdate, current_user: User = Depends(get_current_user)):
     zone = await db.zones.find_one({"id": zone_id})
@@ -384,6 +1852,7 @@ async def update_zone(zone_id: str, zone_data: ZoneUpdate, current_user: User =
     update_data = {k: v for k, v in zone_data.dict().items() if v is not None}
     if update_data:
         await db.zones.update_one({"id": zone_id}, {"$set": update_data})
+        await change_versions.bump("zones")
     
     updated_zone = await db.zones.find_one({"id": zone_id})
     updated_zone_obj = Zone(**updated_zone)
@@ -391,16 +1860,10 @@ async def update_zone(zone_id: str, zone_data: ZoneUpdate, current_user: User =
     await log_event("zone_updated", f"Zone {updated_zone_obj.name} updated", current_user.id, zone_id)
     
     # Broadcast zone update
-    zone_dict = updated_zone_obj.dict()
-    # Convert datetime objects to ISO format strings for JSON serialization
-    for key, value in zone_dict.items():
-        if isinstance(value, datetime):
-            zone_dict[key] = value.isoformat()
-    
-    await manager.broadcast(json.dumps({
+    await manager.broadcast({
         "type": "zone_update",
-        "data": zone_dict
-    }))
+        "data": updated_zone_obj.dict()
+    })
     
     return updated_zone_obj
 
@@ -411,6 +1874,7 @@ async def delete_zone(zone_id: str, current_user: User = Depends(get_current_use
         raise HTTPException(status_code=404, detail="Zone not found")
     
     await db.zones.delete_one({"id": zone_id})
+    await change_versions.bump("zones")
     await log_event("zone_deleted", f"Zone {zone['name']} deleted", current_user.id, zone_id)
     
     return {"message": "Zone deleted successfully"}
@@ -422,13 +1886,14 @@ async def arm_zone(zone_id: str, current_user: User = Depends(get_current_user))
         raise HTTPException(status_code=404, detail="Zone not found")
     
     await db.zones.update_one({"id": zone_id}, {"$set": {"is_armed": True}})
+    await change_versions.bump("zones")
     await log_event("zone_armed", f"Zone {zone['name']} armed", current_user.id, zone_id)
     
     # Broadcast zone update
-    await manager.broadcast(json.dumps({
+    await manager.broadcast({
         "type": "zone_update",
         "data": {"id": zone_id, "is_armed": True}
-    }))
+    })
     
     return {"message": "Zone armed successfully"}
 
@@ -439,13 +1904,14 @@ async def disarm_zone(zone_id: str, current_user: User = Depends(get_current_use
         raise HTTPException(status_code=404, detail="Zone not found")
     
     await db.zones.update_one({"id": zone_id}, {"$set": {"is_armed": False, "status": ZoneStatus.NORMAL}})
+    await change_versions.bump("zones")
     await log_event("zone_disarmed", f"Zone {zone['name']} disarmed", current_user.id, zone_id)
     
     # Broadcast zone update
-    await manager.broadcast(json.dumps({
+    await manager.broadcast({
         "type": "zone_update",
         "data": {"id": zone_id, "is_armed": False, "status": ZoneStatus.NORMAL}
-    }))
+    })
     
     return {"message": "Zone disarmed successfully"}
 
@@ -455,129 +1921,244 @@ async def test_alarm_zone(zone_id: str, current_user: User = Depends(get_current
     if not zone:
         raise HTTPException(status_code=404, detail="Zone not found")
 
-    # ✅ MongoDB-Update korrekt getrennt
-    await db.zones.update_one(
-        {"id": zone_id},
-        {
-            "$set": {
-                "status": ZoneStatus.ALARM,
-                "last_triggered": datetime.utcnow()
-            },
-            "$inc": {
-                "trigger_count": 1
-            }
-        }
-    )
-
     # Alarm-Objekt erzeugen
     severity = AlarmSeverity.MEDIUM
-    alarm = Alarm(
-        zone_id=zone_id,
-        zone_name=zone["name"],
-        alarm_type=ZoneType(zone["zone_type"]),
-        severity=severity,
-        message=f"TEST ALARM - Zone '{zone['name']}' manually triggered by {current_user.name}",
-        area=zone["area"]
-    )
-    await db.alarms.insert_one(alarm.dict())
-
-    await log_event(
+    alarm = await trigger_zone(
+        zone,
+        severity,
+        f"TEST ALARM - Zone '{zone['name']}' manually triggered by {current_user.name}",
         "test_alarm_triggered",
         f"Test alarm manually triggered for zone {zone['name']} by {current_user.name}",
         current_user.id,
-        zone_id,
         metadata={"severity": severity, "zone_type": zone["zone_type"], "manual": True}
     )
 
-    # ✅ datetime-Felder serialisierbar machen
-    alarm_data = alarm.dict()
-    for k, v in alarm_data.items():
-        if isinstance(v, datetime):
-            alarm_data[k] = v.isoformat()
+    return {"message": "Test alarm triggered successfully", "alarm": alarm}
 
-    await manager.broadcast(json.dumps({
-        "type": "alarm",
-        "data": alarm_data
-    }))
+# Area endpoints
+@api_router.get("/areas/heatmap", response_model=AreaHeatmap)
+async def get_area_heatmap(
+    granularity: ActivityGranularity = ActivityGranularity.DAY,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    buckets = resolve_activity_range(start, end, granularity)
+    index = {bucket: i for i, bucket in enumerate(buckets)}
+    rows: Dict[str, List[int]] = {}
+    async for doc in db.zone_activity.find(
+        {
+            "scope": "area",
+            "granularity": granularity.value,
+            "bucket": {"$gte": buckets[0], "$lte": buckets[-1]}
+        },
+        {"_id": 0, "key": 1, "bucket": 1, "count": 1}
+    ):
+        counts = rows.setdefault(doc["key"], [0] * len(buckets))
+        counts[index[doc["bucket"]]] += doc["count"]
 
-    await manager.broadcast(json.dumps({
-        "type": "zone_update",
-        "data": {"id": zone_id, "status": ZoneStatus.ALARM}
-    }))
+    return AreaHeatmap(
+        granularity=granularity,
+        buckets=buckets,
+        rows=[
+            AreaHeatmapRow(area=area, total=sum(counts), counts=counts)
+            for area, counts in sorted(rows.items())
+        ]
+    )
 
-    return {"message": "Test alarm triggered successfully", "alarm": alarm}
+# Escalation policy endpoints
+@api_router.get("/escalation-policies", response_model=List[EscalationPolicy])
+async def get_escalation_policies(current_user: User = Depends(get_current_user)):
+    policies = await db.escalation_policies.find({}, {"_id": 0}).to_list(1000)
+    return [EscalationPolicy(**policy) for policy in policies]
+
+@api_router.post("/escalation-policies", response_model=EscalationPolicy)
+async def create_escalation_policy(policy_data: EscalationPolicyCreate, current_user: User = Depends(get_current_user)):
+    if not policy_data.steps:
+        raise HTTPException(status_code=400, detail="A policy needs at least one step")
+    policy = EscalationPolicy(**policy_data.dict())
+    await db.escalation_policies.insert_one(policy.dict())
+    await change_versions.bump("escalation_policies")
+    await log_event("escalation_policy_created", f"Escalation policy {policy.name} created", current_user.id)
+    return policy
+
+@api_router.put("/escalation-policies/{policy_id}", response_model=EscalationPolicy)
+async def update_escalation_policy(policy_id: str, policy_data: EscalationPolicyUpdate, current_user: User = Depends(get_current_user)):
+    existing = await db.escalation_policies.find_one({"id": policy_id}, {"_id": 0})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Escalation policy not found")
+    # exclude_unset, so severity/area can be cleared back to "any" with null
+    update_data = policy_data.dict(exclude_unset=True)
+    if update_data.get("steps") == []:
+        raise HTTPException(status_code=400, detail="A policy needs at least one step")
+    policy = EscalationPolicy(**{**existing, **update_data, "updated_at": datetime.utcnow()})
+    await db.escalation_policies.update_one({"id": policy_id}, {"$set": policy.dict()})
+    await change_versions.bump("escalation_policies")
+    await log_event("escalation_policy_updated", f"Escalation policy {policy.name} updated", current_user.id)
+    return policy
+
+@api_router.delete("/escalation-policies/{policy_id}")
+async def delete_escalation_policy(policy_id: str, current_user: User = Depends(get_current_user)):
+    policy = await db.escalation_policies.find_one({"id": policy_id})
+    if not policy:
+        raise HTTPException(status_code=404, detail="Escalation policy not found")
+    await db.escalation_policies.delete_one({"id": policy_id})
+    await change_versions.bump("escalation_policies")
+    await log_event("escalation_policy_deleted", f"Escalation policy {policy['name']} deleted", current_user.id)
+    return {"message": "Escalation policy deleted successfully"}
+
+# Schedule endpoints
+@api_router.get("/schedules", response_model=List[Schedule])
+async def get_schedules(current_user: User = Depends(get_current_user)):
+    schedules = await db.schedules.find({}, {"_id": 0}).to_list(1000)
+    return [schedule_response(schedule) for schedule in schedules]
+
+@api_router.post("/schedules", response_model=Schedule)
+async def create_schedule(schedule_data: ScheduleCreate, current_user: User = Depends(get_current_user)):
+    schedule = Schedule(**schedule_data.dict())
+    await validate_schedule(schedule)
+    doc = schedule_document(schedule)
+    await db.schedules.insert_one(doc)
+    await change_versions.bump("schedules")
+    await log_event("schedule_created", f"Schedule {schedule.name} created", current_user.id, schedule.zone_id)
+    return schedule_response(doc)
+
+@api_router.get("/schedules/{schedule_id}", response_model=Schedule)
+async def get_schedule(schedule_id: str, current_user: User = Depends(get_current_user)):
+    schedule = await db.schedules.find_one({"id": schedule_id}, {"_id": 0})
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return schedule_response(schedule)
+
+@api_router.put("/schedules/{schedule_id}", response_model=Schedule)
+async def update_schedule(schedule_id: str, schedule_data: ScheduleUpdate, current_user: User = Depends(get_current_user)):
+    existing = await db.schedules.find_one({"id": schedule_id}, {"_id": 0})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+
+    update_data = schedule_data.dict(exclude_unset=True)
+    # A schedule targets a zone or an area; setting one clears the other
+    if update_data.get("zone_id"):
+        update_data["area"] = None
+    elif update_data.get("area"):
+        update_data["zone_id"] = None
+    schedule = Schedule(**{**existing, **update_data, "updated_at": datetime.utcnow()})
+    await validate_schedule(schedule)
+    doc = schedule_document(schedule)
+    await db.schedules.update_one({"id": schedule_id}, {"$set": doc})
+    await change_versions.bump("schedules")
+    await log_event("schedule_updated", f"Schedule {schedule.name} updated", current_user.id, schedule.zone_id)
+    return schedule_response(doc)
+
+@api_router.delete("/schedules/{schedule_id}")
+async def delete_schedule(schedule_id: str, current_user: User = Depends(get_current_user)):
+    schedule = await db.schedules.find_one({"id": schedule_id})
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+
+    await db.schedules.delete_one({"id": schedule_id})
+    await change_versions.bump("schedules")
+    await log_event("schedule_deleted", f"Schedule {schedule['name']} deleted", current_user.id, schedule.get("zone_id"))
+    return {"message": "Schedule deleted successfully"}
+
+# Correlation rule endpoints
+@api_router.get("/correlation-rules", response_model=List[CorrelationRule])
+async def get_correlation_rules(current_user: User = Depends(get_current_user)):
+    rules = await db.correlation_rules.find({}, {"_id": 0}).to_list(1000)
+    return [CorrelationRule(**rule) for rule in rules]
+
+@api_router.post("/correlation-rules", response_model=CorrelationRule)
+async def create_correlation_rule(rule_data: CorrelationRuleCreate, current_user: User = Depends(get_current_user)):
+    rule = CorrelationRule(**rule_data.dict())
+    validate_correlation_rule(rule)
+    await db.correlation_rules.insert_one(rule.dict())
+    await change_versions.bump("correlation_rules")
+    await log_event("correlation_rule_created", f"Correlation rule {rule.name} created", current_user.id)
+    return rule
+
+@api_router.put("/correlation-rules/{rule_id}", response_model=CorrelationRule)
+async def update_correlation_rule(rule_id: str, rule_data: CorrelationRuleUpdate, current_user: User = Depends(get_current_user)):
+    existing = await db.correlation_rules.find_one({"id": rule_id}, {"_id": 0})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Correlation rule not found")
+    # exclude_unset, so first/area can be cleared with null
+    rule = CorrelationRule(**{**existing, **rule_data.dict(exclude_unset=True), "updated_at": datetime.utcnow()})
+    validate_correlation_rule(rule)
+    await db.correlation_rules.update_one({"id": rule_id}, {"$set": rule.dict()})
+    await change_versions.bump("correlation_rules")
+    await log_event("correlation_rule_updated", f"Correlation rule {rule.name} updated", current_user.id)
+    return rule
+
+@api_router.delete("/correlation-rules/{rule_id}")
+async def delete_correlation_rule(rule_id: str, current_user: User = Depends(get_current_user)):
+    rule = await db.correlation_rules.find_one({"id": rule_id})
+    if not rule:
+        raise HTTPException(status_code=404, detail="Correlation rule not found")
+    await db.correlation_rules.delete_one({"id": rule_id})
+    await change_versions.bump("correlation_rules")
+    await log_event("correlation_rule_deleted", f"Correlation rule {rule['name']} deleted", current_user.id)
+    return {"message": "Correlation rule deleted successfully"}
+
+# Incident endpoints
+@api_router.get("/incidents", response_model=List[Incident], dependencies=[Depends(conditional_get("incidents"))])
+async def get_incidents(request: Request, response: Response, status: Optional[IncidentStatus] = None,
+                        current_user: User = Depends(get_current_user)):
+    set_etag(request, response)
+    query = {"status": status} if status else {}
+    incidents = await newest_first(db.incidents, query, 1000, None, "created_at")
+    return [Incident(**incident) for incident in incidents]
+
+@api_router.get("/incidents/{incident_id}", response_model=Incident)
+async def get_incident(incident_id: str, current_user: User = Depends(get_current_user)):
+    incident = await db.incidents.find_one({"id": incident_id}, {"_id": 0})
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return Incident(**incident)
+
+@api_router.post("/incidents/{incident_id}/acknowledge", response_model=Incident)
+async def acknowledge_incident(incident_id: str, current_user: User = Depends(get_current_user)):
+    return await transition_incident(incident_id, IncidentStatus.ACKNOWLEDGED, current_user)
+
+@api_router.post("/incidents/{incident_id}/resolve", response_model=Incident)
+async def resolve_incident(incident_id: str, current_user: User = Depends(get_current_user)):
+    return await transition_incident(incident_id, IncidentStatus.RESOLVED, current_user)
 
 # Alarm endpoints
-@api_router.get("/alarms", response_model=List[Alarm])
-async def get_alarms(current_user: User = Depends(get_current_user)):
-    alarms = await db.alarms.find().sort("triggered_at", -1).to_list(1000)
+@api_router.get("/alarms", response_model=List[Alarm], dependencies=[Depends(conditional_get("alarms"))])
+async def get_alarms(request: Request, response: Response, limit: int = PAGE_MAX_LIMIT,
+                     before: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    set_etag(request, response)
+    alarms = await newest_first(db.alarms, {}, check_page_limit(limit), before, "triggered_at")
     return [Alarm(**alarm) for alarm in alarms]
 
+@api_router.post("/alarms/bulk/acknowledge", response_model=BulkAlarmResult)
+async def bulk_acknowledge_alarms(request: BulkAlarmRequest, current_user: User = Depends(get_current_user)):
+    return await transition_alarms(bulk_alarm_query(request), AlarmStatus.ACKNOWLEDGED, current_user)
+
+@api_router.post("/alarms/bulk/resolve", response_model=BulkAlarmResult)
+async def bulk_resolve_alarms(request: BulkAlarmRequest, current_user: User = Depends(get_current_user)):
+    return await transition_alarms(bulk_alarm_query(request), AlarmStatus.RESOLVED, current_user)
+
 @api_router.post("/alarms/{alarm_id}/acknowledge")
 async def acknowledge_alarm(alarm_id: str, current_user: User = Depends(get_current_user)):
-    alarm = await db.alarms.find_one({"id": alarm_id})
-    if not alarm:
-        raise HTTPException(status_code=404, detail="Alarm not found")
-    
-    await db.alarms.update_one(
-        {"id": alarm_id},
-        {
-            "$set": {
-                "status": AlarmStatus.ACKNOWLEDGED,
-                "acknowledged_at": datetime.utcnow(),
-                "acknowledged_by": current_user.id
-            }
-        }
-    )
-    
-    await log_event("alarm_acknowledged", f"Alarm {alarm_id} acknowledged", current_user.id)
-    
-    # Broadcast alarm update
-    await manager.broadcast(json.dumps({
-        "type": "alarm_update",
-        "data": {"id": alarm_id, "status": AlarmStatus.ACKNOWLEDGED}
-    }))
-    
+    result = await transition_alarms({"id": alarm_id}, AlarmStatus.ACKNOWLEDGED, current_user)
+    if not result.alarm_ids:
+        await raise_transition_conflict(alarm_id)
     return {"message": "Alarm acknowledged successfully"}
 
 @api_router.post("/alarms/{alarm_id}/resolve")
 async def resolve_alarm(alarm_id: str, current_user: User = Depends(get_current_user)):
-    alarm = await db.alarms.find_one({"id": alarm_id})
-    if not alarm:
-        raise HTTPException(status_code=404, detail="Alarm not found")
-    
-    await db.alarms.update_one(
-        {"id": alarm_id},
-        {
-            "$set": {
-                "status": AlarmStatus.RESOLVED,
-                "resolved_at": datetime.utcnow(),
-                "resolved_by": current_user.id
-            }
-        }
-    )
-    
-    # Reset zone status
-    await db.zones.update_one({"id": alarm["zone_id"]}, {"$set": {"status": ZoneStatus.NORMAL}})
-    
-    await log_event("alarm_resolved", f"Alarm {alarm_id} resolved", current_user.id)
-    
-    # Broadcast updates
-    await manager.broadcast(json.dumps({
-        "type": "alarm_update",
-        "data": {"id": alarm_id, "status": AlarmStatus.RESOLVED}
-    }))
-    
-    await manager.broadcast(json.dumps({
-        "type": "zone_update",
-        "data": {"id": alarm["zone_id"], "status": ZoneStatus.NORMAL}
-    }))
-    
+    result = await transition_alarms({"id": alarm_id}, AlarmStatus.RESOLVED, current_user)
+    if not result.alarm_ids:
+        await raise_transition_conflict(alarm_id)
     return {"message": "Alarm resolved successfully"}
 
 # Dashboard endpoints
-@api_router.get("/dashboard/stats", response_model=SystemStats)
-async def get_system_stats(current_user: User = Depends(get_current_user)):
+@api_router.get("/dashboard/stats", response_model=SystemStats,
+                dependencies=[Depends(conditional_get("dashboard_stats")),
+                              Depends(rate_limit("dashboard_stats", heavy=True))])
+async def get_system_stats(request: Request, response: Response, current_user: User = Depends(get_current_user)):
+    set_etag(request, response)
     total_zones = await db.zones.count_documents({})
     active_alarms = await db.alarms.count_documents({"status": AlarmStatus.ACTIVE})
     zones_armed = await db.zones.count_documents({"is_armed": True})
@@ -598,9 +2179,91 @@ async def get_system_stats(current_user: User = Depends(get_current_user)):
         last_maintenance=datetime.utcnow() - timedelta(days=7)
     )
 
+# Dashboard snapshot
+# One request, one auth check: zones, open alarms, the latest alarms, open
+# incidents and the stats, read concurrently. If a write lands while reading (the change version
+# moved), the read is retried so the parts agree with each other.
+SNAPSHOT_RECENT_ALARMS = 100
+SNAPSHOT_ACTIVE_ALARMS = 1000
+SNAPSHOT_OPEN_INCIDENTS = 100
+SNAPSHOT_MAX_ATTEMPTS = 3
+
+def build_system_stats(zones: List[dict], active_alarms: int, total_events_today: int) -> SystemStats:
+    return SystemStats(
+        total_zones=len(zones),
+        active_alarms=active_alarms,
+        zones_armed=sum(1 for zone in zones if zone.get("is_armed")),
+        zones_normal=sum(1 for zone in zones if zone.get("status") == ZoneStatus.NORMAL),
+        zones_fault=sum(1 for zone in zones if zone.get("status") == ZoneStatus.FAULT),
+        total_events_today=total_events_today,
+        system_uptime="24h 15m",
+        last_maintenance=datetime.utcnow() - timedelta(days=7)
+    )
+
+async def read_dashboard_snapshot() -> DashboardSnapshot:
+    today = _day_bucket(datetime.utcnow())
+    for _ in range(SNAPSHOT_MAX_ATTEMPTS):
+        version = _etag_for("dashboard_snapshot")
+        sequence = manager.sequence
+        zones, open_alarms, recent_alarms, open_incidents, events_today = await asyncio.gather(
+            db.zones.find({}, {"_id": 0}).to_list(1000),
+            newest_first(db.alarms, {"status": {"$ne": AlarmStatus.RESOLVED}}, SNAPSHOT_ACTIVE_ALARMS, None, "triggered_at"),
+            newest_first(db.alarms, {}, SNAPSHOT_RECENT_ALARMS, None, "triggered_at"),
+            newest_first(db.incidents, {"status": IncidentStatus.OPEN}, SNAPSHOT_OPEN_INCIDENTS, None, "created_at"),
+            db.events.count_documents({"timestamp": {"$gte": today}})
+        )
+        if _etag_for("dashboard_snapshot") == version:
+            break
+
+    active_count = sum(1 for alarm in open_alarms if alarm["status"] == AlarmStatus.ACTIVE)
+    if len(open_alarms) == SNAPSHOT_ACTIVE_ALARMS:
+        active_count = await db.alarms.count_documents({"status": AlarmStatus.ACTIVE})
+    return DashboardSnapshot(
+        zones=[Zone(**zone) for zone in zones],
+        active_alarms=[Alarm(**alarm) for alarm in open_alarms],
+        recent_alarms=[Alarm(**alarm) for alarm in recent_alarms],
+        open_incidents=[Incident(**incident) for incident in open_incidents],
+        stats=build_system_stats(zones, active_count, events_today),
+        ws_sequence=sequence,
+        version=version,
+        generated_at=datetime.utcnow()
+    )
+
+@api_router.get("/dashboard/snapshot", response_model=DashboardSnapshot,
+                dependencies=[Depends(conditional_get("dashboard_snapshot")),
+                              Depends(rate_limit("dashboard_snapshot", heavy=True))])
+async def get_dashboard_snapshot(request: Request, response: Response, current_user: User = Depends(get_current_user)):
+    snapshot = await read_dashboard_snapshot()
+    # Tag the response with the version the data was actually read at
+    request.state.etag = snapshot.version
+    set_etag(request, response)
+    return snapshot
+
+# Analytics endpoints
+@api_router.get("/analytics/response-times", response_model=List[ResponseTimeStats])
+async def get_response_time_analytics(
+    group_by: AnalyticsGroup = AnalyticsGroup.ZONE,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    end = _naive_utc(end) if end else datetime.utcnow()
+    start = _naive_utc(start) if start else end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    buckets = await db.alarm_response_stats.find(
+        {"group_by": group_by.value, "$or": response_bucket_filter(start, end)},
+        {"_id": 0, "key": 1, "label": 1,
+         "ack_count": 1, "ack_sum": 1, "ack_hist": 1,
+         "resolve_count": 1, "resolve_sum": 1, "resolve_hist": 1}
+    ).to_list(None)
+    return merge_response_buckets(group_by, buckets)
+
 @api_router.get("/events", response_model=List[Event])
-async def get_events(current_user: User = Depends(get_current_user)):
-    events = await db.events.find().sort("timestamp", -1).limit(100).to_list(100)
+async def get_events(limit: int = 100, before: Optional[str] = None,
+                     current_user: User = Depends(get_current_user)):
+    events = await newest_first(db.events, {}, check_page_limit(limit), before, "timestamp")
     return [Event(**event) for event in events]
 
 # Test endpoint
@@ -613,13 +2276,21 @@ app.include_router(api_router)
 
 
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Configure logging. Handlers only enqueue; a background thread formats and
+# writes, so a slow stdout never stalls the event loop. When the queue is full
+# records are dropped and counted (GET /api/logging/stats).
+# LOG_FORMAT=text keeps the old plain-text lines instead of JSON.
+log_pipeline = LogPipeline(
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+    json_format=os.environ.get("LOG_FORMAT", "json").lower() != "text",
+    queue_size=int(os.environ.get("LOG_QUEUE_SIZE", "10000")),
+    capture=["uvicorn", "uvicorn.access"],
 )
+log_pipeline.start()
 logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    await leader.resign()
+    alarm_spool.close()
+    db.close()
@@ -0,0 +1,221 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Once everything has been replayed and the log is bigger than this, it is
+# truncated instead of growing forever
+SPOOL_COMPACT_BYTES = 1 << 20
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot spool {type(value).__name__}")
+
+def _object_hook(value: Dict[str, Any]):
+    if len(value) == 1 and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+def encode_record(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, default=_default, separators=(",", ":")) + "\n").encode()
+
+def decode_record(line: bytes) -> Dict[str, Any]:
+    return json.loads(line, object_hook=_object_hook)
+
+
+def read_records(path: Path, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (end offset, record) for every complete line from `start`.
+
+    A torn last line (the process died mid-append) is ignored; it was never
+    acknowledged to anyone.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if end is not None and offset >= end:
+                return
+            if not line.endswith(b"\n"):
+                return
+            offset += len(line)
+            try:
+                record = decode_record(line)
+            except ValueError:
+                logger.warning(f"Skipping corrupt spool record in {path} at offset {offset - len(line)}")
+                continue
+            yield offset, record
+
+
+def complete_length(path: Path, chunk: int = 1 << 16) -> int:
+    """Length of `path` up to and including its last newline."""
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - chunk)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+class WriteAheadSpool:
+    """Append-only local log that records survive in while the database is away.
+
+    Writers `append` a record (flushed, and fsynced when `fsync` is set) and
+    can act on it immediately; a single replayer walks `pending()` and
+    `commit()`s each offset once the record is safely in the database.
+    Replays must be idempotent: after a crash the last few records may be
+    applied again because the committed offset is written lazily.
+
+    Each worker process claims its own log file in `directory` with an
+    exclusive flock, so several workers can share one directory. Logs left
+    behind by workers that are gone are picked up with `orphans()`.
+    """
+
+    def __init__(self, directory: str, fsync: bool = True, name: str = "alarms"):
+        self.directory = Path(directory)
+        self.fsync = fsync
+        self.name = name
+        self.path: Optional[Path] = None
+        self.file = None
+        self.size = 0
+        self.committed = 0
+        self.appended = 0
+        self.replayed = 0
+        self.pending_records = 0
+        self.lock = asyncio.Lock()
+        self.ready = asyncio.Event()
+
+    def open(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slot = 0
+        while True:
+            path = self.directory / f"{self.name}-{slot}.wal"
+            file = open(path, "ab")
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                file.close()
+                slot += 1
+                continue
+            if not path.exists() or os.stat(path).st_ino != os.fstat(file.fileno()).st_ino:
+                # Another worker replayed and removed this log under us; retry the slot
+                file.close()
+                continue
+            break
+        self.path, self.file = path, file
+        self.size = file.seek(0, os.SEEK_END)
+        complete = complete_length(path)
+        if complete < self.size:
+            # Cut off a torn last line, or the next append would be glued onto it
+            logger.warning(f"Alarm spool {path} ends in a torn record; dropping {self.size - complete} bytes")
+            file.truncate(complete)
+            if self.fsync:
+                os.fsync(file.fileno())
+            self.size = complete
+        self.committed = min(self._read_offset(path), self.size)
+        self.pending_records = sum(1 for _ in read_records(path, self.committed))
+        if self.pending_records:
+            logger.warning(f"Alarm spool {path} has {self.pending_records} records to replay")
+            self.ready.set()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    @staticmethod
+    def _offset_path(path: Path) -> Path:
+        return path.with_suffix(".offset")
+
+    def _read_offset(self, path: Path) -> int:
+        try:
+            return int(self._offset_path(path).read_text() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_offset(self, path: Path, offset: int):
+        tmp = self._offset_path(path).with_suffix(".offset.tmp")
+        tmp.write_text(str(offset))
+        os.replace(tmp, self._offset_path(path))
+
+    def _write(self, data: bytes):
+        self.file.write(data)
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    async def append(self, record: Dict[str, Any]):
+        """Durably append `record`; returns once it is on disk."""
+        data = encode_record(record)
+        async with self.lock:
+            await asyncio.to_thread(self._write, data)
+            self.size += len(data)
+            self.appended += 1
+            self.pending_records += 1
+        self.ready.set()
+
+    def pending(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Records appended but not yet committed, oldest first."""
+        if self.committed >= self.size:
+            return iter(())
+        return read_records(self.path, self.committed, self.size)
+
+    async def commit(self, offset: int):
+        """Mark everything up to `offset` as replayed."""
+        async with self.lock:
+            self.committed = offset
+            self.replayed += 1
+            self.pending_records = max(0, self.pending_records - 1)
+            if self.committed == self.size and self.size > SPOOL_COMPACT_BYTES:
+                self.file.truncate(0)
+                self.file.seek(0)
+                self.size = self.committed = 0
+            self._write_offset(self.path, self.committed)
+
+    def orphans(self) -> List[Tuple[Path, Any]]:
+        """Claim logs of workers that no longer run. Returns (path, locked file)."""
+        claimed = []
+        for path in sorted(self.directory.glob(f"{self.name}-*.wal")):
+            if path == self.path:
+                continue
+            file = open(path, "ab")
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                file.close()
+                continue
+            claimed.append((path, file))
+        return claimed
+
+    def discard_orphan(self, path: Path, file):
+        """Drop an orphaned log once all of its records are replayed."""
+        self._offset_path(path).unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+        file.close()
+
+    def orphan_records(self, path: Path) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        return read_records(path, self._read_offset(path))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path) if self.path else None,
+            "fsync": self.fsync,
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "pending": self.pending_records,
+            "bytes": self.size,
+        }
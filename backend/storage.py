@@ -0,0 +1,734 @@
+"""Pluggable document storage for the EMA backend.
+
+Every handler talks to `db.<collection>` through the small, MongoDB-shaped
+collection contract below, so the same code runs on:
+
+- ``mongo``  - Motor/MongoDB, the production backend (STORAGE_BACKEND=mongo)
+- ``memory`` - plain dicts in the process, for tests, benchmarks and demos
+- ``sqlite`` - one embedded SQLite file, for small single-building sites
+
+Supported contract (what server.py uses, nothing more):
+
+- ``find_one``, ``find(...).sort().skip().limit().batch_size().to_list()`` and
+  ``async for`` over ``find``, with inclusion or exclusion projections
+- ``insert_one``, ``insert_many``, ``update_one``, ``update_many`` (with
+  ``upsert``), ``find_one_and_update``, ``delete_one``, ``delete_many``,
+  ``count_documents``, ``bulk_write`` of ``UpdateOne``/``InsertOne``,
+  ``create_index``
+- filters: equality (dotted paths allowed), ``$eq $ne $in $nin $lt $lte $gt
+  $gte $exists $or $and``; no array-element matching
+- updates: ``$set $unset $inc $min $max $push $setOnInsert``
+
+The in-memory and SQLite backends are exercised by the same contract tests
+(tests/test_storage_contract.py). They run their operations synchronously
+on the event loop, which makes each operation atomic with respect to other
+requests in the process.
+"""
+
+import copy
+import json
+import os
+import re
+import sqlite3
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from pymongo import InsertOne, ReturnDocument, UpdateOne
+    from pymongo.errors import DuplicateKeyError
+except ImportError:  # the memory and sqlite backends do not need pymongo
+    class UpdateOne:
+        def __init__(self, filter, update, upsert=False):
+            self._filter = filter
+            self._doc = update
+            self._upsert = upsert
+
+    class InsertOne:
+        def __init__(self, document):
+            self._doc = document
+
+    class ReturnDocument:
+        BEFORE = False
+        AFTER = True
+
+    class DuplicateKeyError(Exception):
+        pass
+
+
+# Results, shaped like pymongo's
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+class UpdateResult:
+    def __init__(self, matched_count=0, modified_count=0, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+class DeleteResult:
+    def __init__(self, deleted_count=0):
+        self.deleted_count = deleted_count
+
+class BulkWriteResult:
+    def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.upserted_count = 0
+
+
+# Query and update evaluation shared by the embedded backends
+_MISSING = object()
+
+def _get_path(doc: Dict[str, Any], path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _set_path(doc: Dict[str, Any], path: str, value: Any):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+def _unset_path(doc: Dict[str, Any], path: str):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+def _is_operator_dict(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(k.startswith("$") for k in value)
+
+def _equals(value: Any, expected: Any) -> bool:
+    if expected is None:
+        return value is _MISSING or value is None
+    return value is not _MISSING and value == expected
+
+def _compare(value: Any, expected: Any, op: str) -> bool:
+    if value is _MISSING or value is None or expected is None:
+        return False
+    try:
+        if op == "$lt":
+            return value < expected
+        if op == "$lte":
+            return value <= expected
+        if op == "$gt":
+            return value > expected
+        return value >= expected
+    except TypeError:
+        return False
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+            continue
+        if key == "$and":
+            if not all(matches(doc, branch) for branch in condition):
+                return False
+            continue
+
+        value = _get_path(doc, key)
+        if not _is_operator_dict(condition):
+            if not _equals(value, condition):
+                return False
+            continue
+        for op, expected in condition.items():
+            if op == "$eq":
+                ok = _equals(value, expected)
+            elif op == "$ne":
+                ok = not _equals(value, expected)
+            elif op == "$in":
+                ok = any(_equals(value, item) for item in expected)
+            elif op == "$nin":
+                ok = not any(_equals(value, item) for item in expected)
+            elif op in ("$lt", "$lte", "$gt", "$gte"):
+                ok = _compare(value, expected, op)
+            elif op == "$exists":
+                ok = (value is not _MISSING) == bool(expected)
+            else:
+                raise ValueError(f"Unsupported query operator {op}")
+            if not ok:
+                return False
+    return True
+
+def apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserting: bool = False):
+    for op, fields in update.items():
+        if op == "$setOnInsert":
+            if inserting:
+                for path, value in fields.items():
+                    _set_path(doc, path, copy.deepcopy(value))
+        elif op == "$set":
+            for path, value in fields.items():
+                _set_path(doc, path, copy.deepcopy(value))
+        elif op == "$unset":
+            for path in fields:
+                _unset_path(doc, path)
+        elif op == "$inc":
+            for path, amount in fields.items():
+                current = _get_path(doc, path)
+                _set_path(doc, path, (0 if current is _MISSING or current is None else current) + amount)
+        elif op in ("$min", "$max"):
+            for path, value in fields.items():
+                current = _get_path(doc, path)
+                if current is _MISSING or current is None or (value < current if op == "$min" else value > current):
+                    _set_path(doc, path, copy.deepcopy(value))
+        elif op == "$push":
+            for path, value in fields.items():
+                current = _get_path(doc, path)
+                items = list(current) if isinstance(current, list) else []
+                if isinstance(value, dict) and "$each" in value:
+                    items.extend(copy.deepcopy(value["$each"]))
+                else:
+                    items.append(copy.deepcopy(value))
+                _set_path(doc, path, items)
+        else:
+            raise ValueError(f"Unsupported update operator {op}")
+
+def upsert_seed(query: Dict[str, Any]) -> Dict[str, Any]:
+    """Equality fields of a filter become the fields of an upserted document."""
+    doc: Dict[str, Any] = {}
+    for key, condition in query.items():
+        if key.startswith("$"):
+            continue
+        if _is_operator_dict(condition):
+            if "$eq" in condition:
+                _set_path(doc, key, copy.deepcopy(condition["$eq"]))
+        else:
+            _set_path(doc, key, copy.deepcopy(condition))
+    return doc
+
+def project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    include_id = projection.get("_id", 1)
+    included = [k for k, v in projection.items() if v and k != "_id"]
+    if included:
+        result = {}
+        for path in included:
+            value = _get_path(doc, path)
+            if value is not _MISSING:
+                _set_path(result, path, value)
+        if include_id and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    for path, flag in projection.items():
+        if not flag:
+            _unset_path(doc, path)
+    return doc
+
+def _sort_key(value: Any):
+    # MongoDB orders missing/null before everything else
+    if value is _MISSING or value is None:
+        return (0, 0)
+    return (1, value)
+
+def sort_documents(docs: List[Dict[str, Any]], sort: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    for field, direction in reversed(sort):
+        docs.sort(key=lambda d: _sort_key(_get_path(d, field)), reverse=direction < 0)
+    return docs
+
+def _normalize_sort(key_or_list, direction=None) -> List[Tuple[str, int]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    return [(k, d) for k, d in key_or_list]
+
+def new_object_id() -> str:
+    return uuid.uuid4().hex[:24]
+
+
+class Cursor:
+    """The chainable subset of a Motor cursor."""
+
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    def _run(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        limit = min(self._limit, length) if self._limit and length else (self._limit or length or 0)
+        docs = self._collection._select(self._query, self._sort, self._skip, limit)
+        return [project(doc, self._projection) for doc in docs]
+
+    async def to_list(self, length: Optional[int] = None):
+        # Push the length down, so the backend stops after it
+        return self._run(length)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._run():
+            yield doc
+
+
+class EmbeddedCollection:
+    """Collection logic shared by the memory and SQLite backends.
+
+    Subclasses provide _select (filter/sort/skip/limit over stored docs),
+    _insert, _replace (updated docs plus their previous versions) and _delete.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def find(self, filter=None, projection=None, **kwargs):
+        cursor = Cursor(self, filter, projection)
+        if "sort" in kwargs:
+            cursor.sort(kwargs["sort"])
+        if "limit" in kwargs:
+            cursor.limit(kwargs["limit"])
+        return cursor
+
+    async def find_one(self, filter=None, projection=None, sort=None):
+        docs = self._select(filter or {}, _normalize_sort(sort) if sort else [], 0, 1)
+        return project(docs[0], projection) if docs else None
+
+    async def count_documents(self, filter=None):
+        return self._count(filter or {})
+
+    async def insert_one(self, document):
+        document.setdefault("_id", new_object_id())
+        self._insert([copy.deepcopy(document)])
+        return InsertOneResult(document["_id"])
+
+    async def insert_many(self, documents, ordered=True):
+        documents = list(documents)
+        for document in documents:
+            document.setdefault("_id", new_object_id())
+        self._insert([copy.deepcopy(d) for d in documents])
+        return InsertManyResult([d["_id"] for d in documents])
+
+    def _update(self, filter, update, upsert, many) -> UpdateResult:
+        docs = self._select(filter, [], 0, 0 if many else 1)
+        if not docs:
+            if not upsert:
+                return UpdateResult()
+            doc = upsert_seed(filter)
+            apply_update(doc, update, inserting=True)
+            doc.setdefault("_id", new_object_id())
+            self._insert([doc])
+            return UpdateResult(upserted_id=doc["_id"])
+
+        changed, previous = [], []
+        for doc in docs:
+            before = copy.deepcopy(doc)
+            apply_update(doc, update)
+            if doc != before:
+                changed.append(doc)
+                previous.append(before)
+        self._replace(changed, previous)
+        return UpdateResult(matched_count=len(docs), modified_count=len(changed))
+
+    async def update_one(self, filter, update, upsert=False):
+        return self._update(filter, update, upsert, many=False)
+
+    async def update_many(self, filter, update, upsert=False):
+        return self._update(filter, update, upsert, many=True)
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None,
+                                  upsert=False, return_document=ReturnDocument.BEFORE):
+        docs = self._select(filter, _normalize_sort(sort) if sort else [], 0, 1)
+        if not docs:
+            if not upsert:
+                return None
+            doc = upsert_seed(filter)
+            apply_update(doc, update, inserting=True)
+            doc.setdefault("_id", new_object_id())
+            self._insert([doc])
+            return project(doc, projection) if return_document else None
+        doc = docs[0]
+        before = copy.deepcopy(doc)
+        apply_update(doc, update)
+        if doc != before:
+            self._replace([doc], [before])
+        return project(doc if return_document else before, projection)
+
+    async def delete_one(self, filter):
+        docs = self._select(filter or {}, [], 0, 1)
+        self._delete(docs)
+        return DeleteResult(len(docs))
+
+    async def delete_many(self, filter):
+        docs = self._select(filter or {}, [], 0, 0)
+        self._delete(docs)
+        return DeleteResult(len(docs))
+
+    async def bulk_write(self, requests, ordered=True):
+        result = BulkWriteResult()
+        for request in requests:
+            if isinstance(request, InsertOne):
+                await self.insert_one(request._doc)
+                result.inserted_count += 1
+                continue
+            outcome = self._update(request._filter, request._doc, request._upsert, many=False)
+            result.matched_count += outcome.matched_count
+            result.modified_count += outcome.modified_count
+            result.upserted_count += 1 if outcome.upserted_id is not None else 0
+        return result
+
+    def _count(self, filter) -> int:
+        return len(self._select(filter, [], 0, 0))
+
+    async def create_index(self, keys, unique=False, **kwargs):
+        return None
+
+
+# In-memory backend
+class MemoryCollection(EmbeddedCollection):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.docs: Dict[Any, Dict[str, Any]] = {}
+        # unique index fields -> {key values: _id}
+        self.unique: Dict[Tuple[str, ...], Dict[Tuple[Any, ...], Any]] = {}
+
+    def _unique_key(self, fields, doc):
+        return tuple(None if (v := _get_path(doc, f)) is _MISSING else v for f in fields)
+
+    def _check_unique(self, docs, previous=()):
+        replaced = {doc["_id"] for doc in previous}
+        for fields, entries in self.unique.items():
+            seen = set()
+            for doc in docs:
+                key = self._unique_key(fields, doc)
+                owner = entries.get(key, doc["_id"])
+                if key in seen or (owner != doc["_id"] and owner not in replaced):
+                    raise DuplicateKeyError(f"Duplicate key {key!r} for index {fields} in {self.name}")
+                seen.add(key)
+
+    def _index(self, docs, previous=()):
+        for fields, entries in self.unique.items():
+            for doc in previous:
+                entries.pop(self._unique_key(fields, doc), None)
+            for doc in docs:
+                entries[self._unique_key(fields, doc)] = doc["_id"]
+
+    def _select(self, filter, sort, skip, limit):
+        if not sort and not skip and limit:
+            found = []
+            for doc in self.docs.values():
+                if matches(doc, filter):
+                    found.append(doc)
+                    if len(found) == limit:
+                        break
+            return found
+        found = [doc for doc in self.docs.values() if matches(doc, filter)]
+        if sort:
+            sort_documents(found, sort)
+        found = found[skip:]
+        return found[:limit] if limit else found
+
+    def _insert(self, docs):
+        if len({doc["_id"] for doc in docs}) < len(docs) or any(doc["_id"] in self.docs for doc in docs):
+            raise DuplicateKeyError(f"Duplicate _id in {self.name}")
+        self._check_unique(docs)
+        for doc in docs:
+            self.docs[doc["_id"]] = doc
+        self._index(docs)
+
+    def _replace(self, docs, previous):
+        # Documents were updated in place; only the unique indexes need a look
+        if not self.unique:
+            return
+        try:
+            self._check_unique(docs, previous)
+        except DuplicateKeyError:
+            for before in previous:
+                self.docs[before["_id"]].clear()
+                self.docs[before["_id"]].update(before)
+            raise
+        self._index(docs, previous)
+
+    def _delete(self, docs):
+        for doc in docs:
+            self.docs.pop(doc["_id"], None)
+        self._index([], docs)
+
+    async def create_index(self, keys, unique=False, **kwargs):
+        fields = tuple(field for field, _ in _normalize_sort(keys))
+        if unique and fields not in self.unique:
+            self.unique[fields] = {}
+            self._check_unique(list(self.docs.values()))
+            self._index(list(self.docs.values()))
+        return "_".join(fields)
+
+
+# SQLite backend
+# Documents are stored as JSON, one table per collection. Datetimes are
+# written as tagged ISO strings so they survive the round trip and still sort
+# correctly inside SQLite. Filters are pushed down to SQL where that is exact
+# (equality, $in and range comparisons on scalars); the rest is evaluated in
+# Python on the rows SQLite returns.
+_DATETIME_TAG = "__dt__:"
+_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_SQL_COMPARISONS = {"$eq": "=", "$lt": "<", "$lte": "<=", "$gt": ">", "$gte": ">="}
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return _DATETIME_TAG + value.isoformat(timespec="microseconds")
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith(_DATETIME_TAG):
+        return datetime.fromisoformat(value[len(_DATETIME_TAG):])
+    if isinstance(value, dict):
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+def _json_path(path: str) -> str:
+    if not all(_NAME_RE.match(part) or part.isdigit() for part in path.split(".")):
+        raise ValueError(f"Unsupported field path {path!r}")
+    return "$." + ".".join(f'"{part}"' for part in path.split("."))
+
+def _sql_scalar(value: Any) -> bool:
+    return isinstance(value, (str, int, float, datetime)) and not isinstance(value, dict)
+
+def _translate(query: Dict[str, Any]) -> Tuple[List[str], List[Any], bool]:
+    """Translate what can be expressed exactly in SQL.
+
+    Returns the WHERE clauses, their parameters and whether the whole filter
+    was translated (if not, rows still go through `matches`).
+    """
+    clauses: List[str] = []
+    params: List[Any] = []
+    exact = True
+    for key, condition in query.items():
+        if key in ("$or", "$and"):
+            parts = []
+            for branch in condition:
+                branch_clauses, branch_params, branch_exact = _translate(branch)
+                if not branch_exact:
+                    break
+                parts.append("(" + (" AND ".join(branch_clauses) or "1") + ")")
+                params.extend(branch_params)
+            else:
+                joiner = " OR " if key == "$or" else " AND "
+                clauses.append("(" + (joiner.join(parts) or ("0" if key == "$or" else "1")) + ")")
+                continue
+            exact = False
+            continue
+
+        field = f"json_extract(doc, '{_json_path(key)}')"
+        conditions = condition if _is_operator_dict(condition) else {"$eq": condition}
+        for op, expected in conditions.items():
+            if op in _SQL_COMPARISONS and _sql_scalar(expected):
+                clauses.append(f"{field} {_SQL_COMPARISONS[op]} ?")
+                params.append(_encode(expected))
+            elif op == "$in" and expected and all(_sql_scalar(v) for v in expected):
+                clauses.append(f"{field} IN ({', '.join('?' for _ in expected)})")
+                params.extend(_encode(v) for v in expected)
+            elif op == "$in" and not expected:
+                clauses.append("0")
+            else:
+                exact = False
+    return clauses, params, exact
+
+
+class SQLiteCollection(EmbeddedCollection):
+    def __init__(self, name: str, connection: sqlite3.Connection):
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid collection name {name!r}")
+        super().__init__(name)
+        self.connection = connection
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name}" (_id TEXT PRIMARY KEY, doc TEXT NOT NULL)'
+        )
+
+    def _rows(self, sql: str, params: Iterable[Any]) -> List[Dict[str, Any]]:
+        return [_decode(json.loads(row[0])) for row in self.connection.execute(sql, list(params))]
+
+    def _select(self, filter, sort, skip, limit):
+        clauses, params, exact = _translate(filter)
+        sql = f'SELECT doc FROM "{self.name}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if exact:
+            if sort:
+                # Tie-break in the direction of the last key, so an index on
+                # the sort keys also covers the tie-break
+                tie_break = "rowid DESC" if sort[-1][1] < 0 else "rowid"
+                sql += " ORDER BY " + ", ".join(
+                    f"json_extract(doc, '{_json_path(field)}') {'DESC' if direction < 0 else 'ASC'}"
+                    for field, direction in sort
+                ) + ", " + tie_break
+            else:
+                sql += " ORDER BY rowid"
+            if limit or skip:
+                sql += f" LIMIT {int(limit) if limit else -1} OFFSET {int(skip)}"
+            return self._rows(sql, params)
+
+        docs = [doc for doc in self._rows(sql + " ORDER BY rowid", params) if matches(doc, filter)]
+        if sort:
+            sort_documents(docs, sort)
+        docs = docs[skip:]
+        return docs[:limit] if limit else docs
+
+    def _count(self, filter) -> int:
+        clauses, params, exact = _translate(filter)
+        if not exact:
+            return super()._count(filter)
+        sql = f'SELECT COUNT(*) FROM "{self.name}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return self.connection.execute(sql, params).fetchone()[0]
+
+    def _insert(self, docs):
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    f'INSERT INTO "{self.name}" (_id, doc) VALUES (?, ?)',
+                    [(json.dumps(_encode(d["_id"])), json.dumps(_encode(d))) for d in docs]
+                )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(str(e))
+
+    def _replace(self, docs, previous):
+        if not docs:
+            return
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    f'UPDATE "{self.name}" SET doc = ? WHERE _id = ?',
+                    [(json.dumps(_encode(d)), json.dumps(_encode(d["_id"]))) for d in docs]
+                )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(str(e))
+
+    def _delete(self, docs):
+        if not docs:
+            return
+        with self.connection:
+            self.connection.executemany(
+                f'DELETE FROM "{self.name}" WHERE _id = ?',
+                [(json.dumps(_encode(d["_id"])),) for d in docs]
+            )
+
+    async def create_index(self, keys, unique=False, **kwargs):
+        keys = _normalize_sort(keys)
+        index = "ix_" + self.name + "_" + "_".join(re.sub(r"\W", "_", field) for field, _ in keys)
+        expressions = ", ".join(f"json_extract(doc, '{_json_path(field)}')" for field, _ in keys)
+        with self.connection:
+            self.connection.execute(
+                f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{index}" ON "{self.name}" ({expressions})'
+            )
+        return index
+
+
+# Storage facades: `db.zones` and `db["zones"]` both return a collection
+class Storage:
+    backend = "base"
+
+    def __init__(self):
+        self._collections: Dict[str, Any] = {}
+
+    def _create_collection(self, name: str):
+        raise NotImplementedError
+
+    def collection(self, name: str):
+        if name not in self._collections:
+            self._collections[name] = self._create_collection(name)
+        return self._collections[name]
+
+    def __getitem__(self, name: str):
+        return self.collection(name)
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.collection(name)
+
+    def close(self):
+        pass
+
+
+class MemoryStorage(Storage):
+    backend = "memory"
+
+    def _create_collection(self, name: str):
+        return MemoryCollection(name)
+
+
+class SQLiteStorage(Storage):
+    backend = "sqlite"
+
+    def __init__(self, path: str = "ema.sqlite3"):
+        super().__init__()
+        self.path = path
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+    def _create_collection(self, name: str):
+        return SQLiteCollection(name, self.connection)
+
+    def close(self):
+        self.connection.close()
+
+
+class MongoStorage(Storage):
+    backend = "mongo"
+
+    def __init__(self, url: str, db_name: str):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        super().__init__()
+        self.client = AsyncIOMotorClient(url)
+        self.db = self.client[db_name]
+
+    def _create_collection(self, name: str):
+        return self.db[name]
+
+    def close(self):
+        self.client.close()
+
+
+def create_storage(env=os.environ) -> Storage:
+    backend = env.get('STORAGE_BACKEND', 'mongo').lower()
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage(env.get('SQLITE_PATH', 'ema.sqlite3'))
+    if backend == "mongo":
+        return MongoStorage(env['MONGO_URL'], env['DB_NAME'])
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Application overhead of the REST API without a database round trip.
+
+Runs the FastAPI app in-process over ASGI (no sockets) against the in-memory
+or SQLite storage backend and reports per-request latency for a few read
+endpoints on a seeded site.
+
+    python benchmarks/api_overhead.py [memory|sqlite] [requests] [zones]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+backend = sys.argv[1] if len(sys.argv) > 1 else "memory"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ["STORAGE_BACKEND"] = backend
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "ema.sqlite3"))
+os.environ.setdefault("DB_NAME", "ema_benchmark")
+for route in ("ZONES", "DASHBOARD_STATS", "DASHBOARD_SNAPSHOT"):
+    for scope in ("IP", "USER"):
+        os.environ[f"RATE_LIMIT_{route}_{scope}"] = "1000000/1"
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from server import Zone, ZoneType  # noqa: E402
+
+AREAS = ["Main Entrance", "Warehouse North", "Server Room", "Loading Dock", "Office Floor 2", "Parking Garage"]
+
+
+async def seed(zones: int):
+    await server.db.zones.insert_many([
+        Zone(name=f"Zone {i}", zone_type=list(ZoneType)[i % len(ZoneType)],
+             area=AREAS[i % len(AREAS)], is_armed=i % 3 == 0).dict()
+        for i in range(zones)
+    ])
+    user = server.User(email="bench@example.com", name="Bench", role="admin")
+    await server.db.users.insert_one({**user.dict(), "password": server.hash_password("bench")})
+    return {"Authorization": f"Bearer {server.create_access_token({'sub': user.id})}"}
+
+
+async def measure(client, path, headers, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+async def main():
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    zones = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    headers = await seed(zones)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"backend={backend} zones={zones} requests={requests}")
+        print(f"{'endpoint':<28}{'p50 ms':>10}{'p99 ms':>10}")
+        for path in ("/api/auth/me", "/api/zones", "/api/dashboard/stats", "/api/dashboard/snapshot"):
+            p50, p99 = await measure(client, path, headers, requests)
+            print(f"{path:<28}{p50:>10.3f}{p99:>10.3f}")
+    server.db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Random uuid4 ids versus the compact time-ordered ids of backend/ids.py.
+
+Inserts the same stream of event documents into an `events` collection once
+per id scheme and reports insert throughput, index size and the latency of a
+newest-first page. uuid4 ids cannot be sorted on, so that scheme needs a
+second index on `timestamp` for the page; time-ordered ids page off the `id`
+index alone.
+
+    python benchmarks/id_schemes.py [sqlite|mongo] [events]
+
+mongo needs MONGO_URL and writes to the ema_benchmark database.
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ids import TIME_ORDERED_MIN, new_id  # noqa: E402
+from storage import MongoStorage, SQLiteStorage  # noqa: E402
+
+BATCH = 1000
+PAGE = 100
+PAGE_REPEATS = 50
+
+# id factory, indexed fields, newest-first page query and sort key
+SCHEMES = {
+    "uuid4": (lambda: str(uuid.uuid4()), ["id", "timestamp"], {}, "timestamp"),
+    "time-ordered": (new_id, ["id"], {"id": {"$gte": TIME_ORDERED_MIN}}, "id"),
+}
+
+
+def open_storage(backend: str, scheme: str):
+    if backend == "mongo":
+        return MongoStorage(os.environ["MONGO_URL"], "ema_benchmark")
+    return SQLiteStorage(os.path.join(tempfile.mkdtemp(), f"{scheme}.sqlite3"))
+
+
+async def index_size(store, backend: str, indexes) -> int:
+    if backend == "mongo":
+        stats = await store.db.command("collStats", "events")
+        return sum(stats["indexSizes"][index] for index in indexes)
+    placeholders = ", ".join("?" for _ in indexes)
+    row = store.connection.execute(
+        f"SELECT SUM(pgsize) FROM dbstat WHERE name IN ({placeholders})", list(indexes)
+    ).fetchone()
+    return row[0] or 0
+
+
+async def run(backend: str, scheme: str, events: int):
+    make_id, fields, page_query, page_key = SCHEMES[scheme]
+    store = open_storage(backend, scheme)
+    if backend == "mongo":
+        await store.events.drop()
+    indexes = [await store.events.create_index([(field, 1)]) for field in fields]
+
+    start_at = datetime.utcnow() - timedelta(days=30)
+    inserting = 0.0
+    id_bytes = 0
+    for offset in range(0, events, BATCH):
+        batch = []
+        for i in range(offset, min(offset + BATCH, events)):
+            event_id = make_id()
+            id_bytes += len(event_id)
+            batch.append({
+                "id": event_id,
+                "event_type": "zone_triggered",
+                "description": f"Zone {i % 500} triggered alarm",
+                "user_id": None,
+                "zone_id": f"zone-{i % 500}",
+                "timestamp": start_at + timedelta(milliseconds=i),
+                "metadata": {"severity": "high"},
+            })
+        started = time.perf_counter()
+        await store.events.insert_many(batch)
+        inserting += time.perf_counter() - started
+
+    pages = []
+    for _ in range(PAGE_REPEATS):
+        started = time.perf_counter()
+        await store.events.find(page_query, {"_id": 0}).sort(page_key, -1).to_list(PAGE)
+        pages.append((time.perf_counter() - started) * 1000)
+
+    size = await index_size(store, backend, indexes)
+    if backend == "mongo":
+        await store.events.drop()
+    store.close()
+    return events / inserting, size / events, id_bytes / events, statistics.median(pages)
+
+
+async def main():
+    backend = sys.argv[1] if len(sys.argv) > 1 else "sqlite"
+    events = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    print(f"backend={backend} events={events}")
+    print(f"{'scheme':<14}{'inserts/s':>12}{'index B/doc':>13}{'id chars':>10}{'page p50 ms':>13}")
+    for scheme in SCHEMES:
+        rate, index_per_doc, id_chars, page = await run(backend, scheme, events)
+        print(f"{scheme:<14}{rate:>12,.0f}{index_per_doc:>13.1f}{id_chars:>10.0f}{page:>13.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag under heavy logging, with and without the queue pipeline.
+
+A probe task sleeps for a fixed interval and records how late it wakes up
+while a second task logs bursts of records. Records go to a pipe drained by a
+deliberately slow reader, standing in for a slow stdout (a container log
+driver, a terminal over ssh). Modes:
+
+    off      logging disabled, the baseline
+    direct   a StreamHandler writing from the loop, as basicConfig did
+    queued   backend/logqueue.py: enqueue on the loop, write on a thread
+
+    python benchmarks/log_lag.py [seconds] [records-per-burst]
+"""
+
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from logqueue import JsonFormatter, LogPipeline, log_context  # noqa: E402
+
+PROBE_INTERVAL = 0.005
+BURST_INTERVAL = 0.01
+READ_SIZE = 4096
+READ_PAUSE = 0.004  # roughly 1 MB/s of log throughput
+
+
+def slow_pipe():
+    """A text stream whose reader drains it at a fixed, limited rate."""
+    read_fd, write_fd = os.pipe()
+
+    def drain():
+        while os.read(read_fd, READ_SIZE):
+            time.sleep(READ_PAUSE)
+        os.close(read_fd)
+
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    stream = os.fdopen(write_fd, "w", buffering=1)
+    return stream, reader
+
+
+async def probe(deadline: float, lags: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append((time.perf_counter() - started - PROBE_INTERVAL) * 1000)
+
+
+async def produce(deadline: float, logger: logging.Logger, burst: int):
+    sent = 0
+    while time.perf_counter() < deadline:
+        with log_context(route="simulator", zone="zone-42"):
+            for i in range(burst):
+                logger.info("Zone %s triggered alarm %d", "Lobby", sent + i)
+        sent += burst
+        await asyncio.sleep(BURST_INTERVAL)
+    return sent
+
+
+async def run(mode: str, seconds: float, burst: int):
+    stream, reader = slow_pipe()
+    logger = logging.getLogger(f"bench.{mode}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    pipeline = None
+    if mode == "off":
+        logger.disabled = True
+    elif mode == "direct":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JsonFormatter())
+        logger.handlers = [handler]
+    else:
+        pipeline = LogPipeline(stream=stream)
+        logger.handlers = [pipeline.handler]
+        pipeline.listener.start()
+
+    lags = []
+    deadline = time.perf_counter() + seconds
+    _, sent = await asyncio.gather(probe(deadline, lags), produce(deadline, logger, burst))
+
+    stats = pipeline.snapshot() if pipeline else {"dropped": 0}
+    if pipeline:
+        pipeline.listener.stop()
+    stream.close()
+    reader.join()
+    lags.sort()
+    return {
+        "sent": sent,
+        "dropped": stats["dropped"],
+        "p50": statistics.median(lags),
+        "p99": lags[int(len(lags) * 0.99)],
+        "max": lags[-1],
+    }
+
+
+async def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    burst = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"seconds={seconds} burst={burst} every {BURST_INTERVAL * 1000:.0f} ms")
+    print(f"{'mode':<8}{'records':>10}{'dropped':>10}{'lag p50 ms':>12}{'p99 ms':>10}{'max ms':>10}")
+    for mode in ("off", "direct", "queued"):
+        r = await run(mode, seconds, burst)
+        print(f"{mode:<8}{r['sent']:>10,}{r['dropped']:>10,}{r['p50']:>12.2f}{r['p99']:>10.2f}{r['max']:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Bytes-per-event comparison of the /ws wire formats on a realistic alarm mix.
+
+Replays a synthetic stream of alarm, alarm_update and zone_update messages
+shaped like the ones server.py broadcasts and reports the average frame size
+for JSON text and compact MessagePack, each with and without permessage-deflate
+(RFC 7692, with and without context takeover).
+
+    python benchmarks/ws_framing.py [events]
+"""
+
+import os
+import random
+import sys
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ema_benchmark")
+
+from realtime import WireEncoding, encode_message, msgpack  # noqa: E402
+from server import Alarm, AlarmSeverity, AlarmStatus, Zone, ZoneStatus, ZoneType  # noqa: E402
+
+AREAS = ["Main Entrance", "Warehouse North", "Server Room", "Loading Dock", "Office Floor 2", "Parking Garage"]
+
+
+def build_zones(count=200):
+    zones = []
+    for i in range(count):
+        zone_type = random.choice(list(ZoneType))
+        zones.append(Zone(
+            name=f"{zone_type.value.replace('_', ' ').title()} Sensor {i:03d}",
+            zone_type=zone_type,
+            area=random.choice(AREAS),
+            description="Commissioned sensor",
+            is_armed=True,
+        ))
+    return zones
+
+
+def event_stream(zones, events):
+    now = datetime.utcnow()
+    open_alarms = []
+    for n in range(events):
+        roll = random.random()
+        zone = random.choice(zones)
+        if roll < 0.25 or not open_alarms:
+            alarm = Alarm(
+                zone_id=zone.id,
+                zone_name=zone.name,
+                alarm_type=zone.zone_type,
+                severity=random.choice(list(AlarmSeverity)),
+                message=f"Zone '{zone.name}' triggered - {zone.zone_type.value} detected",
+                triggered_at=now + timedelta(seconds=n),
+                area=zone.area,
+            )
+            open_alarms.append(alarm)
+            yield {"type": "alarm", "data": alarm.dict()}
+        elif roll < 0.5:
+            alarm = open_alarms.pop(random.randrange(len(open_alarms)))
+            yield {"type": "alarm_update", "data": {"id": alarm.id, "status": random.choice(
+                [AlarmStatus.ACKNOWLEDGED, AlarmStatus.RESOLVED])}}
+        elif roll < 0.9:
+            yield {"type": "zone_update", "data": {"id": zone.id, "status": random.choice(
+                [ZoneStatus.ALARM, ZoneStatus.NORMAL])}}
+        else:
+            yield {"type": "zone_update", "data": zone.dict()}
+
+
+def deflate_sizes(frames, context_takeover):
+    compressor = zlib.compressobj(wbits=-15)
+    total = 0
+    for frame in frames:
+        data = frame.encode() if isinstance(frame, str) else frame
+        if not context_takeover:
+            compressor = zlib.compressobj(wbits=-15)
+        # permessage-deflate drops the trailing 00 00 ff ff of the sync flush
+        total += len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    random.seed(42)
+    messages = list(event_stream(build_zones(), events))
+
+    encodings = [WireEncoding.JSON] + ([WireEncoding.MSGPACK] if msgpack is not None else [])
+    baseline = None
+    print(f"{events} events")
+    print(f"{'format':<36}{'bytes/event':>12}{'vs JSON':>10}")
+    for encoding in encodings:
+        frames = [encode_message(m, encoding) for m in messages]
+        raw = sum(len(f.encode() if isinstance(f, str) else f) for f in frames)
+        for label, total in (
+            (encoding.value, raw),
+            (f"{encoding.value} + deflate", deflate_sizes(frames, True)),
+            (f"{encoding.value} + deflate (no ctx takeover)", deflate_sizes(frames, False)),
+        ):
+            baseline = baseline or total
+            print(f"{label:<36}{total / events:>12.1f}{total / baseline:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -92,6 +92,11 @@ const useWebSocket = () => {
     
     newSocket.onmessage = (event) => {
       const message = JSON.parse(event.data);
+      if (message.type === 'ping') {
+        // Answer the server heartbeat so this connection is not reaped as idle
+        newSocket.send(JSON.stringify({ type: 'pong', ts: message.ts }));
+        return;
+      }
       setLastMessage(message);
     };
     
@@ -358,6 +363,7 @@ const AlarmCard = ({ alarm, onAcknowledge, onResolve }) => {
 const Dashboard = () => {
   const [zones, setZones] = useState([]);
   const [alarms, setAlarms] = useState([]);
+  const [incidents, setIncidents] = useState([]);
   const [stats, setStats] = useState({});
   const [activeTab, setActiveTab] = useState('overview');
   const [loading, setLoading] = useState(true);
@@ -376,15 +382,18 @@ const Dashboard = () => {
   
   const fetchData = async () => {
     try {
-      const [zonesRes, alarmsRes, statsRes] = await Promise.all([
-        axios.get(`${API}/zones`),
-        axios.get(`${API}/alarms`),
-        axios.get(`${API}/dashboard/stats`)
-      ]);
+      // One consistent snapshot instead of separate zones/alarms/stats requests
+      const { data } = await axios.get(`${API}/dashboard/snapshot`);
+      const byId = new Map();
+      [...data.active_alarms, ...data.recent_alarms].forEach(alarm => byId.set(alarm.id, alarm));
+      const mergedAlarms = [...byId.values()].sort(
+        (a, b) => new Date(b.triggered_at) - new Date(a.triggered_at)
+      );
       
-      setZones(zonesRes.data);
-      setAlarms(alarmsRes.data);
-      setStats(statsRes.data);
+      setZones(data.zones);
+      setAlarms(mergedAlarms);
+      setStats(data.stats);
+      setIncidents(data.open_incidents);
     } catch (error) {
       console.error('Error fetching data:', error);
     } finally {
@@ -402,16 +411,67 @@ const Dashboard = () => {
           zone.id === message.data.id ? { ...zone, ...message.data } : zone
         ));
         break;
+      case 'zone_updates': {
+        // Coalesced batch: apply every zone change in a single render
+        const updates = new Map(message.data.map(update => [update.id, update]));
+        setZones(prev => prev.map(zone => 
+          updates.has(zone.id) ? { ...zone, ...updates.get(zone.id) } : zone
+        ));
+        break;
+      }
       case 'alarm_update':
         setAlarms(prev => prev.map(alarm => 
           alarm.id === message.data.id ? { ...alarm, ...message.data } : alarm
         ));
         break;
+      case 'alarm_updates': {
+        // Bulk acknowledge/resolve: one status for many alarms
+        const ids = new Set(message.data.ids);
+        setAlarms(prev => prev.map(alarm => 
+          ids.has(alarm.id) ? { ...alarm, status: message.data.status } : alarm
+        ));
+        break;
+      }
+      case 'alarm_escalation':
+      case 'alarm_escalations': {
+        // Unacknowledged alarms that crossed an escalation step
+        const escalations = [].concat(message.data);
+        const byId = new Map(escalations.map(e => [e.id, e]));
+        setAlarms(prev => prev.map(alarm => 
+          byId.has(alarm.id)
+            ? { ...alarm, severity: byId.get(alarm.id).severity, escalation_level: byId.get(alarm.id).level }
+            : alarm
+        ));
+        break;
+      }
+      case 'zones_imported':
+        // A site plan import may add hundreds of zones; reload rather than merge
+        fetchData();
+        break;
+      case 'incident':
+        setIncidents(prev => [message.data, ...prev]);
+        break;
+      case 'incident_update': {
+        // Either another alarm joined it or an operator changed its status
+        const { id, alarm_id, zone_id, ...changes } = message.data;
+        setIncidents(prev => prev
+          .map(incident => incident.id === id ? { ...incident, ...changes } : incident)
+          .filter(incident => incident.status === 'open'));
+        break;
+      }
       default:
         break;
     }
   };
   
+  const handleResolveIncident = async (incidentId) => {
+    try {
+      await axios.post(`${API}/incidents/${incidentId}/resolve`);
+    } catch (error) {
+      console.error('Error resolving incident:', error);
+    }
+  };
+  
   const handleArmZone = async (zoneId) => {
     try {
       await axios.post(`${API}/zones/${zoneId}/arm`);
@@ -545,6 +605,31 @@ const Dashboard = () => {
               <StatCard title="Events Today" value={stats.total_events_today || 0} icon="📊" color="purple" />
             </div>
             
+            {/* Open Incidents: related alarms grouped by the correlation rules */}
+            {incidents.length > 0 && (
+              <div className="bg-white rounded-xl shadow-lg p-6 border-l-4 border-red-600">
+                <h2 className="text-xl font-semibold text-gray-900 mb-4">Open Incidents</h2>
+                <div className="space-y-3">
+                  {incidents.map((incident) => (
+                    <div key={incident.id} className="flex items-center justify-between">
+                      <div>
+                        <p className="font-semibold text-gray-900">{incident.name} – {incident.area}</p>
+                        <p className="text-sm text-gray-600">
+                          {incident.alarm_count} alarms since {new Date(incident.first_alarm_at).toLocaleTimeString()}
+                        </p>
+                      </div>
+                      <button
+                        onClick={() => handleResolveIncident(incident.id)}
+                        className="px-3 py-1 text-xs bg-green-600 hover:bg-green-700 text-white rounded transition-colors"
+                      >
+                        Resolve
+                      </button>
+                    </div>
+                  ))}
+                </div>
+              </div>
+            )}
+            
             {/* Recent Alarms */}
             <div className="bg-white rounded-xl shadow-lg p-6">
               <h2 className="text-xl font-semibold text-gray-900 mb-4">Recent Alarms</h2>
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# server.py picks its storage backend at import time; unit tests use the
+# in-memory one so they never need a running database.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ema_test")
+os.environ.setdefault("ALARM_SPOOL_DIR", tempfile.mkdtemp(prefix="ema-spool-"))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
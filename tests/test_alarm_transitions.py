@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import BulkAlarmFilter, BulkAlarmRequest
+
+
+def test_bulk_query_requires_exactly_one_selector():
+    with pytest.raises(HTTPException):
+        server.bulk_alarm_query(BulkAlarmRequest())
+    with pytest.raises(HTTPException):
+        server.bulk_alarm_query(BulkAlarmRequest(alarm_ids=["a"], filter=BulkAlarmFilter(area="Lobby")))
+
+
+def test_bulk_query_from_filter():
+    query = server.bulk_alarm_query(BulkAlarmRequest(filter=BulkAlarmFilter(
+        area="Lobby", severity="high", triggered_before=datetime(2025, 1, 1)
+    )))
+    assert query == {"area": "Lobby", "severity": "high", "triggered_at": {"$lt": datetime(2025, 1, 1)}}
+
+
+def test_bulk_query_rejects_oversized_id_lists():
+    with pytest.raises(HTTPException):
+        server.bulk_alarm_query(BulkAlarmRequest(alarm_ids=[str(i) for i in range(server.BULK_ALARM_LIMIT + 1)]))
+
+
+def test_merge_bucket_updates_sums_increments_per_bucket():
+    alarms = [
+        {"id": f"a{i}", "zone_id": "z1", "zone_name": "Door", "area": "Lobby",
+         "severity": "high", "triggered_at": datetime(2025, 1, 1, 10)}
+        for i in range(500)
+    ]
+    updates = []
+    for alarm in alarms:
+        updates.extend(server.response_time_updates(alarm, "ack", datetime(2025, 1, 1, 10, 1), "u1", "Op"))
+
+    merged = server.merge_bucket_updates(updates)
+    assert len(merged) == 8
+    assert all(u._doc["$inc"]["ack_count"] == 500 for u in merged)
+    assert all(u._doc["$inc"]["ack_sum"] == 500 * 60.0 for u in merged)
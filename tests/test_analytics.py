@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import server
+from server import AnalyticsGroup
+
+
+def make_alarm(triggered_at):
+    return {
+        "id": "alarm-1",
+        "zone_id": "zone-1",
+        "zone_name": "Front Door",
+        "area": "Lobby",
+        "severity": "high",
+        "triggered_at": triggered_at,
+    }
+
+
+def test_response_time_updates_cover_every_group_and_granularity():
+    alarm = make_alarm(datetime(2025, 3, 14, 10, 0, 0))
+    updates = server.response_time_updates(alarm, "ack", datetime(2025, 3, 14, 10, 0, 30), "user-1", "Operator")
+
+    filters = [u._filter for u in updates]
+    assert len(filters) == 8
+    assert {(f["group_by"], f["granularity"]) for f in filters} == {
+        (g.value, gran) for g in AnalyticsGroup for gran in ("day", "month")
+    }
+    assert {f["bucket"] for f in filters} == {datetime(2025, 3, 14), datetime(2025, 3, 1)}
+    assert updates[0]._doc["$inc"]["ack_sum"] == 30.0
+
+
+def test_bucket_filter_uses_months_for_long_ranges():
+    ranges = server.response_bucket_filter(datetime(2025, 1, 15, 3), datetime(2025, 12, 3, 5))
+    assert ranges[0] == {
+        "granularity": "month",
+        "bucket": {"$gte": datetime(2025, 2, 1), "$lt": datetime(2025, 12, 1)},
+    }
+    assert {r["granularity"] for r in ranges[1:]} == {"day"}
+
+
+def test_bucket_filter_short_range_uses_days_only():
+    ranges = server.response_bucket_filter(datetime(2025, 1, 15), datetime(2025, 1, 20))
+    assert ranges == [{"granularity": "day", "bucket": {"$gte": datetime(2025, 1, 15), "$lt": datetime(2025, 1, 20)}}]
+
+
+def test_merge_response_buckets_combines_days_and_months():
+    hist = lambda *values: {str(server._response_bin(v)): 1 for v in values}
+    buckets = [
+        {"key": "zone-1", "label": "Front Door", "ack_count": 2, "ack_sum": 20.0, "ack_hist": hist(5, 15)},
+        {"key": "zone-1", "label": "Front Door", "ack_count": 1, "ack_sum": 10.0, "ack_hist": hist(10),
+         "resolve_count": 1, "resolve_sum": 600.0, "resolve_hist": hist(600)},
+    ]
+    [stats] = server.merge_response_buckets(AnalyticsGroup.ZONE, buckets)
+
+    assert stats.acknowledged_count == 3
+    assert stats.mtta_seconds == 10.0
+    assert 7 <= stats.tta_p50_seconds <= 13
+    assert stats.resolved_count == 1
+    assert 500 <= stats.ttr_p95_seconds <= 700
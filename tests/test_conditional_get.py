@@ -0,0 +1,84 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import server
+
+
+def auth_headers(**extra):
+    token = server.create_access_token({"sub": "user-1"})
+    return {"Authorization": f"Bearer {token}", **extra}
+
+
+class FakeCollection:
+    async def bulk_write(self, *args, **kwargs):
+        return None
+
+
+class FakeDatabase:
+    change_versions = FakeCollection()
+
+
+def bump(*collections, monkeypatch):
+    # Keep the MongoDB mirror out of unit tests
+    monkeypatch.setattr(server, "db", FakeDatabase())
+    asyncio.run(server.change_versions.bump(*collections))
+
+
+def test_matching_etag_returns_304_without_touching_the_database():
+    client = TestClient(server.app)
+    etag = server.change_versions.etag("zones")
+
+    response = client.get("/api/zones", headers=auth_headers(**{"If-None-Match": etag}))
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+
+def test_write_changes_the_etag(monkeypatch):
+    before = server.change_versions.etag("alarms")
+    bump("alarms", monkeypatch=monkeypatch)
+    assert server.change_versions.etag("alarms") != before
+
+
+def test_stats_etag_follows_every_collection_it_counts(monkeypatch):
+    before = server._etag_for("dashboard_stats")
+    bump("events", monkeypatch=monkeypatch)
+    assert server._etag_for("dashboard_stats") != before
+
+
+def test_etag_without_valid_token_is_not_honoured():
+    client = TestClient(server.app)
+    etag = server.change_versions.etag("alarms")
+
+    response = client.get("/api/alarms", headers={"If-None-Match": etag, "Authorization": "Bearer junk"})
+
+    assert response.status_code == 401
+
+
+def test_snapshot_version_covers_incidents_and_answers_304():
+    client = TestClient(server.app)
+    stats_etag = server._etag_for("dashboard_stats")
+    etag = server._etag_for("dashboard_snapshot")
+    asyncio.run(server.change_versions.bump("incidents"))
+
+    # Open incidents are part of the snapshot, not of the stats
+    assert server._etag_for("dashboard_stats") == stats_etag
+    assert server._etag_for("dashboard_snapshot") != etag
+    etag = server._etag_for("dashboard_snapshot")
+    response = client.get("/api/dashboard/snapshot", headers=auth_headers(**{"If-None-Match": etag}))
+
+    assert response.status_code == 304
+
+
+def test_snapshot_stats_are_derived_from_the_zone_list():
+    zones = [
+        {"is_armed": True, "status": "normal"},
+        {"is_armed": True, "status": "alarm"},
+        {"is_armed": False, "status": "fault"},
+    ]
+    stats = server.build_system_stats(zones, active_alarms=4, total_events_today=9)
+
+    assert (stats.total_zones, stats.zones_armed, stats.zones_normal, stats.zones_fault) == (3, 2, 1, 1)
+    assert (stats.active_alarms, stats.total_events_today) == (4, 9)
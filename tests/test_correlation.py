@@ -0,0 +1,203 @@
+import asyncio
+from datetime import datetime, timedelta
+from itertools import count
+
+from fastapi.testclient import TestClient
+
+import server
+import storage
+from correlation import CorrelationEngine
+from server import AlarmSeverity
+from spool import WriteAheadSpool
+
+T0 = datetime(2025, 6, 1, 12, 0, 0)
+
+INTRUSION = {
+    "id": "intrusion", "name": "Intrusion", "first": "glass_break",
+    "zone_types": ["glass_break", "motion", "door_contact"], "window_seconds": 60, "severity": "critical",
+}
+BURST = {"id": "burst", "name": "Burst", "min_alarms": 3, "window_seconds": 10}
+
+ids = count()
+
+
+def alarm(zone_type, seconds, area="Lobby"):
+    n = next(ids)
+    return {"id": f"a{n}", "zone_id": f"{zone_type}-{area}", "alarm_type": zone_type,
+            "area": area, "triggered_at": T0 + timedelta(seconds=seconds)}
+
+
+def test_intrusion_needs_glass_break_first_and_all_types_within_the_window():
+    engine = CorrelationEngine([INTRUSION])
+
+    # Motion before the glass break does not count towards the sequence
+    assert engine.observe(alarm("motion", 0)) == []
+    assert engine.observe(alarm("glass_break", 5)) == []
+    assert engine.observe(alarm("door_contact", 10, area="Vault")) == []
+    assert engine.observe(alarm("motion", 20)) == []
+    [(change, incident, _)] = engine.observe(alarm("door_contact", 64))
+    assert change == "created"
+    assert (incident["area"], incident["alarm_count"], incident["severity"]) == ("Lobby", 3, "critical")
+    assert incident["first_alarm_at"] == T0 + timedelta(seconds=5)
+
+    # Alarms arriving within the window of the last one join the incident
+    [(change, joined, pushed)] = engine.observe(alarm("motion", 100))
+    assert (change, joined["id"], joined["alarm_count"]) == ("updated", incident["id"], 4)
+    assert list(pushed) == ["alarm_ids"]
+
+    # After a quiet window it takes a whole new sequence
+    assert engine.observe(alarm("motion", 200)) == []
+    assert engine.observe(alarm("glass_break", 300)) == []
+    assert engine.observe(alarm("motion", 310)) == []
+    assert engine.observe(alarm("door_contact", 361)) == []
+
+
+def test_expired_opener_clears_the_window():
+    engine = CorrelationEngine([INTRUSION])
+    engine.observe(alarm("glass_break", 0))
+    engine.observe(alarm("motion", 50))
+    # The glass break has expired; motion and door contact alone do not match
+    assert engine.observe(alarm("door_contact", 70)) == []
+    assert not engine.windows[("intrusion", "Lobby")].alarms
+
+
+def test_burst_rule_counts_per_area_and_survives_unrelated_rule_changes():
+    engine = CorrelationEngine([BURST])
+    for seconds in (0, 5, 11):
+        assert engine.observe(alarm("fire", seconds)) == []
+    engine.observe(alarm("fire", 12, area="Vault"))
+
+    # Reloading unchanged rules keeps the window; the first alarm has expired
+    engine.set_rules([dict(BURST), dict(INTRUSION)])
+    [(change, incident, _)] = engine.observe(alarm("fire", 12))
+    assert (change, incident["alarm_count"]) == ("created", 3)
+
+    assert engine.close(incident["id"])
+    assert engine.observe(alarm("fire", 13)) == []
+    engine.set_rules([{**BURST, "window_seconds": 20}])
+    assert engine.windows == {}
+
+
+def test_incident_travels_in_the_spool_and_replays_once(tmp_path, monkeypatch):
+    db = storage.MemoryStorage()
+    sent = []
+
+    async def broadcast(message):
+        sent.append(message)
+
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "correlator", CorrelationEngine([INTRUSION]))
+    monkeypatch.setattr(server.manager, "broadcast", broadcast)
+
+    async def scenario():
+        spool = WriteAheadSpool(str(tmp_path), fsync=False)
+        spool.open()
+        monkeypatch.setattr(server, "alarm_spool", spool)
+        for zone_type in ("glass_break", "motion", "door_contact", "motion"):
+            zone = {"id": f"z-{zone_type}", "name": zone_type, "zone_type": zone_type, "area": "Lobby"}
+            await db.zones.insert_one({**zone, "status": "normal", "trigger_count": 0})
+            await server.trigger_zone(zone, AlarmSeverity.HIGH, "Triggered", "zone_triggered", "Zone triggered")
+        records = [record for _, record in spool.pending()]
+        for record in records + records:
+            await server.apply_spooled_trigger(record)
+        spool.close()
+        return await db.incidents.find({}, {"_id": 0}).to_list(None)
+
+    [incident] = asyncio.run(scenario())
+    assert incident["alarm_count"] == 4 and len(incident["alarm_ids"]) == 4
+    assert sorted(incident["zone_ids"]) == ["z-door_contact", "z-glass_break", "z-motion"]
+    assert [m["type"] for m in sent if m["type"].startswith("incident")] == ["incident", "incident_update"]
+
+
+def test_alarms_for_an_incident_resolved_elsewhere_start_a_successor(tmp_path, monkeypatch):
+    db = storage.MemoryStorage()
+    sent = []
+
+    async def broadcast(message):
+        sent.append(message)
+
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "correlator", CorrelationEngine([INTRUSION]))
+    monkeypatch.setattr(server.manager, "broadcast", broadcast)
+
+    async def trigger(spool, zone_type):
+        zone = {"id": f"z-{zone_type}", "name": zone_type, "zone_type": zone_type, "area": "Lobby"}
+        await db.zones.update_one({"id": zone["id"]}, {"$setOnInsert": {**zone, "status": "normal"}}, upsert=True)
+        await server.trigger_zone(zone, AlarmSeverity.HIGH, "Triggered", "zone_triggered", "Zone triggered")
+
+    async def replay(spool):
+        for offset, record in list(spool.pending()):
+            await server.apply_spooled_trigger(record)
+            await spool.commit(offset)
+
+    async def scenario():
+        spool = WriteAheadSpool(str(tmp_path), fsync=False)
+        spool.open()
+        monkeypatch.setattr(server, "alarm_spool", spool)
+        for zone_type in ("glass_break", "motion", "door_contact"):
+            await trigger(spool, zone_type)
+        await replay(spool)
+        # Another worker resolves it; this worker's correlator still has it open
+        await db.incidents.update_one({}, {"$set": {"status": "resolved"}})
+        await trigger(spool, "motion")
+        await trigger(spool, "door_contact")
+        await replay(spool)
+        await trigger(spool, "motion")
+        await replay(spool)
+        spool.close()
+        return await db.incidents.find({}, {"_id": 0}).sort("created_at", 1).to_list(None)
+
+    resolved, successor = asyncio.run(scenario())
+    assert (resolved["status"], resolved["alarm_count"], resolved["successor_id"]) == ("resolved", 3, successor["id"])
+    assert (successor["status"], successor["alarm_count"], successor["previous_id"]) == ("open", 3, resolved["id"])
+    assert sorted(successor["zone_ids"]) == ["z-door_contact", "z-motion"]
+    assert server.correlator.open_incidents[("intrusion", "Lobby")]["id"] == successor["id"]
+    assert [m["data"]["id"] for m in sent if m["type"] == "incident"] == [resolved["id"], successor["id"]]
+
+
+def test_resolving_an_incident_resolves_its_alarms(monkeypatch):
+    db = storage.MemoryStorage()
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server.manager, "broadcast", lambda message: asyncio.sleep(0))
+    user = server.User(email="ops@example.com", name="Ops", role="security")
+    headers = {"Authorization": f"Bearer {server.create_access_token({'sub': user.id})}"}
+    client = TestClient(server.app)
+
+    async def seed():
+        await db.users.insert_one(user.dict())
+        for alarm_id in ("a1", "a2"):
+            await db.alarms.insert_one({
+                "id": alarm_id, "zone_id": "z1", "zone_name": "Z", "alarm_type": "motion", "severity": "high",
+                "status": "active", "message": "m", "triggered_at": T0, "area": "Lobby"
+            })
+        await db.incidents.insert_one(server.Incident(
+            id="i1", rule_id="intrusion", name="Intrusion", area="Lobby", severity="critical",
+            alarm_ids=["a1", "a2"], zone_ids=["z1"], alarm_count=2, first_alarm_at=T0, last_alarm_at=T0
+        ).dict())
+
+    asyncio.run(seed())
+    resolved = client.post("/api/incidents/i1/resolve", headers=headers)
+    again = client.post("/api/incidents/i1/resolve", headers=headers)
+    missing = client.post("/api/incidents/nope/acknowledge", headers=headers)
+
+    assert resolved.status_code == 200 and resolved.json()["status"] == "resolved"
+    assert (again.status_code, missing.status_code) == (409, 404)
+    statuses = asyncio.run(db.alarms.find({}, {"_id": 0, "status": 1}).to_list(None))
+    assert [a["status"] for a in statuses] == ["resolved", "resolved"]
+    assert [i["id"] for i in client.get("/api/incidents?status=resolved", headers=headers).json()] == ["i1"]
+
+
+def test_rules_need_something_to_correlate(monkeypatch):
+    db = storage.MemoryStorage()
+    monkeypatch.setattr(server, "db", db)
+    user = server.User(email="ops@example.com", name="Ops", role="security")
+    asyncio.run(db.users.insert_one(user.dict()))
+    headers = {"Authorization": f"Bearer {server.create_access_token({'sub': user.id})}"}
+    client = TestClient(server.app)
+
+    empty = client.post("/api/correlation-rules", json={"name": "x"}, headers=headers)
+    stray_first = client.post("/api/correlation-rules", json={
+        "name": "x", "zone_types": ["motion"], "first": "fire"
+    }, headers=headers)
+    created = client.post("/api/correlation-rules", json=INTRUSION, headers=headers)
+    assert (empty.status_code, stray_first.status_code, created.status_code) == (400, 400, 200)
@@ -0,0 +1,156 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import server
+import storage
+from escalation import DeadlineQueue, Escalator, select_policy
+
+T0 = datetime(2025, 6, 1, 12, 0, 0)
+
+POLICIES = [
+    {"id": "any", "steps": [{"after_seconds": 600, "action": "rebroadcast"}]},
+    {"id": "critical", "severity": "critical", "steps": [{"after_seconds": 60, "action": "rebroadcast"}]},
+    {"id": "vault", "area": "Vault", "steps": [
+        {"after_seconds": 120, "action": "raise_severity"},
+        {"after_seconds": 30, "action": "rebroadcast", "audience": "supervisors"},
+    ]},
+]
+
+
+def alarm(id, area="Vault", severity="medium", **extra):
+    return {"id": id, "zone_id": f"zone-{id}", "zone_name": f"Zone {id}", "area": area,
+            "severity": severity, "status": "active", "triggered_at": T0, **extra}
+
+
+def test_deadline_queue_cancel_keeps_heap_order():
+    rng = random.Random(7)
+    queue, expected = DeadlineQueue(), {}
+    for i in range(2000):
+        deadline = T0 + timedelta(seconds=rng.randint(0, 10000))
+        queue.push(i, deadline)
+        expected[i] = deadline
+    for i in rng.sample(range(2000), 1000):
+        assert queue.cancel(i)
+        del expected[i]
+    for i in rng.sample(sorted(expected), 100):
+        # Rescheduling an existing key replaces its entry
+        expected[i] = T0 + timedelta(seconds=rng.randint(0, 10000))
+        queue.push(i, expected[i])
+
+    assert not queue.cancel(-1)
+    assert len(queue) == len(expected)
+    popped = [queue.pop()[:2] for _ in range(len(queue))]
+    assert [deadline for deadline, _ in popped] == sorted(expected.values())
+    assert {key: deadline for deadline, key in popped} == expected
+
+
+def test_most_specific_policy_wins():
+    assert select_policy(POLICIES, "medium", "Lobby")["id"] == "any"
+    assert select_policy(POLICIES, "critical", "Lobby")["id"] == "critical"
+    assert select_policy(POLICIES, "critical", "Vault")["id"] == "vault"
+    assert select_policy([{**POLICIES[0], "enabled": False}], "low", "Lobby") is None
+
+
+def test_escalator_fires_steps_in_order_and_cancel_stops_them():
+    now = [T0]
+    escalator = Escalator(clock=lambda: now[0])
+    escalator.set_policies([dict(p) for p in POLICIES])
+    assert escalator.track(alarm("a1"))
+    assert escalator.track(alarm("a2"))
+    assert not escalator.track(alarm("a1"))
+
+    assert escalator.cancel(["a2"]) == 1
+    assert escalator.pop_due(T0 + timedelta(seconds=29)) == []
+    # Steps are sorted by delay: the rebroadcast at +30s comes first
+    [(alarm_id, policy_id, level, deadline, step)] = escalator.pop_due(T0 + timedelta(seconds=30))
+    assert (alarm_id, policy_id, level, step["audience"]) == ("a1", "vault", 0, "supervisors")
+    assert escalator.queue.peek() == T0 + timedelta(seconds=120)
+
+    [(_, _, level, _, step)] = escalator.pop_due(T0 + timedelta(seconds=500))
+    assert (level, step["action"]) == (1, "raise_severity")
+    assert len(escalator.queue) == 0
+
+
+def test_apply_escalations_updates_open_alarms_and_broadcasts_once(monkeypatch):
+    db = storage.MemoryStorage()
+    sent = []
+
+    async def broadcast(message):
+        sent.append(message)
+
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server.manager, "broadcast", broadcast)
+
+    async def scenario():
+        await db.alarms.insert_many([alarm("a1"), alarm("a2", severity="critical"), alarm("a3", status="acknowledged")])
+        raise_step = {"after_seconds": 120, "action": "raise_severity"}
+        closed = await server.apply_escalations([
+            ("a1", "vault", 0, T0, raise_step),
+            ("a2", "vault", 0, T0, raise_step),
+            ("a3", "vault", 0, T0, raise_step),
+        ])
+        stored = {a["id"]: (a["severity"], a["escalation_level"]) async for a in db.alarms.find({"status": "active"})}
+        return closed, stored, await db.events.count_documents({"event_type": "alarm_escalated"})
+
+    closed, stored, events = asyncio.run(scenario())
+    assert closed == ["a3"]
+    assert stored == {"a1": ("high", 1), "a2": ("critical", 1)}
+    assert events == 2
+    assert [m["type"] for m in sent] == ["alarm_escalations"]
+    assert {e["id"]: e["severity"] for e in sent[0]["data"]} == {"a1": "high", "a2": "critical"}
+
+
+def test_acknowledging_cancels_the_pending_escalation(monkeypatch):
+    db = storage.MemoryStorage()
+    escalator = Escalator()
+    escalator.set_policies([dict(p) for p in POLICIES])
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "escalator", escalator)
+    monkeypatch.setattr(server.manager, "broadcast", lambda message: asyncio.sleep(0))
+    user = server.User(email="ops@example.com", name="Ops", role="security")
+
+    async def scenario():
+        await db.alarms.insert_one(alarm("a1"))
+        escalator.track(alarm("a1"))
+        await server.transition_alarms({"id": "a1"}, server.AlarmStatus.ACKNOWLEDGED, user)
+        return len(escalator.queue)
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_steady_syncs_do_not_hold_back_due_steps():
+    clock_calls = [0]
+
+    def clock():
+        clock_calls[0] += 1
+        return datetime.utcnow()
+
+    escalator = Escalator(clock=clock, sync_interval=1)
+    started = datetime.utcnow()
+    applied = []
+
+    async def apply(batch):
+        applied.append(datetime.utcnow() - started)
+        return []
+
+    async def load_policies():
+        return [{"id": "fast", "steps": [{"after_seconds": 0.3, "action": "rebroadcast"}]}]
+
+    async def load_alarms():
+        return [alarm("a1", triggered_at=started)]
+
+    async def load_recent_alarms(since):
+        return []
+
+    async def scenario():
+        runner = asyncio.create_task(escalator.run(apply, load_policies, load_alarms, load_recent_alarms))
+        # A steady stream of triggers elsewhere, each bumping the alarms version
+        for _ in range(80):
+            escalator.request_sync()
+            await asyncio.sleep(0.01)
+        runner.cancel()
+
+    asyncio.run(scenario())
+    assert len(applied) == 1 and applied[0] < timedelta(seconds=0.6)
+    assert clock_calls[0] < 2000
@@ -0,0 +1,58 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import server
+import storage
+from ids import TIME_ORDERED_MIN, UUID7Generator, id_time, is_time_ordered, new_id
+
+
+def test_ids_are_compact_monotonic_and_sort_after_uuid4():
+    ids = [new_id() for _ in range(20000)]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert all(len(i) == 26 and is_time_ordered(i) for i in ids)
+    legacy = [str(uuid.uuid4()) for _ in range(1000)] + ["f" * 8 + "-ffff-4fff-bfff-" + "f" * 12]
+    assert max(legacy) < TIME_ORDERED_MIN <= min(ids)
+    assert not any(is_time_ordered(i) for i in legacy)
+
+    assert abs(id_time(ids[0]) - datetime.utcnow()) < timedelta(seconds=5)
+    assert id_time(legacy[0]) is None
+
+
+def test_ids_are_valid_uuid7_and_survive_a_full_millisecond():
+    generator = UUID7Generator(clock_ms=lambda: 1_700_000_000_000)
+    values = [generator.next() for _ in range(5000)]
+    assert values == sorted(values)
+    parsed = uuid.UUID(int=values[0])
+    assert (parsed.version, parsed.variant) == (7, uuid.RFC_4122)
+    # More ids than the 12-bit counter holds borrow the following millisecond
+    assert values[-1] >> 80 == 1_700_000_000_001
+
+
+def test_newest_first_pages_new_ids_then_legacy_by_timestamp(monkeypatch):
+    db = storage.MemoryStorage()
+    monkeypatch.setattr(server, "db", db)
+    t0 = datetime(2025, 1, 1)
+
+    async def scenario():
+        legacy = [{"id": str(uuid.uuid4()), "timestamp": t0 + timedelta(minutes=i)} for i in range(5)]
+        fresh = [{"id": new_id(), "timestamp": t0 + timedelta(days=1, minutes=i)} for i in range(5)]
+        await db.events.insert_many(legacy + fresh)
+        pages, before = [], None
+        while True:
+            page = await server.newest_first(db.events, {}, 3, before, "timestamp")
+            if not page:
+                return pages
+            pages.append(page)
+            before = page[-1]["id"]
+
+    pages = asyncio.run(scenario())
+    timestamps = [doc["timestamp"] for page in pages for doc in page]
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert timestamps == sorted(timestamps, reverse=True) and len(set(timestamps)) == 10
+
+    with pytest.raises(HTTPException):
+        asyncio.run(server.newest_first(db.events, {}, 3, "not-an-id", "timestamp"))
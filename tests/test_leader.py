@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import storage
+from leader import LeaderElection
+
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2025, 6, 1, 12, 0, 0)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+def elections(db, clock, count=2):
+    return [
+        LeaderElection(lambda: db.leases, "jobs", lease_seconds=10, renew_interval=3,
+                       holder=f"worker-{i}", clock=clock)
+        for i in range(count)
+    ]
+
+
+def test_only_one_worker_leads_and_runs_singleton_jobs():
+    db, clock = storage.MemoryStorage(), Clock()
+    started = []
+
+    async def job():
+        started.append(asyncio.current_task())
+        await asyncio.Event().wait()
+
+    async def scenario():
+        a, b = elections(db, clock)
+        a.singleton("simulator", job)
+        b.singleton("simulator", job)
+        results = [await a.tick(), await b.tick(), await a.tick(), await b.tick()]
+        await asyncio.sleep(0)
+        return results, a.is_leader, b.is_leader, a.token, len(started), await a.still_leader()
+
+    results, a_leads, b_leads, token, jobs, fenced = asyncio.run(scenario())
+    assert results == [True, False, True, False]
+    assert (a_leads, b_leads, token, jobs, fenced) == (True, False, 1, 1, True)
+
+
+def test_expired_lease_fails_over_with_a_new_fencing_token():
+    db, clock = storage.MemoryStorage(), Clock()
+
+    async def scenario():
+        a, b = elections(db, clock)
+        await a.tick()
+        # a stops renewing; it stops considering itself leader before the lease expires
+        clock.advance(8)
+        assert not a.is_leader
+        assert not await b.tick()
+        clock.advance(3)
+        assert await b.tick()
+        # a comes back: its token is stale and it cannot renew
+        return b.token, await a.still_leader(), await a.tick(), a.token
+
+    assert asyncio.run(scenario()) == (2, False, False, None)
+
+
+def test_resign_hands_over_without_waiting_for_expiry():
+    db, clock = storage.MemoryStorage(), Clock()
+
+    async def scenario():
+        a, b = elections(db, clock)
+        await a.tick()
+        await a.resign()
+        clock.advance(0.001)
+        return a.is_leader, await b.tick(), b.token
+
+    assert asyncio.run(scenario()) == (False, True, 2)
+
+
+def test_losing_leadership_cancels_singleton_jobs():
+    db, clock = storage.MemoryStorage(), Clock()
+
+    async def scenario():
+        a, b = elections(db, clock)
+        a.singleton("simulator", lambda: asyncio.Event().wait())
+        await a.tick()
+        task = a.tasks["simulator"]
+        clock.advance(11)
+        await b.tick()
+        await a.tick()
+        await asyncio.sleep(0)
+        return task.cancelled(), a.tasks
+
+    assert asyncio.run(scenario()) == (True, {})
+
+
+class StallingLeases:
+    """The leases collection, except renewals hang once `stalled` is set."""
+
+    def __init__(self, leases):
+        self.leases = leases
+        self.stalled = False
+
+    def __getattr__(self, name):
+        return getattr(self.leases, name)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        if self.stalled:
+            await asyncio.Event().wait()
+        return await self.leases.find_one_and_update(*args, **kwargs)
+
+
+def test_stalled_renewal_stops_jobs_before_the_lease_expires():
+    db = storage.MemoryStorage()
+
+    async def scenario():
+        leases = StallingLeases(db.leases)
+        a = LeaderElection(lambda: leases, "jobs", lease_seconds=1, renew_interval=0.4, holder="worker-0")
+        a.singleton("simulator", lambda: asyncio.Event().wait())
+        runner = asyncio.create_task(a.run())
+        await asyncio.sleep(0.05)
+        task = a.tasks["simulator"]
+        leases.stalled = True
+        # The renewal at 0.4s hangs; valid_until is 0.6s, the stored lease 1s
+        await asyncio.sleep(0.65)
+        stopped = task.cancelled(), a.is_leader
+        runner.cancel()
+        return stopped
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_singleton_writes_are_fenced_by_the_token(monkeypatch):
+    import server
+
+    db, clock = storage.MemoryStorage(), Clock()
+    applied = []
+
+    async def apply(batch):
+        applied.extend(batch)
+        return "applied"
+
+    async def scenario():
+        a, b = elections(db, clock)
+        monkeypatch.setattr(server, "leader", a)
+        fenced = server.leader_fenced(apply, "skipped")
+        await a.tick()
+        first = await fenced([1])
+        # b takes over while a still believes it leads
+        await db.leases.update_one({"_id": "jobs"}, {"$set": {"expires_at": clock.now}})
+        clock.advance(0.001)
+        await b.tick()
+        return first, await fenced([2])
+
+    assert asyncio.run(scenario()) == ("applied", "skipped")
+    assert applied == [1]
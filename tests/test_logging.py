@@ -0,0 +1,70 @@
+import asyncio
+import io
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+import server
+import storage
+from logqueue import LogPipeline, log_context
+
+
+def make_pipeline(stream, **kwargs):
+    pipeline = LogPipeline(stream=stream, **kwargs)
+    logger = logging.getLogger("test.logqueue")
+    logger.handlers = [pipeline.handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return pipeline, logger
+
+
+def test_records_carry_context_and_are_written_as_json_off_thread():
+    stream = io.StringIO()
+    pipeline, logger = make_pipeline(stream)
+    pipeline.listener.start()
+    zone = {"name": "Lobby"}
+    with log_context(route="GET /api/zones/{zone_id}", user="u1", zone="z1"):
+        logger.info("Zone %(name)s triggered", zone)
+        zone["name"] = "changed"
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        logger.exception("Failed")
+    pipeline.listener.stop()
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["message"] == "Zone Lobby triggered"
+    assert (first["route"], first["user"], first["zone"], first["level"]) == ("GET /api/zones/{zone_id}", "u1", "z1", "INFO")
+    assert "route" not in second and "RuntimeError: boom" in second["exc"]
+
+
+def test_full_queue_drops_and_counts_instead_of_blocking():
+    pipeline, logger = make_pipeline(io.StringIO(), queue_size=5)
+    # Listener not started: nothing drains the queue
+    for i in range(8):
+        logger.warning("record %d", i)
+    assert pipeline.snapshot() == {"queued": 5, "capacity": 5, "enqueued": 5, "dropped": 3}
+
+
+def test_request_context_binds_route_and_user(monkeypatch):
+    db = storage.MemoryStorage()
+    monkeypatch.setattr(server, "db", db)
+    user = server.User(email="ops@example.com", name="Ops", role="admin")
+    asyncio.run(db.users.insert_one(user.dict()))
+    headers = {"Authorization": f"Bearer {server.create_access_token({'sub': user.id})}"}
+    seen = []
+
+    @server.app.get("/api/_test/log-context/{zone_id}", dependencies=[server.Depends(server.bind_log_context)])
+    async def probe(zone_id: str, current_user: server.User = server.Depends(server.get_current_user)):
+        seen.append((server.log_route.get(), server.log_user.get(), server.log_zone.get()))
+        return {}
+
+    try:
+        assert TestClient(server.app).get("/api/_test/log-context/z9", headers=headers).status_code == 200
+    finally:
+        server.app.router.routes.pop()
+    assert seen == [("GET /api/_test/log-context/{zone_id}", user.id, "z9")]
+
+    stats = TestClient(server.app).get("/api/logging/stats", headers=headers).json()
+    assert set(stats) == {"queued", "capacity", "enqueued", "dropped"}
@@ -0,0 +1,54 @@
+from fastapi.testclient import TestClient
+
+import server
+from ratelimit import ConcurrencyLimiter, TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_allows_burst_then_reports_retry_after():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(3, 60, clock=clock)
+
+    assert [limiter.acquire("ip") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("ip") == 20.0
+
+    clock.now = 20.0
+    assert limiter.acquire("ip") == 0
+    assert limiter.acquire("other") == 0
+
+
+def test_token_bucket_footprint_is_bounded():
+    limiter = TokenBucketLimiter(1, 60, max_keys=100, clock=FakeClock())
+    for i in range(10000):
+        limiter.acquire(f"client-{i}")
+    assert len(limiter.buckets) == 100
+    assert "client-9999" in limiter.buckets
+
+
+def test_concurrency_limiter_rejects_without_waiting():
+    limiter = ConcurrencyLimiter(2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release()
+    assert limiter.try_acquire()
+    assert limiter.rejected == 1
+
+
+def test_over_limit_request_gets_429_before_authentication(monkeypatch):
+    monkeypatch.setitem(server.rate_limiters, ("dashboard_stats", "ip"), TokenBucketLimiter(2, 60))
+    client = TestClient(server.app)
+
+    statuses = [client.get("/api/dashboard/stats").status_code for _ in range(3)]
+    response = client.get("/api/dashboard/stats")
+
+    # The first two pass admission and fail authentication; the rest never reach it
+    assert statuses == [403, 403, 429]
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
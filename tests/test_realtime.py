@@ -0,0 +1,334 @@
+import asyncio
+import time
+from datetime import datetime
+
+from starlette.websockets import WebSocketState
+
+import json
+
+import pytest
+
+from realtime import ConnectionManager, WireEncoding, message_priority, negotiate_encoding
+
+
+class FakeWebSocket:
+    def __init__(self, fail_send=False, send_delay=0):
+        self.fail_send = fail_send
+        self.send_delay = send_delay
+        self.sent = []
+        self.accepted = False
+        self.close_code = None
+        self.application_state = WebSocketState.CONNECTING
+
+    async def accept(self):
+        self.accepted = True
+        self.application_state = WebSocketState.CONNECTED
+
+    async def close(self, code=1000):
+        self.close_code = code
+        self.application_state = WebSocketState.DISCONNECTED
+
+    async def send_text(self, message):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        if self.fail_send:
+            raise RuntimeError("connection reset")
+        self.sent.append(message)
+
+    async def send_bytes(self, message):
+        await self.send_text(message)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def drain():
+    # Let the per-connection sender tasks flush their queues
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_failed_send_removes_socket_immediately():
+    async def scenario():
+        manager = ConnectionManager()
+        healthy, broken = FakeWebSocket(), FakeWebSocket(fail_send=True)
+        await manager.connect(healthy, "10.0.0.1")
+        await manager.connect(broken, "10.0.0.1")
+
+        await manager.broadcast({"type": "hello"})
+        await manager.broadcast({"type": "again"})
+        await drain()
+        return manager, healthy, broken
+
+    manager, healthy, broken = run(scenario())
+    assert [json.loads(m)["type"] for m in healthy.sent] == ["hello", "again"]
+    assert broken not in manager.active_connections
+    assert manager.stats["reaped_send_error"] == 1
+    assert manager.connections_per_ip == {"10.0.0.1": 1}
+
+
+def test_connection_caps_per_ip_and_global():
+    async def scenario():
+        manager = ConnectionManager(max_connections=3, max_connections_per_ip=2)
+        sockets = [FakeWebSocket() for _ in range(5)]
+        ips = ["10.0.0.1", "10.0.0.1", "10.0.0.1", "10.0.0.2", "10.0.0.3"]
+        results = [await manager.connect(ws, ip) for ws, ip in zip(sockets, ips)]
+        # Rejected clients are accepted first so they receive the close code
+        rejected = [ws for ws, ok in zip(sockets, results) if not ok]
+        assert all(ws.accepted for ws in rejected)
+        return manager, results, rejected
+
+    manager, results, rejected = run(scenario())
+    assert results == [True, True, False, True, False]
+    assert manager.stats["rejected_ip_limit"] == 1
+    assert manager.stats["rejected_global_limit"] == 1
+    assert len(manager.active_connections) == 3
+    assert [ws.close_code for ws in rejected] == [1013, 1013]
+
+
+def test_idle_clients_are_reaped_and_live_ones_pinged():
+    async def scenario():
+        manager = ConnectionManager(idle_timeout=30)
+        idle, live = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(idle, "10.0.0.1")
+        await manager.connect(live, "10.0.0.2")
+        manager.active_connections[idle].last_seen -= 60
+
+        await manager.ping_idle_check()
+        await drain()
+        return manager, idle, live
+
+    manager, idle, live = run(scenario())
+    assert idle.close_code is not None
+    assert list(manager.active_connections) == [live]
+    assert manager.stats["reaped_idle"] == 1
+    assert '"type": "ping"' in live.sent[0]
+
+
+def test_disconnect_is_idempotent():
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, "10.0.0.1")
+        return manager, ws
+
+    manager, ws = run(scenario())
+    assert manager.disconnect(ws) is True
+    assert manager.disconnect(ws) is False
+    assert manager.connections_per_ip == {}
+    assert manager.stats["disconnected"] == 1
+
+
+def test_broadcast_uses_each_clients_encoding():
+    msgpack = pytest.importorskip("msgpack")
+
+    async def scenario():
+        manager = ConnectionManager()
+        text, binary = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(text, "10.0.0.1")
+        await manager.connect(binary, "10.0.0.2", negotiate_encoding("msgpack"))
+        await manager.broadcast({
+            "type": "alarm",
+            "data": {"id": "a1", "zone_id": "z1", "severity": "critical", "triggered_at": datetime(2025, 1, 1)},
+        })
+        await drain()
+        return text, binary
+
+    text, binary = run(scenario())
+    assert json.loads(text.sent[0])["data"]["triggered_at"] == "2025-01-01T00:00:00"
+
+    hello, alarm = (msgpack.unpackb(frame) for frame in binary.sent)
+    assert hello["encoding"] == WireEncoding.MSGPACK.value
+    assert hello["keys"]["z"] == "zone_id"
+    assert alarm == {"t": "alarm", "d": {"i": "a1", "z": "z1", "sv": "critical", "ta": 1735689600000}, "q": 1}
+
+
+def test_zone_updates_are_coalesced_per_zone_and_alarms_are_not_delayed():
+    async def scenario():
+        manager = ConnectionManager(coalesce_interval=0.05)
+        ws = FakeWebSocket()
+        await manager.connect(ws, "10.0.0.1")
+
+        await manager.broadcast({"type": "zone_update", "data": {"id": "z1", "status": "alarm"}})
+        await manager.broadcast({"type": "alarm", "data": {"id": "a1"}})
+        await manager.broadcast({"type": "zone_update", "data": {"id": "z2", "is_armed": True}})
+        await manager.broadcast({"type": "zone_update", "data": {"id": "z1", "status": "normal", "is_armed": False}})
+        await drain()
+        sent_before_tick = list(ws.sent)
+        await asyncio.sleep(0.1)
+        return manager, sent_before_tick, ws.sent
+
+    manager, before, after = run(scenario())
+    assert [json.loads(m)["type"] for m in before] == ["alarm"]
+
+    batch = json.loads(after[1])
+    assert batch["type"] == "zone_updates"
+    assert batch["data"] == [
+        {"id": "z1", "status": "normal", "is_armed": False},
+        {"id": "z2", "is_armed": True},
+    ]
+    assert manager.stats["zone_updates_coalesced"] == 1
+    assert manager.stats["zone_update_batches"] == 1
+
+
+def test_single_pending_zone_update_keeps_plain_message_type():
+    async def scenario():
+        manager = ConnectionManager(coalesce_interval=0.01)
+        ws = FakeWebSocket()
+        await manager.connect(ws, "10.0.0.1")
+        await manager.broadcast({"type": "zone_update", "data": {"id": "z1", "status": "alarm"}})
+        await asyncio.sleep(0.05)
+        return ws.sent
+
+    [frame] = run(scenario())
+    assert json.loads(frame) == {"type": "zone_update", "data": {"id": "z1", "status": "alarm"}, "seq": 1}
+
+
+def test_message_priority_orders_alarms_by_severity():
+    order = [
+        message_priority({"type": "alarm", "data": {"severity": "critical"}}),
+        message_priority({"type": "alarm", "data": {"severity": "high"}}),
+        message_priority({"type": "alarm", "data": {"severity": "low"}}),
+        message_priority({"type": "alarm_update", "data": {}}),
+        message_priority({"type": "zone_updates", "data": []}),
+    ]
+    assert order == sorted(order)
+    assert len(set(order[:3])) == 3
+
+
+def test_control_frames_jump_the_queue_and_unknown_types_wait_behind_alarms():
+    ping = message_priority({"type": "ping"})
+    critical = message_priority({"type": "alarm", "data": {"severity": "critical"}})
+    low = message_priority({"type": "alarm", "data": {"severity": "low"}})
+    unknown = message_priority({"type": "something_new", "data": {}})
+    assert ping < critical
+    assert unknown > low
+
+
+def test_pings_are_not_shed_when_queue_is_full_of_updates():
+    async def scenario():
+        manager = ConnectionManager(coalesce_interval=0, max_queue=3)
+        ws = FakeWebSocket(send_delay=1)
+        await manager.connect(ws, "10.0.0.1")
+        await manager.broadcast({"type": "alarm_update", "data": {"id": "busy"}})
+        await asyncio.sleep(0)  # sender blocks on the first frame
+        for i in range(3):
+            await manager.broadcast({"type": "zone_update", "data": {"id": f"z{i}"}})
+        await manager.ping_idle_check()
+        connection = manager.active_connections[ws]
+        return [json.loads(frame)["type"] for _, _, frame in sorted(connection.queue)]
+
+    queued = run(scenario())
+    assert queued[0] == "ping"
+    assert len(queued) == 3
+
+
+def test_sender_task_exits_after_disconnect():
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, "10.0.0.1")
+        sender = manager.active_connections[ws].sender
+        manager.disconnect(ws)
+        await drain()
+        return sender
+
+    assert run(scenario()).done()
+
+
+def test_critical_alarm_latency_stays_bounded_during_low_priority_flood():
+    flood = 2000
+
+    async def scenario():
+        manager = ConnectionManager(coalesce_interval=0, max_queue=flood * 2)
+        ws = FakeWebSocket(send_delay=0.001)
+        await manager.connect(ws, "10.0.0.1")
+        for i in range(flood):
+            await manager.broadcast({"type": "alarm_update", "data": {"id": f"a{i}", "status": "acknowledged"}})
+            await manager.broadcast({"type": "zone_update", "data": {"id": f"z{i}", "status": "normal"}})
+        await asyncio.sleep(0.01)  # the flood is now being delivered
+
+        sent_before = len(ws.sent)
+        await manager.broadcast({"type": "alarm", "data": {"id": "critical-1", "severity": "critical"}})
+        while not any("critical-1" in frame for frame in ws.sent):
+            await asyncio.sleep(0.001)
+        position = next(i for i, frame in enumerate(ws.sent) if "critical-1" in frame)
+        manager.disconnect(ws)
+        await drain()
+        return position - sent_before
+
+    frames_ahead = run(scenario())
+    # FIFO delivery would put 2 * flood - sent_before frames ahead of the alarm;
+    # with priority lanes only the frame already in flight can precede it.
+    assert frames_ahead <= 1
+
+
+def test_full_queue_sheds_low_priority_updates_but_keeps_alarms():
+    async def scenario():
+        manager = ConnectionManager(coalesce_interval=0, max_queue=5)
+        ws = FakeWebSocket(send_delay=1)
+        await manager.connect(ws, "10.0.0.1")
+        await manager.broadcast({"type": "ping"})
+        await asyncio.sleep(0)  # sender picks up the ping and blocks on it
+        for i in range(5):
+            await manager.broadcast({"type": "zone_update", "data": {"id": f"z{i}"}})
+        for i in range(3):
+            await manager.broadcast({"type": "alarm", "data": {"id": f"a{i}", "severity": "high"}})
+        connection = manager.active_connections[ws]
+        return manager, [json.loads(frame)["type"] for _, _, frame in sorted(connection.queue)]
+
+    manager, queued = run(scenario())
+    assert queued == ["alarm", "alarm", "alarm", "zone_update", "zone_update"]
+    assert manager.stats["shed_messages"] == 3
+
+
+def test_client_that_cannot_keep_up_with_alarms_is_dropped():
+    async def scenario():
+        manager = ConnectionManager(coalesce_interval=0, max_queue=2)
+        ws = FakeWebSocket(send_delay=1)
+        await manager.connect(ws, "10.0.0.1")
+        for i in range(4):
+            await manager.broadcast({"type": "alarm", "data": {"id": f"a{i}", "severity": "critical"}})
+        await drain()
+        return manager, ws
+
+    manager, ws = run(scenario())
+    assert ws not in manager.active_connections
+    assert manager.stats["reaped_backlog"] == 1
+
+
+def test_refused_msgpack_request_gets_a_json_hello(monkeypatch):
+    import realtime
+
+    monkeypatch.setattr(realtime, "msgpack", None)
+
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        encoding = negotiate_encoding("msgpack")
+        await manager.connect(ws, "10.0.0.1", encoding, "msgpack")
+        await manager.connect(FakeWebSocket(), "10.0.0.2")
+        await drain()
+        return encoding, ws.sent
+
+    encoding, sent = run(scenario())
+    assert encoding == WireEncoding.JSON
+    assert json.loads(sent[0]) == {"type": "hello", "encoding": "json", "requested": "msgpack"}
+
+
+def test_data_messages_carry_an_increasing_sequence():
+    async def scenario():
+        manager = ConnectionManager(coalesce_interval=0)
+        ws = FakeWebSocket()
+        await manager.connect(ws, "10.0.0.1")
+        await manager.broadcast({"type": "alarm", "data": {"id": "a1"}})
+        await manager.ping_idle_check()
+        await manager.broadcast({"type": "alarm_update", "data": {"id": "a1"}})
+        await drain()
+        return manager, [json.loads(frame) for frame in ws.sent]
+
+    manager, frames = run(scenario())
+    assert [f.get("seq") for f in frames if f["type"] != "ping"] == [1, 2]
+    assert "seq" not in next(f for f in frames if f["type"] == "ping")
+    assert manager.sequence == 2
@@ -0,0 +1,180 @@
+import asyncio
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+import server
+import storage
+from scheduler import ScheduleTimer, next_transition
+
+OFFICE_HOURS = {
+    "id": "office",
+    "area": "Office",
+    "timezone": "Europe/Berlin",
+    "rules": [
+        {"days": [0, 1, 2, 3, 4], "time": "08:00", "action": "disarm"},
+        {"days": [0, 1, 2, 3, 4], "time": "18:00", "action": "arm"},
+    ],
+    "exceptions": [],
+}
+
+
+def test_next_transition_follows_local_time_across_weekend_and_dst():
+    # Friday 18:30 in Berlin (CET); DST starts on Sunday 2025-03-30
+    assert next_transition(OFFICE_HOURS, datetime(2025, 3, 28, 17, 30)) == (datetime(2025, 3, 31, 6, 0), "disarm")
+    assert next_transition(OFFICE_HOURS, datetime(2025, 3, 31, 6, 0)) == (datetime(2025, 3, 31, 16, 0), "arm")
+
+
+def test_exceptions_replace_the_weekly_rules_for_their_date():
+    schedule = {**OFFICE_HOURS, "exceptions": [
+        {"date": "2025-04-18", "rules": []},
+        {"date": "2025-04-19", "rules": [{"time": "12:00", "action": "disarm"}]},
+    ]}
+    # Good Friday is skipped entirely; Saturday gets its one-off change
+    assert next_transition(schedule, datetime(2025, 4, 17, 17, 0)) == (datetime(2025, 4, 19, 10, 0), "disarm")
+    assert next_transition({**schedule, "enabled": False}, datetime(2025, 4, 17)) is None
+
+
+def test_timer_pops_everything_due_and_reschedules_it():
+    now = [datetime(2025, 3, 31, 5, 0)]
+    timer = ScheduleTimer(clock=lambda: now[0])
+    timer.load([OFFICE_HOURS, {**OFFICE_HOURS, "id": "lab", "area": "Lab"}, {"id": "empty", "area": "X", "rules": []}])
+
+    assert len(timer) == 2 and timer.next_due() == datetime(2025, 3, 31, 6, 0)
+    assert timer.pop_due(datetime(2025, 3, 31, 5, 59)) == []
+
+    due = timer.pop_due(datetime(2025, 3, 31, 6, 0))
+    assert sorted((schedule["id"], action) for schedule, action, _ in due) == [("lab", "disarm"), ("office", "disarm")]
+    assert timer.next_due() == datetime(2025, 3, 31, 16, 0)
+
+
+def test_due_changes_are_written_in_bulk_and_broadcast_once(monkeypatch):
+    db = storage.MemoryStorage()
+    sent = []
+
+    async def broadcast(message):
+        sent.append(message)
+
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server.manager, "broadcast", broadcast)
+
+    async def scenario():
+        await db.zones.insert_many([
+            {"id": "o1", "area": "Office", "is_armed": False, "status": "normal"},
+            {"id": "o2", "area": "Office", "is_armed": True, "status": "normal"},
+            {"id": "v1", "area": "Vault", "is_armed": True, "status": "alarm"},
+        ])
+        due = datetime(2025, 3, 31, 16, 0)
+        await server.apply_scheduled_changes([
+            ({"id": "office", "area": "Office"}, "arm", due),
+            ({"id": "vault", "zone_id": "v1"}, "disarm", due),
+        ])
+        zones = {z["id"]: (z["is_armed"], z["status"]) async for z in db.zones.find()}
+        return zones, await db.events.find({}, {"_id": 0}).to_list(None)
+
+    zones, events = asyncio.run(scenario())
+    assert zones == {"o1": (True, "normal"), "o2": (True, "normal"), "v1": (False, "normal")}
+    assert [m["type"] for m in sent] == ["zone_updates"]
+    assert sorted(update["id"] for update in sent[0]["data"]) == ["o1", "v1"]
+    assert [(e["event_type"], e["metadata"]["armed"], e["metadata"]["disarmed"]) for e in events] == [
+        ("schedule_applied", 1, 1)
+    ]
+
+
+def test_schedule_api_validates_targets_and_reports_the_next_run(monkeypatch):
+    db = storage.MemoryStorage()
+    monkeypatch.setattr(server, "db", db)
+    user = server.User(email="ops@example.com", name="Ops", role="security")
+    asyncio.run(db.users.insert_one(user.dict()))
+    headers = {"Authorization": f"Bearer {server.create_access_token({'sub': user.id})}"}
+    client = TestClient(server.app)
+    reloads = []
+    monkeypatch.setattr(server.schedule_timer, "request_reload", lambda: reloads.append(1))
+    monkeypatch.setitem(server.change_versions.watchers, "schedules", [server.schedule_timer.request_reload])
+
+    both = client.post("/api/schedules", json={"name": "x", "zone_id": "z", "area": "Office"}, headers=headers)
+    bad_tz = client.post("/api/schedules", json={"name": "x", "area": "Office", "timezone": "Mars/Base"}, headers=headers)
+    created = client.post("/api/schedules", json={
+        "name": "Office hours", "area": "Office", "timezone": "Europe/Berlin",
+        "rules": OFFICE_HOURS["rules"], "exceptions": [{"date": "2030-01-01"}]
+    }, headers=headers)
+
+    assert (both.status_code, bad_tz.status_code, created.status_code) == (400, 400, 200)
+    assert created.json()["next_action"] in ("arm", "disarm") and created.json()["next_run"]
+    assert reloads == [1]
+
+    schedule_id = created.json()["id"]
+    updated = client.put(f"/api/schedules/{schedule_id}", json={"enabled": False}, headers=headers)
+    assert updated.json()["next_run"] is None
+    assert client.delete(f"/api/schedules/{schedule_id}", headers=headers).status_code == 200
+    assert client.get(f"/api/schedules/{schedule_id}", headers=headers).status_code == 404
+
+
+def test_transition_missed_during_failover_is_caught_up_once(monkeypatch):
+    db = storage.MemoryStorage()
+    monkeypatch.setattr(server, "db", db)
+
+    async def broadcast(message):
+        pass
+
+    monkeypatch.setattr(server.manager, "broadcast", broadcast)
+    # Monday: the 08:00 Berlin (06:00 UTC) disarm came due while no leader ran
+    now = [datetime(2025, 3, 31, 6, 0, 5)]
+
+    async def scenario():
+        await db.schedules.insert_one({**OFFICE_HOURS, "enabled": True, "updated_at": datetime(2025, 3, 28)})
+        await db.zones.insert_one({"id": "o1", "area": "Office", "is_armed": True, "status": "normal"})
+        successor = ScheduleTimer(clock=lambda: now[0])
+        successor.load(await server.load_schedules())
+        batch = successor.pop_due(now[0])
+        await server.apply_scheduled_changes(batch)
+
+        # Another failover later: nothing is applied twice
+        now[0] = datetime(2025, 3, 31, 6, 0, 20)
+        third = ScheduleTimer(clock=lambda: now[0])
+        third.load(await server.load_schedules())
+        zone = await db.zones.find_one({"id": "o1"})
+        schedule = await db.schedules.find_one({"id": "office"})
+        return batch, zone["is_armed"], schedule["last_applied_at"], third.next_due()
+
+    batch, armed, last_applied, next_due = asyncio.run(scenario())
+    assert [(action, due) for _, action, due in batch] == [("disarm", datetime(2025, 3, 31, 6, 0))]
+    assert (armed, last_applied, next_due) == (False, datetime(2025, 3, 31, 6, 0), datetime(2025, 3, 31, 16, 0))
+
+
+def test_an_edit_does_not_apply_past_transitions():
+    now = datetime(2025, 3, 31, 12, 0)
+    timer = ScheduleTimer(clock=lambda: now)
+    timer.load([{**OFFICE_HOURS, "updated_at": datetime(2025, 3, 31, 11, 0)}])
+    assert timer.pop_due(now) == [] and timer.next_due() == datetime(2025, 3, 31, 16, 0)
+
+
+def test_timer_keeps_retrying_a_batch_through_an_outage(monkeypatch):
+    import retry
+
+    async def no_wait(delay):
+        pass
+
+    monkeypatch.setattr(retry.asyncio, "sleep", no_wait)
+    now = datetime(2025, 3, 31, 6, 0)
+    timer = ScheduleTimer(clock=lambda: now)
+    attempts = []
+
+    async def apply(batch):
+        attempts.append(batch)
+        if len(attempts) < 20:
+            raise ConnectionError("database unavailable")
+        raise asyncio.CancelledError
+
+    async def reload():
+        # The 06:00 disarm is due and gets queued on load
+        return [{**OFFICE_HOURS, "updated_at": datetime(2025, 3, 30)}]
+
+    async def scenario():
+        try:
+            await asyncio.wait_for(timer.run(apply, reload), 5)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+
+    asyncio.run(scenario())
+    assert len(attempts) == 20 and all(batch == attempts[0] for batch in attempts)
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+import server
+import storage
+from server import AlarmSeverity
+from spool import WriteAheadSpool
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def zone():
+    return {"id": "zone-1", "name": "Vault Door", "zone_type": "door_contact", "area": "Vault",
+            "status": "normal", "is_armed": True, "trigger_count": 0}
+
+
+def test_records_survive_a_restart_until_committed(tmp_path):
+    async def scenario():
+        spool = WriteAheadSpool(str(tmp_path), fsync=False)
+        spool.open()
+        for i in range(3):
+            await spool.append({"n": i})
+        offset, _ = next(spool.pending())
+        await spool.commit(offset)
+        spool.close()
+
+        reopened = WriteAheadSpool(str(tmp_path), fsync=False)
+        reopened.open()
+        return reopened.pending_records, [record["n"] for _, record in reopened.pending()]
+
+    assert run(scenario()) == (2, [1, 2])
+
+
+def test_torn_last_record_is_ignored(tmp_path):
+    async def scenario():
+        spool = WriteAheadSpool(str(tmp_path), fsync=False)
+        spool.open()
+        await spool.append({"n": 1})
+        spool.close()
+        with open(spool.path, "ab") as f:
+            f.write(b'{"n": 2')
+
+        reopened = WriteAheadSpool(str(tmp_path), fsync=False)
+        reopened.open()
+        return [record["n"] for _, record in reopened.pending()]
+
+    assert run(scenario()) == [1]
+
+
+def test_append_after_a_torn_tail_is_not_lost(tmp_path):
+    async def scenario():
+        spool = WriteAheadSpool(str(tmp_path), fsync=False)
+        spool.open()
+        await spool.append({"n": 1})
+        spool.close()
+        with open(spool.path, "ab") as f:
+            f.write(b'{"n": 2')
+
+        reopened = WriteAheadSpool(str(tmp_path), fsync=False)
+        reopened.open()
+        await reopened.append({"n": 3})
+        return [record["n"] for _, record in reopened.pending()]
+
+    assert run(scenario()) == [1, 3]
+
+
+def test_logs_of_stopped_workers_are_claimed_as_orphans(tmp_path):
+    async def scenario():
+        live = WriteAheadSpool(str(tmp_path), fsync=False)
+        live.open()
+        stopped = WriteAheadSpool(str(tmp_path), fsync=False)
+        stopped.open()
+        await stopped.append({"n": 7})
+        assert stopped.path != live.path
+        stopped.close()
+
+        [(path, file)] = live.orphans()
+        records = [record["n"] for _, record in live.orphan_records(path)]
+        live.discard_orphan(path, file)
+        return records, path.exists()
+
+    assert run(scenario()) == ([7], False)
+
+
+class UnavailableStorage(storage.Storage):
+    def _create_collection(self, name):
+        raise ConnectionError("database unavailable")
+
+
+def test_trigger_is_spooled_and_broadcast_while_the_database_is_down(tmp_path, monkeypatch):
+    sent = []
+
+    async def broadcast(message):
+        sent.append(message)
+
+    async def scenario():
+        spool = WriteAheadSpool(str(tmp_path), fsync=True)
+        spool.open()
+        monkeypatch.setattr(server, "alarm_spool", spool)
+        monkeypatch.setattr(server, "db", UnavailableStorage())
+        monkeypatch.setattr(server.manager, "broadcast", broadcast)
+        alarm = await server.trigger_zone(zone(), AlarmSeverity.HIGH, "Door forced", "zone_triggered", "Zone triggered")
+        return alarm, spool
+
+    alarm, spool = run(scenario())
+    assert [m["type"] for m in sent] == ["alarm", "zone_update"]
+    assert sent[0]["data"]["id"] == alarm.id
+    [(_, record)] = list(spool.pending())
+    assert record["alarm"]["id"] == alarm.id and record["event"]["event_type"] == "zone_triggered"
+
+
+def test_replaying_a_record_twice_writes_it_once(tmp_path, monkeypatch):
+    db = storage.MemoryStorage()
+    monkeypatch.setattr(server, "db", db)
+
+    async def scenario():
+        spool = WriteAheadSpool(str(tmp_path), fsync=False)
+        spool.open()
+        monkeypatch.setattr(server, "alarm_spool", spool)
+        monkeypatch.setattr(server.manager, "broadcast", lambda message: asyncio.sleep(0))
+        await db.zones.insert_one(zone())
+        await server.trigger_zone(zone(), AlarmSeverity.HIGH, "Door forced", "zone_triggered", "Zone triggered")
+
+        [(_, record)] = list(spool.pending())
+        await server.apply_spooled_trigger(record)
+        # A crash after the zone update but before the alarm insert
+        await db.alarms.delete_many({})
+        await server.apply_spooled_trigger(record)
+        await server.apply_spooled_trigger(record)
+        return (
+            await db.alarms.count_documents({}),
+            await db.events.count_documents({}),
+            await db.zones.find_one({"id": "zone-1"}),
+            await db.zone_activity.find_one({"scope": "zone", "granularity": "day"}),
+        )
+
+    alarms, events, stored_zone, activity = run(scenario())
+    assert (alarms, events) == (1, 1)
+    assert stored_zone["trigger_count"] == 1 and stored_zone["status"] == "alarm"
+    assert activity["count"] == 1
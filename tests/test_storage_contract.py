@@ -0,0 +1,222 @@
+"""One contract, every backend.
+
+The in-memory and SQLite backends always run. Set STORAGE_CONTRACT_MONGO_URL
+to run the same tests against a real MongoDB.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+
+import storage
+from storage import DuplicateKeyError, InsertOne, ReturnDocument, UpdateOne
+
+
+def _mongo():
+    url = os.environ.get("STORAGE_CONTRACT_MONGO_URL")
+    if not url:
+        pytest.skip("STORAGE_CONTRACT_MONGO_URL not set")
+    return storage.MongoStorage(url, f"ema_contract_{uuid.uuid4().hex[:8]}")
+
+
+@pytest.fixture(params=["memory", "sqlite", "mongo"])
+def db(request, tmp_path):
+    if request.param == "memory":
+        store = storage.MemoryStorage()
+    elif request.param == "sqlite":
+        store = storage.SQLiteStorage(str(tmp_path / "ema.sqlite3"))
+    else:
+        store = _mongo()
+    yield store
+    if request.param == "mongo":
+        asyncio.run(store.client.drop_database(store.db.name))
+    store.close()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def zone(id, area="Lobby", armed=True, count=0, **extra):
+    return {"id": id, "name": f"Zone {id}", "area": area, "is_armed": armed,
+            "status": "normal", "trigger_count": count, **extra}
+
+
+async def ids(cursor):
+    return [doc["id"] for doc in await cursor.to_list(None)]
+
+
+def test_insert_and_find_one_round_trip_datetimes(db):
+    at = datetime(2025, 6, 1, 12, 30, 15, 123000)
+
+    async def scenario():
+        await db.zones.insert_one(zone("z1", last_triggered=at))
+        return await db.zones.find_one({"id": "z1"}, {"_id": 0})
+
+    doc = run(scenario())
+    assert doc == zone("z1", last_triggered=at)
+    assert run(db.zones.find_one({"id": "missing"})) is None
+
+
+def test_filters(db):
+    async def scenario():
+        await db.zones.insert_many([
+            zone("a", area="Lobby", count=1),
+            zone("b", area="Vault", count=5, armed=False),
+            zone("c", area="Lobby", count=9, last_triggered=datetime(2025, 1, 2)),
+        ])
+        return {
+            "eq": await ids(db.zones.find({"area": "Lobby"})),
+            "bool": await ids(db.zones.find({"is_armed": False})),
+            "in": await ids(db.zones.find({"id": {"$in": ["a", "c", "x"]}})),
+            "nin": await ids(db.zones.find({"id": {"$nin": ["a"]}})),
+            "ne": await ids(db.zones.find({"area": {"$ne": "Lobby"}})),
+            "range": await ids(db.zones.find({"trigger_count": {"$gte": 1, "$lt": 9}})),
+            "date": await ids(db.zones.find({"last_triggered": {"$gte": datetime(2025, 1, 1)}})),
+            "null": await ids(db.zones.find({"last_triggered": None})),
+            "exists": await ids(db.zones.find({"last_triggered": {"$exists": True}})),
+            "or": await ids(db.zones.find({"$or": [{"id": "a"}, {"trigger_count": {"$gt": 8}}]})),
+            "empty_in": await ids(db.zones.find({"id": {"$in": []}})),
+            "count": await db.zones.count_documents({"area": "Lobby", "is_armed": True}),
+        }
+
+    result = run(scenario())
+    assert result["eq"] == ["a", "c"]
+    assert result["bool"] == ["b"]
+    assert result["in"] == ["a", "c"]
+    assert result["nin"] == ["b", "c"]
+    assert result["ne"] == ["b"]
+    assert result["range"] == ["a", "b"]
+    assert result["date"] == ["c"]
+    assert result["null"] == ["a", "b"]
+    assert result["exists"] == ["c"]
+    assert result["or"] == ["a", "c"]
+    assert result["empty_in"] == []
+    assert result["count"] == 2
+
+
+def test_sort_skip_limit_and_projection(db):
+    async def scenario():
+        await db.alarms.insert_many([
+            {"id": f"a{i}", "severity": "high" if i % 2 else "low", "triggered_at": datetime(2025, 1, 1, i)}
+            for i in range(6)
+        ])
+        newest = await ids(db.alarms.find().sort("triggered_at", -1).limit(3))
+        paged = await ids(db.alarms.find({}).sort([("severity", 1), ("triggered_at", -1)]).skip(1).limit(2))
+        projected = await db.alarms.find({"id": "a1"}, {"_id": 0, "id": 1}).to_list(10)
+        excluded = await db.alarms.find_one({"id": "a1"}, {"_id": 0, "severity": 0})
+        streamed = [doc["id"] async for doc in db.alarms.find({"severity": "low"})]
+        return newest, paged, projected, excluded, streamed
+
+    newest, paged, projected, excluded, streamed = run(scenario())
+    assert newest == ["a5", "a4", "a3"]
+    assert paged == ["a3", "a1"]
+    assert projected == [{"id": "a1"}]
+    assert excluded == {"id": "a1", "triggered_at": datetime(2025, 1, 1, 1)}
+    assert streamed == ["a0", "a2", "a4"]
+
+
+def test_update_one_and_many_report_matched_and_modified(db):
+    async def scenario():
+        await db.zones.insert_many([zone("a"), zone("b"), zone("c", area="Vault")])
+        one = await db.zones.update_one({"id": "a"}, {"$set": {"status": "triggered"}, "$inc": {"trigger_count": 2}})
+        many = await db.zones.update_many({"area": "Lobby"}, {"$set": {"status": "triggered"}})
+        none = await db.zones.update_one({"id": "missing"}, {"$set": {"status": "triggered"}})
+        return one, many, none, await db.zones.find_one({"id": "a"}, {"_id": 0})
+
+    one, many, none, doc = run(scenario())
+    assert (one.matched_count, one.modified_count) == (1, 1)
+    # "a" already had the new status, so only "b" is modified
+    assert (many.matched_count, many.modified_count) == (2, 1)
+    assert (none.matched_count, none.modified_count, none.upserted_id) == (0, 0, None)
+    assert doc["status"] == "triggered" and doc["trigger_count"] == 2
+
+
+def test_upserts_seed_from_the_filter(db):
+    bucket = datetime(2025, 6, 1)
+
+    async def scenario():
+        await db.zone_activity.create_index(
+            [("scope", 1), ("key", 1), ("granularity", 1), ("bucket", 1)], unique=True
+        )
+        key = {"scope": "zone", "key": "z1", "granularity": "day", "bucket": bucket}
+        first = await db.zone_activity.update_one(key, {"$inc": {"count": 1}, "$setOnInsert": {"area": "Lobby"}}, upsert=True)
+        await db.zone_activity.update_one(key, {"$inc": {"count": 1}, "$setOnInsert": {"area": "Vault"}}, upsert=True)
+        return first, await db.zone_activity.find({}, {"_id": 0}).to_list(None)
+
+    first, docs = run(scenario())
+    assert first.upserted_id is not None
+    assert docs == [{"scope": "zone", "key": "z1", "granularity": "day", "bucket": bucket, "count": 2, "area": "Lobby"}]
+
+
+def test_nested_paths_and_update_operators(db):
+    async def scenario():
+        await db.stats.insert_one({"id": "s", "hist": {}, "best": 10, "tags": []})
+        await db.stats.update_one({"id": "s"}, {
+            "$inc": {"hist.12": 1, "hist.3": 2},
+            "$min": {"best": 4},
+            "$max": {"worst": 7},
+            "$push": {"tags": "x"},
+        })
+        await db.stats.update_one({"id": "s"}, {"$inc": {"hist.12": 1}, "$unset": {"best": ""}})
+        return await db.stats.find_one({"hist.12": 2}, {"_id": 0})
+
+    assert run(scenario()) == {"id": "s", "hist": {"12": 2, "3": 2}, "worst": 7, "tags": ["x"]}
+
+
+def test_bulk_write_mixes_inserts_and_upserts(db):
+    async def scenario():
+        result = await db.counters.bulk_write([
+            InsertOne({"_id": "a", "n": 1}),
+            UpdateOne({"_id": "a"}, {"$inc": {"n": 1}}, upsert=True),
+            UpdateOne({"_id": "b"}, {"$inc": {"n": 5}}, upsert=True),
+        ], ordered=False)
+        return result, await db.counters.find({}).sort("_id", 1).to_list(None)
+
+    result, docs = run(scenario())
+    assert (result.inserted_count, result.modified_count, result.upserted_count) == (1, 1, 1)
+    assert docs == [{"_id": "a", "n": 2}, {"_id": "b", "n": 5}]
+
+
+def test_find_one_and_update_returns_before_or_after(db):
+    async def scenario():
+        await db.leases.insert_one({"_id": "sim", "token": 1})
+        before = await db.leases.find_one_and_update({"_id": "sim"}, {"$inc": {"token": 1}})
+        after = await db.leases.find_one_and_update(
+            {"_id": "sim"}, {"$inc": {"token": 1}}, return_document=ReturnDocument.AFTER
+        )
+        missing = await db.leases.find_one_and_update({"_id": "other", "token": 9}, {"$set": {"holder": "x"}})
+        created = await db.leases.find_one_and_update(
+            {"_id": "other"}, {"$set": {"token": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return before, after, missing, created
+
+    before, after, missing, created = run(scenario())
+    assert before["token"] == 1 and after["token"] == 3
+    assert missing is None
+    assert created == {"_id": "other", "token": 1}
+
+
+def test_duplicate_ids_and_unique_indexes_are_rejected(db):
+    async def scenario():
+        await db.users.create_index("email", unique=True)
+        await db.users.insert_one({"_id": "u1", "email": "a@example.com"})
+        with pytest.raises(DuplicateKeyError):
+            await db.users.insert_one({"_id": "u1", "email": "b@example.com"})
+        with pytest.raises(DuplicateKeyError):
+            await db.users.insert_one({"_id": "u2", "email": "a@example.com"})
+        return await db.users.count_documents({})
+
+    assert run(scenario()) == 1
+
+
+def test_delete_one_and_many(db):
+    async def scenario():
+        await db.events.insert_many([{"id": str(i), "type": "t" if i < 3 else "u"} for i in range(5)])
+        one = await db.events.delete_one({"type": "t"})
+        many = await db.events.delete_many({"type": "t"})
+        return one.deleted_count, many.deleted_count, await ids(db.events.find())
+
+    assert run(scenario()) == (1, 2, ["3", "4"])
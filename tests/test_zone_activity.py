@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import ActivityGranularity
+
+
+def test_zone_activity_updates_bump_zone_and_area_buckets():
+    zone = {"id": "zone-1", "area": "Lobby"}
+    updates = server.zone_activity_updates(zone, datetime(2025, 6, 1, 13, 45, 12))
+
+    filters = {(u._filter["scope"], u._filter["key"], u._filter["granularity"], u._filter["bucket"]) for u in updates}
+    assert filters == {
+        ("zone", "zone-1", "hour", datetime(2025, 6, 1, 13)),
+        ("zone", "zone-1", "day", datetime(2025, 6, 1)),
+        ("area", "Lobby", "hour", datetime(2025, 6, 1, 13)),
+        ("area", "Lobby", "day", datetime(2025, 6, 1)),
+    }
+    assert all(u._doc == {"$inc": {"count": 1}} and u._upsert for u in updates)
+
+
+def test_activity_bucket_range_is_aligned_and_end_exclusive():
+    buckets = server.activity_bucket_range(
+        datetime(2025, 6, 1, 10, 30), datetime(2025, 6, 1, 13), ActivityGranularity.HOUR
+    )
+    assert buckets == [datetime(2025, 6, 1, h) for h in (10, 11, 12)]
+
+
+def test_resolve_activity_range_rejects_oversized_ranges():
+    with pytest.raises(HTTPException) as exc:
+        server.resolve_activity_range(datetime(2020, 1, 1), datetime(2025, 1, 1), ActivityGranularity.HOUR)
+    assert exc.value.status_code == 400
+
+
+def test_resolve_activity_range_rejects_huge_ranges_without_building_them():
+    with pytest.raises(HTTPException):
+        server.resolve_activity_range(datetime(1, 1, 2), datetime(2025, 1, 1), ActivityGranularity.HOUR)
+
+
+def test_resolve_activity_range_accepts_the_limit():
+    start = datetime(2025, 1, 1)
+    buckets = server.resolve_activity_range(
+        start, start + server.ACTIVITY_MAX_POINTS * server.timedelta(hours=1), ActivityGranularity.HOUR
+    )
+    assert len(buckets) == server.ACTIVITY_MAX_POINTS
@@ -0,0 +1,120 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import server
+import storage
+from importer import ImportFormatError, read_csv_rows, read_json_rows
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(rows):
+    return [row async for row in rows]
+
+
+def test_stream_readers_handle_rows_split_across_chunks():
+    csv_data = (
+        '﻿name,zone_type,area,description\r\n'
+        'Door,door_contact,Lobby,"Main door, ""north""\nside"\r\n'
+        'PIR,motion,Lobby,\r\n'
+        '\r\n'
+        'Bad,motion,Lobby,x,extra'
+    ).encode()
+    json_data = b'[{"name": "Door", "area": "L\\u00f6bby"}, 7, {"name": "PIR"}]'
+    ndjson_data = b'{"name": "Door"}\n{"name": "PIR"}\n'
+    for size in (1, 5, 4096):
+        rows = asyncio.run(collect(read_csv_rows(chunked(csv_data, size), server.ZONE_IMPORT_COLUMNS, ["name"])))
+        assert rows == [
+            (1, {"name": "Door", "zone_type": "door_contact", "area": "Lobby", "description": 'Main door, "north"\nside'}),
+            (2, {"name": "PIR", "zone_type": "motion", "area": "Lobby"}),
+            (3, {"__error__": "5 cells for 4 columns"}),
+        ]
+        rows = asyncio.run(collect(read_json_rows(chunked(json_data, size))))
+        assert rows == [(1, {"name": "Door", "area": "Löbby"}), (2, {"__error__": "Not a JSON object"}), (3, {"name": "PIR"})]
+        assert len(asyncio.run(collect(read_json_rows(chunked(ndjson_data, size))))) == 2
+
+
+def test_malformed_files_report_where_they_break():
+    async def error(rows):
+        try:
+            await collect(rows)
+        except ImportFormatError as e:
+            return e.row
+    assert asyncio.run(error(read_json_rows(chunked(b'[{"name": "a"}, {"name": ', 3)))) == 2
+    assert asyncio.run(error(read_csv_rows(chunked(b"name,colour\nx,y\n", 3), ["name"], ["name"]))) == 0
+
+
+def setup_client(monkeypatch):
+    db = storage.MemoryStorage()
+    sent = []
+
+    async def broadcast(message):
+        sent.append(message)
+
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server.manager, "broadcast", broadcast)
+    user = server.User(email="ops@example.com", name="Ops", role="admin")
+    asyncio.run(db.users.insert_one(user.dict()))
+    headers = {"Authorization": f"Bearer {server.create_access_token({'sub': user.id})}"}
+    return db, sent, TestClient(server.app), headers
+
+
+def post_zones(client, headers, rows, **params):
+    body = "\n".join(json.dumps(row) for row in rows)
+    return client.post("/api/zones/import", params=params, content=body,
+                       headers={**headers, "Content-Type": "application/x-ndjson"})
+
+
+def test_import_writes_in_batches_with_one_event_and_one_broadcast(monkeypatch):
+    db, sent, client, headers = setup_client(monkeypatch)
+    monkeypatch.setattr(server, "ZONE_IMPORT_BATCH_SIZE", 4)
+    rows = [{"name": f"Zone {i}", "zone_type": "motion", "area": f"Area {i % 3}"} for i in range(10)]
+    rows[6] = {"name": "Broken", "zone_type": "laser", "area": "Area 0"}
+
+    dry = post_zones(client, headers, rows, dry_run="true", ordered="false").json()
+    assert (dry["inserted"], dry["failed"], asyncio.run(db.zones.count_documents({}))) == (9, 1, 0)
+
+    ordered = post_zones(client, headers, rows).json()
+    assert (ordered["inserted"], ordered["stopped_at"]) == (6, 7)
+    assert ordered["errors"][0]["row"] == 7 and "zone_type" in ordered["errors"][0]["errors"][0]
+
+    unordered = post_zones(client, headers, rows, ordered="false").json()
+    assert (unordered["inserted"], unordered["failed"], unordered["stopped_at"]) == (3, 7, None)
+    assert [e["row"] for e in unordered["errors"]] == [1, 2, 3, 4, 5, 6, 7]
+
+    assert asyncio.run(db.zones.count_documents({})) == 9
+    assert [m["type"] for m in sent] == ["zones_imported", "zones_imported"]
+    assert asyncio.run(db.events.count_documents({"event_type": "zones_imported"})) == 2
+
+
+def test_upsert_reimport_only_touches_changed_zones(monkeypatch):
+    db, sent, client, headers = setup_client(monkeypatch)
+    plan = [{"name": f"Zone {i}", "zone_type": "motion", "area": "Hall"} for i in range(5)]
+    assert post_zones(client, headers, plan).json()["inserted"] == 5
+    ids = {z["name"]: z["id"] for z in asyncio.run(db.zones.find({}).to_list(None))}
+
+    again = post_zones(client, headers, plan, mode="upsert").json()
+    assert (again["inserted"], again["updated"], again["unchanged"]) == (0, 0, 5)
+
+    plan[2] = {**plan[2], "zone_type": "glass_break", "description": "Window"}
+    plan.append({"name": "Zone 5", "zone_type": "fire", "area": "Hall"})
+    changed = post_zones(client, headers, plan, mode="upsert").json()
+    assert (changed["inserted"], changed["updated"], changed["unchanged"]) == (1, 1, 4)
+    zone = asyncio.run(db.zones.find_one({"name": "Zone 2"}))
+    assert (zone["id"], zone["zone_type"], zone["description"]) == (ids["Zone 2"], "glass_break", "Window")
+
+    duplicate = post_zones(client, headers, [plan[0], plan[0]], mode="upsert").json()
+    assert duplicate["errors"] == [{"row": 2, "errors": ["Same area and name as row 1"]}]
+    assert len(sent) == 2
+
+
+def test_import_rejects_unknown_formats_and_headers(monkeypatch):
+    _, _, client, headers = setup_client(monkeypatch)
+    xml = client.post("/api/zones/import", content=b"<zones/>", headers={**headers, "Content-Type": "text/xml"})
+    header = client.post("/api/zones/import", content=b"name,area\nx,y\n", headers={**headers, "Content-Type": "text/csv"})
+    assert (xml.status_code, header.status_code) == (415, 400)